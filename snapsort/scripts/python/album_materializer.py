@@ -0,0 +1,150 @@
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import progress
+
+TRANSFER_STRATEGIES = ["copy", "hardlink", "reflink", "symlink"]
+
+# ioctl FICLONE (Linux : btrfs, XFS...)
+FICLONE = 0x40049409
+
+
+def reflink(source, destination):
+    """
+    Clone copy-on-write du fichier quand le système de fichiers le permet, copie classique sinon
+    """
+    try:
+        import fcntl
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        shutil.copystat(source, destination)
+    except (ImportError, OSError):
+        shutil.copy2(source, destination)
+
+
+def hardlink(source, destination):
+    """
+    Lien physique, copie classique si la source est sur un autre volume
+    """
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def symlink(source, destination):
+    os.symlink(os.path.abspath(source), destination)
+
+
+class AlbumMaterializer:
+    """
+    Création des albums : regroupement par dossier en une passe, création groupée des dossiers
+    puis transferts dans un pool de threads. Les fichiers déjà présents avec la même taille
+    et la même date de modification ne sont pas retransférés.
+    """
+    def __init__(self, strategy="copy", workers=8):
+        """
+        :param strategy: "copy", "hardlink", "reflink" ou "symlink".
+        :param workers: Nombre de transferts simultanés.
+        """
+        if strategy not in TRANSFER_STRATEGIES:
+            raise ValueError(f"Stratégie de transfert inconnue : {strategy} (choix : {TRANSFER_STRATEGIES})")
+
+        self.strategy = strategy
+        self.workers = workers
+        self.transfer = {"copy": shutil.copy2, "hardlink": hardlink, "reflink": reflink, "symlink": symlink}[strategy]
+
+    def plan(self, df, destination_directory, tree_struct):
+        """
+        :return: Dictionnaire dossier de destination -> liste de tuples (source, destination)
+        """
+        df = df.dropna(subset=[tree_struct])
+        plan = {}
+        for folder, group in df.groupby(tree_struct, sort=False):
+            folder_path = os.path.join(destination_directory, folder)
+            plan[folder_path] = [(source, os.path.join(folder_path, os.path.basename(source))) for source in group["path"]]
+        return plan
+
+    def is_up_to_date(self, source, destination):
+        """
+        Le fichier de destination correspond déjà à la source (même taille et même date de modification)
+        """
+        if self.strategy == "symlink":
+            return os.path.islink(destination) and os.readlink(destination) == os.path.abspath(source)
+
+        try:
+            source_stat = os.stat(source)
+            destination_stat = os.stat(destination)
+        except OSError:
+            return False
+        return (source_stat.st_size == destination_stat.st_size
+                and int(source_stat.st_mtime) == int(destination_stat.st_mtime))
+
+    def transfer_one(self, source, destination):
+        """
+        :return: "transferred", "skipped" ou "missing"
+        """
+        if not os.path.exists(source):
+            print(f"Fichier non trouvé : {source}")
+            return "missing"
+
+        if self.is_up_to_date(source, destination):
+            return "skipped"
+
+        if os.path.lexists(destination):
+            os.remove(destination)
+        self.transfer(source, destination)
+        return "transferred"
+
+    def materialize(self, df, destination_directory, tree_struct="folder_path"):
+        """
+        :return: Dictionnaire du nombre de fichiers transférés, ignorés (déjà à jour) et manquants.
+        """
+        plan = self.plan(df, destination_directory, tree_struct)
+
+        # Création de tous les dossiers avant les transferts
+        for folder_path in plan:
+            os.makedirs(folder_path, exist_ok=True)
+        print(f"Dossiers d'albums : {len(plan)}")
+
+        transfers = [pair for pairs in plan.values() for pair in pairs]
+        counts = {"transferred": 0, "skipped": 0, "missing": 0}
+        lock = threading.Lock()
+        reporter = progress.get_reporter()
+        reporter.start_stage("albums", len(transfers), legacy="4/4")
+
+        def run(pair):
+            status = self.transfer_one(*pair)
+            with lock:
+                counts[status] += 1
+            reporter.advance()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(run, transfers))
+        reporter.end_stage(strategy=self.strategy, folders=len(plan), **counts)
+
+        print(f"Fichiers transférés ({self.strategy}) : {counts['transferred']}, déjà à jour : {counts['skipped']}, "
+              f"introuvables : {counts['missing']}")
+        return counts
+
+    @staticmethod
+    def prune(destination_directory, kept_paths):
+        """
+        Supprime de la destination les fichiers qui ne font plus partie des albums, puis les dossiers vides
+        """
+        kept = {os.path.abspath(path) for path in kept_paths}
+        removed = 0
+        for root, dirs, files in os.walk(destination_directory, topdown=False):
+            for name in files:
+                path = os.path.join(root, name)
+                if os.path.abspath(path) not in kept:
+                    os.remove(path)
+                    removed += 1
+            if os.path.abspath(root) != os.path.abspath(destination_directory) and not os.listdir(root):
+                os.rmdir(root)
+
+        if removed:
+            print(f"Fichiers obsolètes supprimés des albums : {removed}")
+        return removed
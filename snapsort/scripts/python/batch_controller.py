@@ -0,0 +1,129 @@
+from progress import available_memory_mb, current_rss_mb
+
+
+class BatchController:
+    """
+    Taille adaptative des lots envoyés au modèle.
+
+    La latence de chaque lot et la mémoire résidente du processus sont mesurées après chaque lot.
+    La taille double tant que le débit (images par seconde) progresse d'au moins `plateau`, puis se fixe
+    sur la meilleure taille mesurée. Sous pression mémoire (plafond dépassé, ou machine presque à court
+    de mémoire), la taille est divisée par deux et ne remonte plus au-delà.
+    Avec une taille fixée (`fixed`), aucune adaptation : utile pour épingler la valeur retenue sur une machine.
+    """
+    def __init__(self, initial=8, minimum=1, maximum=128, fixed=None, memory_limit_mb=None, plateau=0.05,
+                 samples=2, min_available_mb=512, rss=current_rss_mb, available=available_memory_mb):
+        """
+        :param initial: Taille du premier lot.
+        :param maximum: Taille maximale d'un lot.
+        :param fixed: Taille fixe (désactive l'adaptation).
+        :param memory_limit_mb: Plafond de mémoire résidente du processus, en Mo (None : pas de plafond).
+        :param plateau: Gain de débit relatif minimal pour continuer d'agrandir les lots.
+        :param samples: Nombre de lots mesurés pour chaque taille avant de décider.
+        :param min_available_mb: En dessous de cette mémoire disponible sur la machine, les lots sont réduits.
+        :param rss: Fonction de mesure de la mémoire du processus (Mo).
+        :param available: Fonction de mesure de la mémoire disponible de la machine (Mo, None si inconnue).
+        """
+        self.size = fixed or initial
+        self.minimum = minimum
+        self.maximum = fixed or maximum
+        self.adaptive = fixed is None
+        self.memory_limit_mb = memory_limit_mb
+        self.plateau = plateau
+        self.samples = samples
+        self.min_available_mb = min_available_mb
+        self.rss = rss
+        self.available = available
+
+        self.settled = not self.adaptive
+        self.measures = []
+        self.best = None  # (taille, débit)
+        self.warmed_up = False
+        self.baseline_rss = None
+        self.peak_rss = None
+        self.backoffs = 0
+        self.batches = 0
+
+        # Sans mesure de la mémoire du processus, le plafond ne peut pas être respecté : il est signalé et ignoré
+        self.limit_enforced = memory_limit_mb is None or rss() is not None
+        if not self.limit_enforced:
+            print(f"Plafond de mémoire de {memory_limit_mb:.0f} Mo ignoré : la mémoire du processus n'est pas "
+                  f"mesurable sur ce système (installez psutil)")
+
+    def memory_pressure(self, rss):
+        if self.memory_limit_mb is not None and rss is not None and rss > self.memory_limit_mb:
+            return True
+        available = self.available() if self.available else None
+        return available is not None and available < self.min_available_mb
+
+    def predicted_rss(self, rss, size):
+        """
+        Mémoire prévue avec des lots de `size` images, à partir du coût par image observé depuis le premier lot
+        """
+        per_image = max(0.0, rss - self.baseline_rss) / self.size
+        return rss + per_image * (size - self.size)
+
+    def record(self, n, seconds):
+        """
+        Mesure d'un lot encodé.
+
+        :param n: Nombre d'images du lot.
+        :param seconds: Durée de l'encodage du lot.
+        """
+        self.batches += 1
+        rss = self.rss()
+        if rss is not None:
+            self.peak_rss = max(self.peak_rss or 0.0, rss)
+            if self.baseline_rss is None:
+                self.baseline_rss = rss
+
+        # Sous pression mémoire, la taille est réduite même si elle a été fixée
+        if self.memory_pressure(rss) and self.size > self.minimum:
+            self.size = max(self.minimum, self.size // 2)
+            self.maximum = self.size
+            self.backoffs += 1
+            self.settled = True
+            self.measures = []
+            return
+
+        # Le premier lot (chargement du modèle, initialisation) n'est pas représentatif
+        if not self.warmed_up:
+            self.warmed_up = True
+            return
+        # Lot incomplet (fin d'une liste) : pas de mesure
+        if self.settled or n != self.size or seconds <= 0:
+            return
+
+        self.measures.append(n / seconds)
+        if len(self.measures) < self.samples:
+            return
+
+        throughput = sorted(self.measures)[len(self.measures) // 2]
+        self.measures = []
+        if self.best is not None and throughput < self.best[1] * (1 + self.plateau):
+            # Plus de gain : retour à la meilleure taille mesurée
+            self.size = self.best[0]
+            self.settled = True
+            return
+
+        self.best = (self.size, throughput)
+        next_size = min(self.maximum, self.size * 2)
+        if next_size == self.size or (self.memory_limit_mb is not None and rss is not None
+                                      and self.predicted_rss(rss, next_size) > self.memory_limit_mb):
+            self.settled = True
+            return
+        self.size = next_size
+
+    def report(self):
+        """
+        Paramètres retenus, pour le rapport d'exécution
+        """
+        return {
+            "batch_size": self.size,
+            "batch_adaptive": self.adaptive,
+            "batch_throughput": round(self.best[1], 2) if self.best else None,
+            "memory_limit_mb": self.memory_limit_mb,
+            "memory_limit_enforced": self.limit_enforced,
+            "memory_backoffs": self.backoffs,
+            "batch_peak_rss_mb": self.peak_rss,
+        }
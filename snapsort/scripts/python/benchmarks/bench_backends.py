@@ -0,0 +1,79 @@
+"""
+Rapport précision / débit des backends d'inférence sur un jeu d'images local fixe.
+
+Chaque backend encode les mêmes images ; la référence de précision est le backend PyTorch du même modèle :
+similarité cosinus entre embeddings, accord de la catégorie zero-shot (catégories prédéfinies)
+et accord des clusters du clustering par fenêtre de voisins.
+
+Usage : python benchmarks/bench_backends.py --images unsorted_images --models ViT-B-32 ViT-L-14
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+from tabulate import tabulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from clustering_manager import neighbor_window_clusters
+from embeddings_manager import load_image
+from functions import get_image_paths
+from inference_backends import CLIP_MODELS, INFERENCE_BACKENDS, get_backend
+
+CATEGORIES = ["City urban buildings", "Beach sea ocean sand", "Hiking trail forest path", "Sports activity athletic",
+              "Museum exhibition art gallery", "Food", "Travel vacation snow", "Nature wildlife environment flora fauna",
+              "Snow", "Building", "Miscellaneous other", "Family and friends", "Animals"]
+
+
+def encode(backend, images, batch_size):
+    """
+    :return: Tuple (embeddings, débit en images / seconde), après un lot de préchauffage
+    """
+    backend.encode_images(images[:batch_size])
+
+    start = time.perf_counter()
+    embeddings = np.vstack([backend.encode_images(images[i:i + batch_size]) for i in range(0, len(images), batch_size)])
+    return embeddings, len(images) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', type=str, required=True, help="Dossier d'images fixe")
+    parser.add_argument('--limit', type=int, default=256)
+    parser.add_argument('--models', type=str, nargs='+', default=list(CLIP_MODELS), choices=list(CLIP_MODELS))
+    parser.add_argument('--backends', type=str, nargs='+', default=INFERENCE_BACKENDS, choices=INFERENCE_BACKENDS)
+    parser.add_argument('--batch_size', type=int, default=16)
+    parser.add_argument('--export_dir', type=str, default=None)
+    args = parser.parse_args()
+
+    # Ordre des noms : le jeu d'images et donc les résultats sont reproductibles
+    paths = sorted(get_image_paths(args.images))[:args.limit]
+    images = [image for image in map(load_image, paths) if image is not None]
+    print(f"{len(images)} images de {args.images}")
+
+    rows = []
+    for model in args.models:
+        reference = None
+        for name in ["torch"] + [backend for backend in args.backends if backend != "torch"]:
+            backend = get_backend(name, model, args.export_dir)
+            embeddings, throughput = encode(backend, images, args.batch_size)
+            categories = np.argmax(embeddings @ backend.encode_texts(CATEGORIES).T, axis=1)
+            labels, _ = neighbor_window_clusters(embeddings)
+
+            if reference is None:
+                reference = embeddings, categories, labels, throughput
+            ref_embeddings, ref_categories, ref_labels, ref_throughput = reference
+
+            cosine = np.sum(embeddings * ref_embeddings, axis=1)
+            if name in args.backends:
+                rows.append([model, name, f"{throughput:.1f}", f"{throughput / ref_throughput:.2f}x",
+                             f"{cosine.mean():.4f}", f"{cosine.min():.4f}",
+                             f"{np.mean(categories == ref_categories):.1%}", f"{np.mean(labels == ref_labels):.1%}"])
+
+    print(tabulate(rows, headers=["modèle", "backend", "images / s", "gain", "cosinus moyen", "cosinus min",
+                                  "même catégorie", "même cluster"], tablefmt="psql"))
+
+
+if __name__ == "__main__":
+    main()
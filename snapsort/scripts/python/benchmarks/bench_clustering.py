@@ -0,0 +1,99 @@
+"""
+Benchmark du clustering par fenêtre de voisins : matrice de similarité en bande vectorisée
+contre la boucle historique image par image (np.dot par paire + recherche dans les listes de chemins),
+et segmentation par événements (écarts de temps, similarité aux seules frontières incertaines).
+
+Usage : python benchmarks/bench_clustering.py --sizes 1000 5000 20000
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+from tabulate import tabulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from clustering_manager import event_clusters, neighbor_window_clusters, segment_gaps
+
+
+def legacy_cluster_day(paths, embeddings, threshold, n_neighbors):
+    """
+    Algorithme historique de ClusteringManager._cluster_day_embeddings (boucle image par image),
+    référence du benchmark et des tests
+    :return: les clusters et les images non clustérisées
+    """
+    N = len(paths)
+    clusters = []
+    current_cluster = []
+    already_clustered = set()
+    for i in range(N):
+        if paths[i] in already_clustered:
+            continue
+        end_idx = min(i + n_neighbors + 1, N)
+        similar_images = []
+        current_cluster.append(paths[i])
+        already_clustered.add(paths[i])
+        neighbor_img = None
+        for j in range(i + 1, end_idx):
+            if np.dot(embeddings[i], embeddings[j]) > threshold:
+                neighbor_img = paths[j]
+        if neighbor_img and neighbor_img not in already_clustered:
+            current_cluster.append(neighbor_img)
+            already_clustered.add(neighbor_img)
+            similar_images.append(neighbor_img)
+        if not similar_images and current_cluster:
+            clusters.append(current_cluster.copy())
+            current_cluster.clear()
+    if current_cluster:
+        clusters.append(current_cluster.copy())
+
+    # Recherche des images non clustérisées dans toutes les listes (O(N x clusters x taille))
+    others = [path for path in paths if not any(path in cluster for cluster in clusters)]
+    return clusters, others
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--threshold', type=float, default=0.6)
+    parser.add_argument('--n_neighbors', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    rows = []
+    for size in args.sizes:
+        # Scènes successives : environ 10 images par scène
+        centers = rng.normal(size=(size // 10 + 1, args.dim))
+        embeddings = centers[np.arange(size) // 10] + rng.normal(scale=0.7, size=(size, args.dim))
+        embeddings = (embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)).astype(np.float32)
+        paths = [f"img_{i:06d}.jpg" for i in range(size)]
+        # Rafales de quelques secondes dans une scène, quelques minutes entre deux scènes
+        gaps = np.where(np.arange(size) % 10 == 0, rng.uniform(120, 900, size), rng.uniform(1, 40, size))
+        seconds = np.cumsum(gaps)
+        days = (seconds // 86400).astype(np.int64)
+
+        start = time.perf_counter()
+        _, clusters = neighbor_window_clusters(embeddings, args.threshold, args.n_neighbors)
+        vectorized_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        legacy_clusters, _ = legacy_cluster_day(paths, embeddings, args.threshold, args.n_neighbors)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, events, checks = event_clusters(embeddings, segment_gaps(seconds, days), args.threshold)
+        event_time = time.perf_counter() - start
+
+        same = [[paths[i] for i in cluster] for cluster in clusters] == legacy_clusters
+        rows.append([size, len(clusters), f"{vectorized_time * 1000:.1f}", f"{legacy_time * 1000:.1f}",
+                     f"{legacy_time / vectorized_time:.1f}x", same, len(events), f"{event_time * 1000:.1f}",
+                     f"{checks} / {size * args.n_neighbors}"])
+
+    print(tabulate(rows, headers=["images / jour", "clusters", "bande (ms)", "boucle (ms)", "gain", "identique",
+                                  "événements", "événements (ms)", "similarités"], tablefmt="psql"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark de bout en bout sur des bibliothèques synthétiques (benchmarks/synthetic_library.py).
+
+Pour chaque taille, le pipeline est exécuté dans un processus séparé avec le backend "stub"
+(aucun modèle à télécharger) : chaque étape est chronométrée et la mémoire maximale (RSS)
+est relevée après chaque étape. Les résultats sont écrits en JSON pour comparer les passages.
+
+Usage : python benchmarks/bench_pipeline.py --sizes 1000 10000 50000 --output bench_pipeline.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from tabulate import tabulate
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+from progress import peak_rss_mb
+
+
+def run_stages(library, workers, backend, transfer_mode):
+    """
+    Exécute et chronomètre chaque étape du pipeline sur une bibliothèque (processus enfant)
+
+    :return: Liste de dictionnaires {stage, seconds, peak_rss_mb}
+    """
+    import numpy as np
+
+    from categories_manager import CategoriesManager
+    from functions import create_arborescence, create_category_folders
+    from geocoding import LocationResolver
+
+    results = []
+
+    def timed(stage, fn):
+        start = time.perf_counter()
+        value = fn()
+        results.append({"stage": stage, "seconds": time.perf_counter() - start, "peak_rss_mb": peak_rss_mb()})
+        return value
+
+    work_dir = tempfile.mkdtemp(prefix="snapsort_bench_")
+    destination = os.path.join(work_dir, "albums")
+    try:
+        call = timed("exif", lambda: CategoriesManager(library, workers=workers, backend=backend))
+        timed("analysis_embeddings", call.analyze_images)
+        timed("clustering_categories", call.pipeline_categories_embedding_with_clusters)
+        call.scheduler.close()
+
+        # Dédoublonnage de toute la bibliothèque comme un seul cluster : pire cas de remove_duplicates
+        analysis = call.df.dropna(subset=["quality", "phash"])
+        images_with_quality = list(zip(analysis["path"], analysis["quality"]))
+        hashes = analysis["phash"].to_numpy(dtype=np.uint64)
+        timed("remove_duplicates", lambda: call.image_cleaner.remove_duplicates(images_with_quality, hashes=hashes))
+
+        df = timed("arborescence", lambda: create_arborescence(call.df, LocationResolver()))
+        timed("albums", lambda: create_category_folders(df, destination, strategy=transfer_mode))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--libraries_dir', type=str, default=os.path.join(tempfile.gettempdir(), "snapsort_libraries"))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--backend', type=str, default="stub")
+    parser.add_argument('--transfer_mode', type=str, default="copy")
+    parser.add_argument('--output', type=str, default="bench_pipeline.json")
+    # Usage interne : exécution d'une seule bibliothèque dans le processus enfant
+    parser.add_argument('--run_one', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        results = run_stages(args.run_one, args.workers, args.backend, args.transfer_mode)
+        print("RESULTS " + json.dumps(results))
+        return
+
+    from synthetic_library import generate_library
+
+    records = []
+    for size in args.sizes:
+        library = os.path.join(args.libraries_dir, f"library_{size}_seed{args.seed}")
+        start = time.perf_counter()
+        generate_library(library, size, args.seed)
+        print(f"Bibliothèque de {size} images prête ({time.perf_counter() - start:.1f} s) : {library}")
+
+        # Un processus par taille : la mémoire maximale mesurée est celle de cette taille seulement
+        command = [sys.executable, os.path.abspath(__file__), "--run_one", library, "--backend", args.backend,
+                   "--transfer_mode", args.transfer_mode]
+        if args.workers is not None:
+            command += ["--workers", str(args.workers)]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        stages = json.loads(next(line for line in output.splitlines() if line.startswith("RESULTS "))[len("RESULTS "):])
+
+        for stage in stages:
+            records.append({"images": size, **stage, "images_per_sec": size / stage["seconds"] if stage["seconds"] else None})
+        total = sum(stage["seconds"] for stage in stages)
+        records.append({"images": size, "stage": "total", "seconds": total, "images_per_sec": size / total,
+                        "peak_rss_mb": max(stage["peak_rss_mb"] or 0 for stage in stages) or None})
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"backend": args.backend, "workers": args.workers, "seed": args.seed, "results": records}, f, indent=2)
+
+    print(tabulate([[r["images"], r["stage"], f"{r['seconds']:.2f}", f"{r['images_per_sec']:.0f}" if r["images_per_sec"] else "-",
+                     f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] else "-"] for r in records],
+                   headers=["images", "étape", "secondes", "images / s", "RSS max (Mo)"], tablefmt="psql"))
+    print(f"Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark de ImageCleaner.remove_duplicates : index de pHash précalculés contre la comparaison
+par paires historique (chaque paire relue, redimensionnée et hachée).
+
+Usage : python benchmarks/bench_remove_duplicates.py --sizes 100 1000 10000 --legacy_max 1000
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+from PIL import Image
+from tabulate import tabulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from images_manager import ImageCleaner
+
+
+def generate_images(directory, n, burst_size=4, seed=0):
+    """
+    Génère n petites images JPEG par rafales : les images d'une même rafale sont quasi-identiques.
+    """
+    rng = np.random.default_rng(seed)
+    paths = []
+    base = None
+    for i in range(n):
+        if i % burst_size == 0:
+            base = rng.integers(0, 256, size=(8, 8, 3), dtype=np.uint8)
+        noise = rng.integers(-6, 7, size=(64, 64, 3))
+        pixels = np.clip(np.kron(base, np.ones((8, 8, 1))) + noise, 0, 255).astype(np.uint8)
+        path = os.path.join(directory, f"img_{i:05d}.jpg")
+        Image.fromarray(pixels).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def legacy_remove_duplicates(cleaner, images_with_quality, phash_threshold=20):
+    unique = []
+    duplicates = []
+    for path, quality in images_with_quality:
+        img1 = cleaner.read_and_resize(path)
+        if img1 is None:
+            continue
+        is_duplicate = False
+        for idx, (unique_path, unique_quality) in enumerate(unique):
+            img2 = cleaner.read_and_resize(unique_path)
+            if img2 is None:
+                continue
+            if cleaner.calculate_phash_distance(img1, img2) < phash_threshold:
+                if quality > unique_quality:
+                    duplicates.append(unique_path)
+                    unique[idx] = (path, quality)
+                else:
+                    duplicates.append(path)
+                is_duplicate = True
+                break
+        if not is_duplicate:
+            unique.append((path, quality))
+    return unique, duplicates
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--legacy_max', type=int, default=1000, help="Taille maximale pour la version par paires")
+    args = parser.parse_args()
+
+    cleaner = ImageCleaner()
+    rows = []
+    directory = tempfile.mkdtemp(prefix="snapsort_bench_")
+    try:
+        paths = generate_images(directory, max(args.sizes))
+        for size in args.sizes:
+            images_with_quality = cleaner.get_images_with_quality(paths[:size])
+            (unique, _), indexed_time = timed(cleaner.remove_duplicates, images_with_quality)
+
+            legacy_time, same = None, None
+            if size <= args.legacy_max:
+                (legacy_unique, _), legacy_time = timed(legacy_remove_duplicates, cleaner, images_with_quality)
+                same = legacy_unique == unique
+
+            rows.append([size, len(unique), f"{indexed_time:.2f}",
+                         f"{legacy_time:.2f}" if legacy_time is not None else "-",
+                         f"{legacy_time / indexed_time:.1f}x" if legacy_time is not None else "-",
+                         same if same is not None else "-"])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(tabulate(rows, headers=["images", "uniques", "index (s)", "par paires (s)", "gain", "identique"], tablefmt="psql"))
+
+
+if __name__ == "__main__":
+    main()
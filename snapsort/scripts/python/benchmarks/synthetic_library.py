@@ -0,0 +1,176 @@
+"""
+Génération reproductible de bibliothèques de photos synthétiques pour les benchmarks.
+
+Les images sont des JPEG avec des EXIF contrôlés (date, GPS), regroupées en jours et en scènes.
+Chaque scène peut produire une rafale de quasi-doublons, et une partie des images est floutée.
+Une même spécification (graine comprise) produit toujours la même bibliothèque : un dossier déjà
+généré avec la même spécification est réutilisé.
+
+Usage : python benchmarks/synthetic_library.py --directory synthetic_1000 --images 1000
+"""
+import os
+import json
+import random
+import argparse
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+
+from PIL import Image, ImageDraw, ImageFilter
+
+# Lieux utilisés pour les coordonnées GPS (latitude, longitude)
+PLACES = [(46.8139, -71.2080), (48.4284, -71.0685), (45.5017, -73.5673), (48.8566, 2.3522), (40.7128, -74.0060)]
+
+SPEC_FILE = "library_spec.json"
+
+
+def default_spec(n_images, seed=0):
+    return {
+        "n_images": n_images,
+        "seed": seed,
+        "images_per_day": 120,     # Nombre moyen d'images par jour
+        "scene_size": 8,           # Nombre moyen d'images par scène
+        "burst_ratio": 0.3,        # Part des scènes prises en rafale (quasi-doublons)
+        "blur_ratio": 0.1,         # Part des images floues
+        "gps_ratio": 0.7,          # Part des images géolocalisées
+        "no_date_ratio": 0.02,     # Part des images sans date EXIF
+        "size": [480, 360],
+        "start_date": "2024:01:01",
+    }
+
+
+def to_dms(value):
+    value = abs(value)
+    degrees = int(value)
+    minutes = int((value - degrees) * 60)
+    seconds = round((value - degrees - minutes / 60) * 3600, 2)
+    return (float(degrees), float(minutes), seconds)
+
+
+def plan_library(spec):
+    """
+    Description de chaque image (date, GPS, scène, rafale, flou), calculée à partir de la graine uniquement
+    """
+    rng = random.Random(spec["seed"])
+    start = datetime.strptime(spec["start_date"], "%Y:%m:%d")
+    plans = []
+    day, time_of_day, scene = 0, timedelta(hours=8), 0
+    day_remaining = max(1, int(rng.expovariate(1 / spec["images_per_day"])))
+
+    while len(plans) < spec["n_images"]:
+        scene += 1
+        scene_size = max(1, int(rng.expovariate(1 / spec["scene_size"])))
+        burst = rng.random() < spec["burst_ratio"]
+        place = rng.choice(PLACES) if rng.random() < spec["gps_ratio"] else None
+
+        for frame in range(scene_size):
+            if day_remaining <= 0:
+                day += rng.randint(1, 3)
+                time_of_day = timedelta(hours=8)
+                day_remaining = max(1, int(rng.expovariate(1 / spec["images_per_day"])))
+
+            # Rafale : une seconde entre les images, sinon quelques minutes
+            time_of_day += timedelta(seconds=1) if burst and frame else timedelta(seconds=rng.randint(30, 900))
+            date = None if rng.random() < spec["no_date_ratio"] else start + timedelta(days=day) + time_of_day
+            plans.append({
+                "index": len(plans),
+                "date": date.strftime("%Y:%m:%d %H:%M:%S") if date else None,
+                "gps": [place[0] + rng.uniform(-0.01, 0.01), place[1] + rng.uniform(-0.01, 0.01)] if place else None,
+                "scene": scene,
+                "frame": frame if burst else frame * 7,
+                "blur": rng.random() < spec["blur_ratio"],
+            })
+            day_remaining -= 1
+            if len(plans) >= spec["n_images"]:
+                break
+
+    return plans
+
+
+def render(args):
+    """
+    Dessine et enregistre une image (exécuté dans un pool de processus)
+    """
+    directory, spec, plan = args
+    width, height = spec["size"]
+
+    # Le décor dépend de la scène, le léger décalage du numéro d'image dans la scène
+    rng = random.Random(plan["scene"] * 7919 + spec["seed"])
+    image = Image.new("RGB", (width, height), tuple(rng.randint(0, 255) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    shift = plan["frame"] * 3
+    for _ in range(12):
+        x, y = rng.randint(0, width), rng.randint(0, height)
+        w, h = rng.randint(20, width // 2), rng.randint(20, height // 2)
+        color = tuple(rng.randint(0, 255) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.rectangle([x + shift, y, x + w + shift, y + h], fill=color)
+        else:
+            draw.ellipse([x + shift, y, x + w + shift, y + h], fill=color)
+
+    # Texture fine : donne une variance du Laplacien réaliste aux images nettes
+    noise = Image.effect_noise((width, height), 40).convert("RGB")
+    image = Image.blend(image, noise, 0.15)
+    if plan["blur"]:
+        image = image.filter(ImageFilter.GaussianBlur(6))
+
+    exif = Image.Exif()
+    if plan["date"]:
+        exif[0x0132] = plan["date"]
+    if plan["gps"]:
+        latitude, longitude = plan["gps"]
+        gps = exif.get_ifd(0x8825)
+        gps[1], gps[2] = ("N" if latitude >= 0 else "S"), to_dms(latitude)
+        gps[3], gps[4] = ("E" if longitude >= 0 else "W"), to_dms(longitude)
+
+    image.save(os.path.join(directory, f"IMG_{plan['index']:06d}.jpg"), exif=exif, quality=85)
+
+
+def generate_library(directory, n_images, seed=0, processes=None, **overrides):
+    """
+    Génère (ou réutilise) une bibliothèque synthétique.
+
+    :param directory: Dossier de destination.
+    :param n_images: Nombre d'images.
+    :param seed: Graine : même graine et mêmes paramètres, même bibliothèque.
+    :param overrides: Paramètres de default_spec à remplacer (images_per_day, burst_ratio, blur_ratio...).
+    :return: Liste des chemins des images.
+    """
+    spec = {**default_spec(n_images, seed), **overrides}
+    spec_path = os.path.join(directory, SPEC_FILE)
+
+    if os.path.exists(spec_path):
+        with open(spec_path, "r", encoding="utf-8") as f:
+            if json.load(f) == spec:
+                return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".jpg"))
+        raise ValueError(f"{directory} contient une bibliothèque générée avec une autre spécification.")
+
+    os.makedirs(directory, exist_ok=True)
+    plans = plan_library(spec)
+    with Pool(processes) as pool:
+        pool.map(render, [(directory, spec, plan) for plan in plans], chunksize=64)
+
+    # La spécification n'est écrite qu'une fois toutes les images générées
+    with open(spec_path, "w", encoding="utf-8") as f:
+        json.dump(spec, f, indent=2)
+
+    return [os.path.join(directory, f"IMG_{plan['index']:06d}.jpg") for plan in plans]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--directory', type=str, required=True)
+    parser.add_argument('--images', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--images_per_day', type=int, default=120)
+    parser.add_argument('--burst_ratio', type=float, default=0.3)
+    parser.add_argument('--blur_ratio', type=float, default=0.1)
+    parser.add_argument('--gps_ratio', type=float, default=0.7)
+    args = parser.parse_args()
+
+    paths = generate_library(args.directory, args.images, args.seed, images_per_day=args.images_per_day,
+                             burst_ratio=args.burst_ratio, blur_ratio=args.blur_ratio, gps_ratio=args.gps_ratio)
+    print(f"{len(paths)} images dans {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,298 @@
 import os
 import time
+import itertools
 
-from PIL import Image
 from tabulate import tabulate
 import numpy as np
-import torch
-from sklearn.metrics.pairwise import cosine_similarity
-
-from dataframe_completion import DataframeCompletion
-from clustering_manager import ClusteringManager
+import pandas as pd
+
+import progress
+from category_embeddings import CategoryEmbeddingProvider
+from dataframe_completion import DataframeCompletion, unchanged_files
+from functions import IMAGE_EXTENSIONS, get_image_paths
+from clustering_manager import ClusteringManager, day_key, linked_days
+from embeddings_cache import EmbeddingsCache
 from embeddings_manager import EmbeddingsManager
+from inference_backends import DEFAULT_CLIP_MODEL, get_backend
+from image_analysis import ImageAnalyzer, ImageRecord
+from prefilter import FramePrefilter
 from images_manager import ImageCleaner
+from scheduler import Scheduler
+from similarity_index import SimilarityIndex
 
 class CategoriesManager(EmbeddingsManager):
-    def __init__(self, directory, allowed_extensions=None):
-        super().__init__()
+    def __init__(self, directory, allowed_extensions=None, cache_dir=None, workers=None, backend="torch", model=DEFAULT_CLIP_MODEL,
+                 scheduler=None, image_paths=None, prefilter=False, batch_size=None, memory_limit_mb=None, checkpoint=None,
+                 previous_df=None):
+        """
+        :param previous_df: Manifeste précédent (mode incrémental) : EXIF, qualité et pHash des fichiers inchangés en sont repris.
+        :param checkpoint: RunCheckpoint : les étapes et les jours déjà terminés sont repris, les autres y sont enregistrés.
+        :param batch_size: Taille fixe des lots d'inférence (None : adaptative).
+        :param memory_limit_mb: Plafond de mémoire du processus pour la taille des lots (None : aucun).
+        :param image_paths: Images à trier (toutes les images du répertoire si None).
+        :param prefilter: Écarte les doublons de rafale et les images floues avant l'inférence (FramePrefilter).
+        :param backend: Backend d'inférence ("torch", "onnx", "onnx-int8") ou backend déjà construit.
+        :param model: Taille du modèle CLIP ("ViT-L-14" ou "ViT-B-32").
+        :param scheduler: Scheduler partagé (démon) : il n'est pas fermé à la fin du pipeline.
+        """
+        backend = get_backend(backend, model, os.path.join(cache_dir, "onnx") if cache_dir else None)
+        # Cache persistant des embeddings, partagé avec le clustering. Il est versionné par l'espace
+        # d'embeddings du backend : des vecteurs de backends différents ne sont jamais mélangés
+        cache = EmbeddingsCache(cache_dir, backend.embedding_space) if cache_dir else None
+        super().__init__(cache=cache, backend=backend, batch_size=batch_size, memory_limit_mb=memory_limit_mb)
+        # Index des plus proches voisins de toute la bibliothèque, persistant d'un passage à l'autre
+        self.similarity_index = SimilarityIndex(cache_dir, backend.embedding_space) if cache_dir else None
+        # Embeddings textuels des catégories, en cache selon l'espace d'embeddings du backend et les prompts
+        self.category_provider = CategoryEmbeddingProvider(
+            backend.embedding_space, os.path.join(cache_dir, "categories") if cache_dir else None)
         # Types de fichiers autorisés
         if allowed_extensions is None:
-            allowed_extensions = {".jpg", ".jpeg", ".png", ".gif"}
+            allowed_extensions = IMAGE_EXTENSIONS
         self.allowed_extensions = allowed_extensions
 
         # Répertoire
         self.directory = directory 
 
         # Tableau des chemins d'images présent dans le répertoire
-        self.image_paths = self.get_image_paths(directory)
+        self.image_paths = self.get_image_paths(directory) if image_paths is None else image_paths
+
+        # Pool de processus pour le travail CPU (EXIF, pHash, qualité, clustering, nettoyage),
+        # l'inférence reste dans ce processus
+        self.owns_scheduler = scheduler is None
+        self.scheduler = scheduler or Scheduler(workers)
 
         self.image_cleaner = ImageCleaner()
+        self.image_analyzer = ImageAnalyzer(target_size=self.image_cleaner.target_size, scheduler=self.scheduler)
+
+        # Points de reprise du tri (None : aucun)
+        self.checkpoint = checkpoint
+
+        # Lecture des EXIF (en-têtes uniquement) avant tout traitement des images
+        reporter = progress.get_reporter()
+        reporter.start_stage("exif", len(self.image_paths))
+        if checkpoint is not None and checkpoint.done("exif"):
+            self.dataframe_manager = DataframeCompletion(self.image_paths, df=checkpoint.load_frame("exif"))
+        else:
+            self.dataframe_manager = DataframeCompletion(self.image_paths, scheduler=self.scheduler, previous_df=previous_df)
+            if checkpoint is not None:
+                checkpoint.save_frame("exif", self.dataframe_manager.get_dataframe(), images=len(self.image_paths))
+        self.df = self.dataframe_manager.get_dataframe()
+        reporter.advance(len(self.image_paths))
+        reporter.end_stage(with_date=int(self.df["date_time"].notna().sum()),
+                           with_gps=int(self.df["latitude"].notna().sum()))
+
+        # Matrice des embeddings alignée sur self.df, produite par la passe d'analyse (analyze_images)
+        self.embeddings = None
+        # Pré-filtre avant l'inférence (None : toutes les images sont encodées)
+        self.prefilter = prefilter
+        self.drops = {}
+
+        # Mode incrémental : lignes reprises telles quelles du manifeste précédent
+        self.kept_df = None
+        self.reprocessed_paths = None
+        # Mode incrémental : chemin -> (qualité, pHash) des images inchangées des jours retraités
+        self.known_analysis = {}
+        self.first_cluster_id = 0
+
+
+    def analyze_images(self):
+        """
+        Passe d'analyse unique : chaque image est décodée une fois pour obtenir sa qualité, son pHash
+        et son embedding. Complète self.df et remplit la matrice self.embeddings alignée.
+        """
+        print(f"ETAPE 1 - Analyse et génération des embeddings : \n")
+        reporter = progress.get_reporter()
+        reporter.start_stage("analysis", len(self.df), legacy="1/5")
+        records, self.embeddings = self.chunked_analysis()
+        self.df = self.dataframe_manager.add_analysis(records)
+
+        if self.prefilter:
+            self.df["drop_reason"] = self.df["path"].map(lambda path: self.drops[path][0] if path in self.drops else None)
+            self.df["kept_frame"] = self.df["path"].map(lambda path: self.drops[path][1] if path in self.drops else None)
+
+        if self.cache is not None:
+            lookups = self.cache.hits + self.cache.misses
+            reporter.metric(cache_hits=self.cache.hits, cache_misses=self.cache.misses,
+                            cache_hit_rate=round(self.cache.hits / lookups, 4) if lookups else None)
+        if self.prefilter:
+            reasons = [reason for reason, _ in self.drops.values()]
+            reporter.metric(dropped_duplicates=reasons.count("duplicate"), dropped_blurry=reasons.count("blurry"))
+        if self.checkpoint is not None:
+            reporter.metric(resumed_images=self.resumed_images)
+        reporter.metric(**self.batching.report())
+        reporter.end_stage(backend=self.backend.name)
+
+        if self.similarity_index is not None:
+            self.index_embeddings()
+
+
+    def day_chunks(self, paths, days):
+        """
+        Regroupe des images triées par jour en groupes de jours consécutifs d'au moins quatre lots d'inférence
+        (un grand jour forme un groupe à lui seul)
+
+        :return: Générateur de tuples (jours du groupe, chemins du groupe).
+        """
+        chunk_days, chunk_paths = [], []
+        for path, day in zip(paths, days):
+            if chunk_days and day != chunk_days[-1]:
+                if len(chunk_paths) >= 4 * self.batch_size:
+                    yield chunk_days, chunk_paths
+                    chunk_days, chunk_paths = [], []
+            if not chunk_days or day != chunk_days[-1]:
+                chunk_days.append(day)
+            chunk_paths.append(path)
+        if chunk_paths:
+            yield chunk_days, chunk_paths
+
+
+    def chunked_analysis(self):
+        """
+        Passe d'analyse dans l'ordre chronologique, par groupes de jours consécutifs. Chaque groupe est un point
+        de reprise : après une interruption, les groupes déjà analysés sont relus au lieu d'être recalculés.
+        Avec le pré-filtre, seules les images retenues par le FramePrefilter sont encodées.
+
+        :return: Tuple (records, embeddings) alignés sur les lignes de self.df.
+        """
+        days = self.df["date_time"].map(day_key)
+        # Tri stable : les images sans date gardent l'ordre du dossier
+        order = pd.DataFrame({"day": days, "date_time": self.df["date_time"]}).sort_values(
+            ["day", "date_time"], kind="stable", na_position="last").index.to_numpy()
+        paths = self.df["path"].iloc[order].tolist()
+        ordered_days = days.iloc[order].tolist()
+
+        prefilter = None
+        if self.prefilter:
+            prefilter = FramePrefilter(dict(zip(self.df["path"], days)), dict(zip(self.df["path"], self.df["date_time"])))
+
+        # Groupes déjà analysés par un tri interrompu, puis groupes des jours restants
+        chunks = []
+        done_days = set()
+        if self.checkpoint is not None:
+            current_days = set(ordered_days)
+            chunks = [(list(chunk), None) for chunk in self.checkpoint.state["chunks"] if set(chunk) <= current_days]
+            done_days = {day for chunk, _ in chunks for day in chunk}
+        remaining = [(path, day) for path, day in zip(paths, ordered_days) if day not in done_days]
+
+        reporter = progress.get_reporter()
+        records_by_path, embeddings_by_path = {}, {}
+        self.resumed_images = 0
+        new_chunks = self.day_chunks([path for path, _ in remaining], [day for _, day in remaining])
+        for chunk_days, chunk_paths in itertools.chain(chunks, new_chunks):
+            if chunk_paths is None:
+                chunk_paths, quality, phash, embeddings, drops = self.checkpoint.load_chunk(chunk_days)
+                records = [ImageRecord(path=path, quality=q, phash=h) for path, q, h in zip(chunk_paths, quality, phash)]
+                reporter.advance(len(records))
+                self.resumed_images += len(records)
+            else:
+                records, embeddings = self.analyze_and_embed(chunk_paths, self.image_analyzer, prefilter,
+                                                                 known=self.known_analysis)
+                drops = {path: prefilter.drops[path] for path in chunk_paths if path in prefilter.drops} if prefilter else {}
+                if self.checkpoint is not None:
+                    self.checkpoint.save_chunk(chunk_days, records, embeddings, drops)
+
+            self.drops.update(drops)
+            for row, record in enumerate(records):
+                records_by_path[record.path] = record
+                if embeddings is not None and not np.isnan(embeddings[row]).any():
+                    embeddings_by_path[record.path] = embeddings[row]
+
+        # Retour à l'ordre de self.df
+        records = [records_by_path[path] for path in self.df["path"]]
+        if not embeddings_by_path:
+            return records, None
+
+        dim = len(next(iter(embeddings_by_path.values())))
+        matrix = np.full((len(records), dim), np.nan, dtype=np.float32)
+        for row, path in enumerate(self.df["path"]):
+            if path in embeddings_by_path:
+                matrix[row] = embeddings_by_path[path]
+        return records, matrix
+
+
+    def inherit_from_kept_frames(self):
+        """
+        Les images écartées par le pré-filtre reprennent le cluster et la catégorie de l'image conservée
+        à laquelle elles sont rattachées
+        """
+        if not self.drops:
+            return self.df
+
+        columns = ["cluster", "categories", "best_category", "category_score", "category_margin"]
+        columns = [column for column in columns if column in self.df.columns]
+        by_path = self.df.set_index("path")[columns]
+        dropped = self.df["path"].isin(self.drops)
+        kept_frames = self.df.loc[dropped, "path"].map(lambda path: self.drops[path][1])
+        for column in columns:
+            self.df.loc[dropped, column] = by_path.loc[kept_frames, column].to_numpy()
+        return self.df
+
 
-        self.dataframe_manager = DataframeCompletion(self.image_paths)
-        self.df = DataframeCompletion(self.image_paths).get_dataframe()
+    def index_embeddings(self):
+        """
+        Mise à jour de l'index de similarité : ajout des images analysées, retrait des images supprimées du dossier
+        """
+        if self.embeddings is not None:
+            self.similarity_index.add(self.df["path"].tolist(), self.embeddings)
+
+        directory = os.path.abspath(self.directory)
+        present = {os.path.abspath(path) for path in self.image_paths}
+        self.similarity_index.remove([path for path in self.similarity_index.paths()
+                                      if os.path.dirname(path) == directory and path not in present])
+
+
+    def find_near_duplicates(self, threshold=0.95):
+        """
+        Doublons entre jours ou entre dossiers : pour chaque image, l'image quasi identique la plus proche
+        prise un autre jour, ou ailleurs dans la bibliothèque. Les doublons d'un même jour sont déjà
+        écartés par le nettoyage des clusters.
+
+        En mode incrémental, seules les images retraitées sont recherchées : les images conservées gardent
+        le doublon du manifeste précédent, sauf si ce doublon a été retraité ou retiré de l'index.
+
+        :param threshold: Similarité cosinus minimale entre deux embeddings.
+        :return: DataFrame avec les colonnes near_duplicate_of (chemin absolu) et near_duplicate_score.
+        """
+        reporter = progress.get_reporter()
+        reporter.start_stage("similarity", len(self.df))
+        days = {os.path.abspath(path): day_key(date) for path, date in zip(self.df["path"], self.df["date_time"])}
+
+        best = {}
+        queried = list(days)
+        columns = ["near_duplicate_of", "near_duplicate_score"]
+        if self.reprocessed_paths is not None and self.kept_df is not None and set(columns) <= set(self.kept_df.columns):
+            reprocessed = {os.path.abspath(path) for path in self.reprocessed_paths}
+            queried = [path for path in queried if path in reprocessed]
+            for path, other, score in zip(self.kept_df["path"], *(self.kept_df[column] for column in columns)):
+                if pd.isna(other):
+                    continue
+                path = os.path.abspath(path)
+                if other in reprocessed or other not in self.similarity_index:
+                    queried.append(path)
+                else:
+                    best[path] = (other, float(score))
+
+        for a, b, score in self.similarity_index.near_duplicates(queried, threshold=threshold):
+            if a in days and b in days and days[a] == days[b]:
+                continue
+            for path, other in ((a, b), (b, a)):
+                if path in days and score > best.get(path, (None, -1.0))[1]:
+                    best[path] = (other, score)
+        reporter.advance(len(self.df))
+
+        abs_paths = [os.path.abspath(path) for path in self.df["path"]]
+        self.df["near_duplicate_of"] = [best[path][0] if path in best else None for path in abs_paths]
+        self.df["near_duplicate_score"] = [best[path][1] if path in best else np.nan for path in abs_paths]
+        reporter.end_stage(indexed_images=len(self.similarity_index), queried_images=len(queried),
+                           near_duplicates=len(best))
+        return self.df
 
 
     def get_image_paths(self, directory):
         """
         Récupère dans un tableau le path des images d'un directory 
         """
-        image_paths = [os.path.join(directory, filename) for filename in os.listdir(directory) if os.path.splitext(filename)[1].lower() in self.allowed_extensions]
-        return image_paths
+        return get_image_paths(directory, self.allowed_extensions)
 
     
     def get_predifined_categories(self):
@@ -48,6 +303,7 @@ class CategoriesManager(EmbeddingsManager):
                                  "Neige", "Bâtiment", "Autres", "Famille et amis", "Animaux"]
 
         # Ajout de traduction anglaise pour chaque catégorie pour améliorer la correspondance car CLIP fonctionne mieux en anglais qu'en français
+        # Une catégorie peut aussi être associée à une liste de prompts, dont les embeddings sont moyennés
         fr_to_en = {
             "Ville": "City urban buildings",
             "Plage": "Beach sea ocean sand",
@@ -65,30 +321,43 @@ class CategoriesManager(EmbeddingsManager):
         return en_categories, predefined_categories
 
 
-    def get_cluster_images(self, image_paths):
+    def get_cluster_paths(self, image_paths, analysis=None):
         """
-        Conversion des path en images au travers d'un tableau
+        Nettoyage d'un cluster : retourne les chemins des images retenues
+
+        :param analysis: DataFrame indexé par chemin avec les colonnes quality et phash de la passe d'analyse
         """
-        # Suppression images en double et images floues
-        image_paths = self.image_cleaner.clean_cluster(image_paths)
+        image_paths = self.get_clusters_paths([image_paths], analysis)[0]
 
         if not image_paths:
             print("Aucune image retenue après nettoyage!")
-            return []
-        
-        # Encodage par lots des images du cluster
-        cluster_images = []
-
-        # Chargement des images du cluster
-        for path in image_paths:
-            try:
-                image = Image.open(path).convert("RGB")
-                cluster_images.append(image)
-            except Exception as e:
-                print(f"Erreur lors du chargement de l'image {path}: {e}")
-                continue
 
-        return cluster_images
+        return image_paths
+
+
+    def get_clusters_paths(self, clusters_paths, analysis=None):
+        """
+        Nettoyage de plusieurs clusters, indépendants les uns des autres : ils sont répartis
+        entre les processus du Scheduler et les résultats sont rendus dans l'ordre des clusters.
+
+        :param clusters_paths: Liste des listes de chemins de chaque cluster
+        :param analysis: DataFrame indexé par chemin avec les colonnes quality et phash de la passe d'analyse
+        :return: Liste des listes de chemins retenus, alignée sur clusters_paths
+        """
+        all_images_with_quality, all_hashes = [], []
+        for image_paths in clusters_paths:
+            images_with_quality, hashes = None, None
+            if analysis is not None:
+                rows = analysis.loc[image_paths].dropna()
+                images_with_quality = list(zip(rows.index, rows["quality"]))
+                hashes = rows["phash"].to_numpy(dtype=np.uint64)
+            all_images_with_quality.append(images_with_quality)
+            all_hashes.append(hashes)
+
+        # Suppression images en double et images floues
+        n_clusters = len(clusters_paths)
+        return self.scheduler.map(self.image_cleaner.clean_cluster, clusters_paths, [100.0] * n_clusters,
+                                  [20] * n_clusters, all_images_with_quality, all_hashes)
 
 
     def best_cluster_category(self, all_embeddings, category_embeddings, predefined_categories):
@@ -102,7 +371,8 @@ class CategoriesManager(EmbeddingsManager):
         cluster_centroid = cluster_centroid / np.linalg.norm(cluster_centroid)
 
         # Calcul des similarités avec chaque catégorie
-        similarities = cosine_similarity([cluster_centroid], category_embeddings)[0]
+        # (centroïde et catégories sont normalisés : la similarité cosinus est un produit scalaire)
+        similarities = category_embeddings @ cluster_centroid
 
         # Normalisation des scores
         if np.max(similarities) - np.min(similarities) > 1e-8:
@@ -129,58 +399,104 @@ class CategoriesManager(EmbeddingsManager):
         return best_cat, best_cat_score, diff_with_best
 
 
-    def pipeline_categories_embedding_with_clusters(self, threshold=0.1, batch_size=10, predefined_categories=None):
+    def pipeline_categories_embedding_with_clusters(self, threshold=0.1, predefined_categories=None):
         """
         Déduction et attribution d'une catégorie à chaque image, mis à jour dans le pré-csv
         Attribue des catégories en utilisant les clusters comme unité de base.
         Toutes les images d'un même cluster reçoivent la même catégorie.
+
+        :param predefined_categories: Liste de noms de catégories, ou dictionnaire nom -> prompt(s) anglais
         """
         if predefined_categories is None:
             en_categories, predefined_categories = self.get_predifined_categories()
+        elif isinstance(predefined_categories, dict):
+            en_categories = list(predefined_categories.values())
+            predefined_categories = list(predefined_categories.keys())
         else:
             en_categories = predefined_categories
 
-        clustering_manager = ClusteringManager(self.df)
-
-        # Choix de la méthode de clustering
-        clustered_df, clusters_by_day = clustering_manager.perform_neighbors_clustering(threshold=0.6, n_neighbors=3)
-
-        self.df = clustered_df
+        if self.df.empty:
+            print("Aucune image à trier.")
+            return self.df
+
+        if self.embeddings is None:
+            self.analyze_images()
+
+        checkpoint = self.checkpoint
+        if checkpoint is not None and checkpoint.done("categories"):
+            self.resume_stage("categories")
+            self.df = checkpoint.load_frame("categories")
+            return self.df
+
+        if checkpoint is not None and checkpoint.done("clustering"):
+            self.resume_stage("clustering")
+            clusters_by_day = checkpoint.load_json("clustering")
+            cluster_mapping = {path: cluster_name for day_clusters in clusters_by_day.values()
+                               for cluster_name, image_paths in day_clusters.items() for path in image_paths}
+            self.df["cluster"] = self.df["path"].map(cluster_mapping)
+        else:
+            clustering_manager = ClusteringManager(self.df, cache=self.cache, embeddings=self.embeddings,
+                                                   first_cluster_id=self.first_cluster_id, scheduler=self.scheduler,
+                                                   backend=self.backend)
+
+            # Choix de la méthode de clustering
+            clustered_df, clusters_by_day = clustering_manager.perform_neighbors_clustering(threshold=0.6, n_neighbors=3)
+
+            self.df = clustered_df
+            # Embeddings de la passe d'analyse, alignés sur les lignes de self.df : ils sont réutilisés
+            # pour les centroïdes au lieu de ré-encoder les images retenues
+            self.embeddings = clustering_manager.embeddings
+            if checkpoint is not None:
+                checkpoint.save_json("clustering", clusters_by_day, days=len(clusters_by_day))
+        path_to_row = {path: row for row, path in enumerate(self.df["path"])}
+        analysis = self.df.set_index("path")[["quality", "phash"]]
         #print(f"Clustering terminé: {len(clusters_by_day)} jours traités")
 
-        # Encodage des catégories
-        text_inputs = self.clip_processor(text=en_categories, return_tensors="pt", padding=True).to(self.device)
-        with torch.no_grad():
-            category_embeddings = self.clip_model.get_text_features(**text_inputs)
-        category_embeddings = category_embeddings / category_embeddings.norm(p=2, dim=-1, keepdim=True)
-        category_embeddings = category_embeddings.cpu().numpy()
+        # Encodage des catégories (l'encodeur de texte n'est utilisé que si la configuration n'est pas en cache)
+        category_embeddings = self.category_provider.get_embeddings(en_categories, self.text_embedding,
+                                                                    dim=self.embeddings.shape[1] if self.embeddings is not None else None)
 
         #print(clusters_by_day)
 
         # Traitement de chaque cluster
         print(f"ETAPE 3 - Association des noms aux clusters :\n")
         total_clusters = sum(len(clusters) for clusters in clusters_by_day.values())
-        cluster_counter = 0
+        reporter = progress.get_reporter()
+        reporter.start_stage("categories", total_clusters, legacy="3/4")
+        # Nettoyage de tous les clusters en parallèle avant l'attribution des catégories
+        clusters = [(day, cluster_name, image_paths) for day, day_clusters in clusters_by_day.items()
+                    for cluster_name, image_paths in day_clusters.items() if image_paths]
+        if checkpoint is not None and checkpoint.done("cleaning"):
+            cleaned_paths = checkpoint.load_json("cleaning")
+        else:
+            cleaned_paths = self.get_clusters_paths([image_paths for _, _, image_paths in clusters], analysis)
+            if checkpoint is not None:
+                checkpoint.save_json("cleaning", cleaned_paths, clusters=len(clusters))
+        # Bilan du nettoyage en métriques de l'étape, plutôt que des lignes par cluster sur stdout
+        removed_images = sum(len(image_paths) - len(paths) for (_, _, image_paths), paths in zip(clusters, cleaned_paths))
+        empty_clusters = sum(not paths for paths in cleaned_paths)
+        reporter.metric(removed_images=removed_images, empty_clusters=empty_clusters)
+        print(f"Nettoyage : {removed_images} doublons et images floues écartés, {empty_clusters} clusters vides")
+        cleaned_paths = {(day, cluster_name): paths for (day, cluster_name, _), paths in zip(clusters, cleaned_paths)}
+        # Résultats par image : chemin -> (cluster, catégorie, catégorie brute, score, marge avec "Autres")
+        assignments = {}
         for day, day_clusters in clusters_by_day.items():
             for cluster_name, image_paths in day_clusters.items():
-                cluster_counter += 1
-                print(f"Etape [3/4] : [{cluster_counter}/{total_clusters}]")
+                reporter.advance()
 
                 if not image_paths:
                     continue
 
                 #print(f"\nTraitement du cluster {cluster_name} avec {len(image_paths)} images")
 
-                cluster_images = self.get_cluster_images(image_paths)
-                if not cluster_images:
+                cluster_paths = cleaned_paths[(day, cluster_name)]
+                if not cluster_paths:
                     continue
 
-                # Traitement des images par lots pour éviter les problèmes de mémoire
-                all_embeddings = []
-                for i in range(0, len(cluster_images), batch_size):
-                    batch_images = cluster_images[i:i + batch_size]
-                    image_embeddings = self.image_embedding(images=batch_images)
-                    all_embeddings.append(image_embeddings)
+                # Récupération des embeddings du clustering (les images non encodées sont ignorées)
+                cluster_embeddings = self.embeddings[[path_to_row[path] for path in cluster_paths]]
+                cluster_embeddings = cluster_embeddings[~np.isnan(cluster_embeddings).any(axis=1)]
+                all_embeddings = [cluster_embeddings] if len(cluster_embeddings) else []
 
                 # Combinaison de tous les embeddings du cluster
                 if all_embeddings:
@@ -202,13 +518,45 @@ class CategoriesManager(EmbeddingsManager):
                     elif best_cat == "Autres" or is_single_image:
                         category = f"Autres/{best_cat}" # Sous dossier dans "Autres" avec la catégorie précédemment attribuée
 
-                    print(f"Cluster {cluster_counter}: catégorie attribuée = {category} (score: {best_cat_score:.3f})")
-
-                    # Mise à jour du DataFrame
                     for path in image_paths:
-                        self.df.loc[self.df["path"] == path, "categories"] = category
+                        assignments[path] = (cluster_name, category, best_cat, best_cat_score, diff_with_best)
+
+        reporter.end_stage(categorized_images=len(assignments))
+
+        # Mise à jour du DataFrame en une seule jointure
+        self.df = self.apply_assignments(assignments)
+        self.df = self.inherit_from_kept_frames()
+        if checkpoint is not None:
+            checkpoint.save_frame("categories", self.df, categorized_images=len(assignments))
 
         return self.df
+
+
+    def resume_stage(self, stage):
+        """
+        Étape reprise d'un tri interrompu : elle est signalée comme terminée sans être recalculée
+        """
+        reporter = progress.get_reporter()
+        reporter.start_stage(stage, len(self.df))
+        reporter.advance(len(self.df))
+        reporter.end_stage(resumed=True)
+
+
+    def apply_assignments(self, assignments):
+        """
+        Applique les catégories des clusters au DataFrame en une seule jointure sur le chemin.
+        Les scores de chaque cluster sont exposés en colonnes pour pouvoir ajuster les seuils sans refaire l'inférence.
+
+        :param assignments: Dictionnaire chemin -> (cluster, catégorie, catégorie brute, score, marge)
+        """
+        columns = ["cluster", "categories", "best_category", "category_score", "category_margin"]
+        assignment_df = pd.DataFrame.from_dict(assignments, orient="index", columns=columns)
+        assignment_df["category_score"] = assignment_df["category_score"].astype(float)
+        assignment_df["category_margin"] = assignment_df["category_margin"].astype(float)
+
+        # Le cluster vient du clustering, y compris pour les clusters sans catégorie
+        df = self.df.drop(columns=columns[1:], errors="ignore")
+        return df.join(assignment_df[columns[1:]], on="path")
     
 
     def create_autres_subfolders(self, target_directory):
@@ -226,13 +574,97 @@ class CategoriesManager(EmbeddingsManager):
             os.makedirs(target_dir, exist_ok=True)
             print(f"Création du sous-dossier: {target_dir}")
 
-    def pipeline(self, starting_time):
+    def restrict_to_changed_days(self, previous_df):
+        """
+        Mode incrémental : compare les images du dossier au manifeste du passage précédent.
+        Seuls les jours contenant une image nouvelle, modifiée ou supprimée sont retraités, avec les jours
+        que relie à eux un événement passant minuit ; les lignes des autres jours sont conservées
+        avec leur cluster et leur catégorie.
+
+        :param previous_df: DataFrame du manifeste précédent.
+        :return: Ensemble des jours à retraiter.
+        """
+        previous = previous_df.set_index("path")
+        current = self.df.set_index("path")
+
+        unchanged = pd.Index(sorted(unchanged_files(self.df, previous_df)))
+
+        changed = current.index.difference(unchanged)
+        removed = previous.index.difference(current.index)
+        affected_days = {day_key(date) for date in current.loc[changed, "date_time"]}
+        affected_days |= {day_key(date) for date in previous.loc[changed.intersection(previous.index).append(removed), "date_time"]}
+
+        # Un événement qui passe minuit est retraité en entier : les jours qu'il relie (avant ou après
+        # la modification) sont ajoutés de proche en proche
+        neighbours = {}
+        for day, next_day in linked_days(self.df["date_time"]) | linked_days(previous_df["date_time"]):
+            neighbours.setdefault(day, set()).add(next_day)
+            neighbours.setdefault(next_day, set()).add(day)
+        pending = list(affected_days)
+        while pending:
+            for day in neighbours.get(pending.pop(), ()):
+                if day not in affected_days:
+                    affected_days.add(day)
+                    pending.append(day)
+
+        print(f"Mode incrémental : {len(changed)} images nouvelles ou modifiées, {len(removed)} supprimées, "
+              f"{len(affected_days)} jours à retraiter")
+
+        current_days = self.df["date_time"].map(day_key)
+        kept_paths = self.df.loc[~current_days.isin(affected_days), "path"]
+        self.kept_df = previous_df[previous_df["path"].isin(kept_paths)].reset_index(drop=True)
+
+        self.df = self.df[current_days.isin(affected_days)].reset_index(drop=True)
+        self.dataframe_manager.df = self.df
+        self.reprocessed_paths = self.df["path"].tolist()
+
+        # Qualité et pHash des images inchangées des jours retraités : seules les nouvelles images sont décodées
+        if {"quality", "phash"} <= set(previous.columns):
+            reused = previous.loc[unchanged.intersection(self.df["path"])]
+            reused = reused[reused["quality"].notna() & reused["phash"].notna()]
+            self.known_analysis = {path: (float(quality), int(phash))
+                                   for path, quality, phash in zip(reused.index, reused["quality"], reused["phash"])}
+
+        # Les nouveaux clusters sont numérotés à la suite de ceux conservés
+        kept_ids = self.kept_df["cluster"].astype(str).str.extract(r"^cluster_(\d+)$")[0].dropna().astype(int)
+        self.first_cluster_id = int(kept_ids.max()) + 1 if len(kept_ids) else 0
+
+        return affected_days
+
+    def pipeline(self, starting_time, previous_df=None):
+        """
+        :param previous_df: Manifeste du passage précédent pour le mode incrémental (None : tout retraiter)
+        :return: Manifeste du tri (DataFrame), écrit sur disque par l'appelant
+        """
+        if previous_df is not None:
+            self.restrict_to_changed_days(previous_df)
+
         #print("RECHERCHE DES CATEGORIES AVEC CLUSTERING...")
-        self.df = self.pipeline_categories_embedding_with_clusters()
+        try:
+            self.df = self.pipeline_categories_embedding_with_clusters()
+        finally:
+            if self.owns_scheduler:
+                self.scheduler.close()
+            # Sauvegardé même si le tri est interrompu : les embeddings déjà calculés ne sont pas perdus
+            if self.cache is not None:
+                self.cache.save()
+            if self.similarity_index is not None:
+                self.similarity_index.save()
         categories_time = time.time() - starting_time
         #print(tabulate(self.df, headers="keys", tablefmt="psql"))
         print(f"Temps de recherche des catégories : {categories_time:.2f} secondes")
 
+        if self.cache is not None:
+            print(f"Cache d'embeddings : {self.cache.hits} trouvés, {self.cache.misses} calculés")
+
+        # Les images retraitées sont remises avec les lignes conservées du manifeste précédent
+        if self.kept_df is not None and not self.kept_df.empty:
+            self.df = pd.concat([self.kept_df, self.df], ignore_index=True)
+
+        # Les doublons sont recherchés pour toutes les images, y compris celles des jours conservés
+        if self.similarity_index is not None and len(self.similarity_index):
+            self.df = self.find_near_duplicates()
+
         self.dataframe_manager.df = self.df
         print(f"ETAPE 4 - Copie des images triées :\n")
-        self.dataframe_manager.save_to_csv(self.directory + ".csv")
\ No newline at end of file
+        return self.df
\ No newline at end of file
@@ -0,0 +1,77 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+
+
+class CategoryEmbeddingProvider:
+    """
+    Embeddings textuels des catégories, mis en cache sur disque.
+
+    La clé du cache dépend de l'espace d'embeddings du backend et de la liste exacte des prompts : une configuration
+    déjà rencontrée ne repasse donc jamais par l'encodeur de texte. Une catégorie peut être décrite
+    par plusieurs prompts, dont les embeddings sont moyennés (prompt ensembling).
+    """
+    def __init__(self, embedding_space, cache_dir=None):
+        """
+        :param embedding_space: Espace d'embeddings du backend qui encode les prompts (backend.embedding_space).
+        :param cache_dir: Dossier du cache (None : cache en mémoire uniquement).
+        """
+        self.embedding_space = embedding_space
+        self.cache_dir = cache_dir
+        self.memory = {}
+
+    @staticmethod
+    def normalize_prompts(categories_prompts):
+        """
+        Chaque catégorie est décrite par une liste de prompts (une chaîne seule est acceptée)
+        """
+        return [[prompts] if isinstance(prompts, str) else list(prompts) for prompts in categories_prompts]
+
+    def cache_key(self, categories_prompts):
+        payload = json.dumps({"space": self.embedding_space, "prompts": categories_prompts}, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_embeddings(self, categories_prompts, encode_text, dim=None):
+        """
+        :param categories_prompts: Liste (une entrée par catégorie) de prompts ou de listes de prompts.
+        :param encode_text: Fonction liste de textes -> matrice d'embeddings normalisés, appelée
+                            uniquement si la configuration n'est pas en cache.
+        :param dim: Dimension des embeddings d'images : un cache d'une autre dimension est ignoré et réécrit.
+        :return: Matrice (nombre de catégories, dim) des embeddings normalisés.
+        """
+        categories_prompts = self.normalize_prompts(categories_prompts)
+        key = self.cache_key(categories_prompts)
+
+        if key in self.memory and (dim is None or self.memory[key].shape[1] == dim):
+            return self.memory[key]
+
+        path = os.path.join(self.cache_dir, f"{key}.npy") if self.cache_dir else None
+        if path and os.path.exists(path):
+            cached = np.load(path)
+            if dim is None or cached.shape[1] == dim:
+                self.memory[key] = cached
+                return cached
+            print(f"Cache des catégories de dimension {cached.shape[1]} au lieu de {dim} : les prompts sont réencodés.")
+
+        # Tous les prompts sont encodés en un seul lot puis moyennés par catégorie
+        flat_prompts = [prompt for prompts in categories_prompts for prompt in prompts]
+        prompt_embeddings = np.asarray(encode_text(flat_prompts), dtype=np.float32)
+
+        embeddings = []
+        start = 0
+        for prompts in categories_prompts:
+            mean = prompt_embeddings[start:start + len(prompts)].mean(axis=0)
+            embeddings.append(mean / np.linalg.norm(mean))
+            start += len(prompts)
+        embeddings = np.vstack(embeddings)
+
+        if path:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = path + ".tmp.npy"
+            np.save(tmp_path, embeddings)
+            os.replace(tmp_path, path)
+
+        self.memory[key] = embeddings
+        return embeddings
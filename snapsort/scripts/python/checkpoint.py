@@ -0,0 +1,203 @@
+import os
+import re
+import json
+import hashlib
+
+import numpy as np
+
+import progress
+from manifest import default_format, read_manifest, write_manifest
+
+
+def default_run_dir(directory):
+    """
+    Dossier des points de reprise d'un tri : à côté du dossier trié, comme le manifeste
+    """
+    return os.path.normpath(directory) + ".run"
+
+
+def run_fingerprint(image_paths, **options):
+    """
+    Empreinte d'un tri : images (chemin, taille, date de modification) et options qui changent le résultat.
+    Une reprise n'est possible que si l'empreinte n'a pas changé.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for path in sorted(image_paths):
+        try:
+            stat = os.stat(path)
+            h.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+        except OSError:
+            h.update(f"{path}\0missing\n".encode("utf-8"))
+    h.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+def write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class CheckpointError(Exception):
+    """
+    Dossier des points de reprise inutilisable (dossier existant qui n'appartient pas à un tri)
+    """
+
+
+class RunCheckpoint:
+    """
+    Points de reprise d'un tri, écrits au fil des étapes dans un dossier de travail :
+    table des EXIF, analyse et embeddings par groupes de jours, clusters, nettoyage et catégories.
+    Chaque fichier est écrit dans un fichier temporaire puis renommé : un tri interrompu à n'importe quel
+    moment (processus tué, application fermée) ne laisse que des points de reprise complets.
+    L'état (run.json) n'est mis à jour qu'après l'écriture des données de l'étape. Il liste aussi les fichiers
+    écrits : seuls ces fichiers sont supprimés, à la fin d'un tri réussi ou au départ d'un nouveau tri.
+    """
+    def __init__(self, run_dir, fingerprint, resume=False):
+        """
+        :param run_dir: Dossier des points de reprise (absent, vide, ou créé par un tri précédent).
+        :param fingerprint: Empreinte du tri (run_fingerprint).
+        :param resume: Reprendre les étapes terminées d'un tri interrompu (sinon les points de reprise sont effacés).
+        """
+        self.run_dir = run_dir
+        self.state_path = os.path.join(run_dir, "run.json")
+        self.days_dir = os.path.join(run_dir, "days")
+        self.format = default_format()
+
+        if not os.path.exists(self.state_path) and os.path.isdir(run_dir) and os.listdir(run_dir):
+            raise CheckpointError(f"Le dossier {run_dir} n'est pas vide et ne contient pas de points de reprise : "
+                                  f"choisissez un autre dossier avec --run_dir.")
+
+        state = None
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Points de reprise illisibles, le tri repart de zéro : {e}")
+
+        if resume and state is None:
+            print(f"Aucun tri interrompu dans {run_dir}, le tri repart de zéro.")
+        elif resume and state.get("fingerprint") != fingerprint:
+            print("Les images ou les options ont changé depuis le tri interrompu, le tri repart de zéro.")
+        elif resume:
+            print(f"Reprise du tri interrompu : étapes terminées {sorted(state['stages']) or 'aucune'}, "
+                  f"{len(state['chunks'])} groupes de jours déjà analysés")
+
+        if not resume or state is None or state.get("fingerprint") != fingerprint:
+            self.state = state if state is not None else {"files": []}
+            self.clear()
+            state = {"fingerprint": fingerprint, "stages": {}, "chunks": [], "files": []}
+        state.setdefault("files", [])
+        self.resumed = bool(state["stages"] or state["chunks"])
+        self.state = state
+        os.makedirs(self.days_dir, exist_ok=True)
+        self.save_state()
+
+    def save_state(self):
+        write_json(self.state_path, self.state)
+
+    def done(self, stage):
+        return stage in self.state["stages"]
+
+    def complete(self, stage, **info):
+        self.state["stages"][stage] = info
+        self.save_state()
+        progress.get_reporter().emit("checkpoint", stage=stage, **info)
+
+    def track(self, path):
+        """
+        Inscrit un fichier dans l'état avant de l'écrire : il sera supprimé avec les points de reprise
+        """
+        relative = os.path.relpath(path, self.run_dir)
+        if relative not in self.state["files"]:
+            self.state["files"].append(relative)
+            self.save_state()
+        return path
+
+    def frame_path(self, name):
+        return self.track(os.path.join(self.run_dir, f"{name}.{self.format}"))
+
+    def save_frame(self, stage, df, **info):
+        write_manifest(df, self.frame_path(stage), verbose=False)
+        self.complete(stage, **info)
+
+    def load_frame(self, stage):
+        return read_manifest(self.frame_path(stage))
+
+    def save_json(self, stage, data, **info):
+        write_json(self.track(os.path.join(self.run_dir, f"{stage}.json")), data)
+        self.complete(stage, **info)
+
+    def load_json(self, stage):
+        with open(os.path.join(self.run_dir, f"{stage}.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def chunk_path(self, days):
+        name = re.sub(r"[^A-Za-z0-9_-]+", "_", f"{days[0]}__{days[-1]}")
+        return os.path.join(self.days_dir, f"{name}.npz")
+
+    def chunk_done(self, days):
+        return list(days) in self.state["chunks"]
+
+    def save_chunk(self, days, records, embeddings, drops):
+        """
+        Résultats de l'analyse d'un groupe de jours consécutifs : qualité, pHash, embeddings et images écartées
+        """
+        paths = [record.path for record in records]
+        data = {
+            "paths": np.array(paths, dtype=str),
+            "quality": np.array([np.nan if record.quality is None else record.quality for record in records], dtype=float),
+            "phash": np.array([record.phash or 0 for record in records], dtype=np.uint64),
+            "has_phash": np.array([record.phash is not None for record in records], dtype=bool),
+            "drop_reason": np.array([drops[path][0] if path in drops else "" for path in paths], dtype=str),
+            "kept_frame": np.array([drops[path][1] if path in drops else "" for path in paths], dtype=str),
+        }
+        if embeddings is not None:
+            data["embeddings"] = embeddings
+
+        path = self.track(self.chunk_path(days))
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, **data)
+        os.replace(path + ".tmp", path)
+
+        self.state["chunks"].append(list(days))
+        self.save_state()
+        progress.get_reporter().emit("checkpoint", stage="analysis", days=list(days), images=len(paths))
+
+    def load_chunk(self, days):
+        """
+        :return: Tuple (paths, quality, phash, embeddings, drops) ; quality et phash valent None pour une image illisible.
+        """
+        with np.load(self.chunk_path(days)) as data:
+            paths = data["paths"].tolist()
+            quality = [None if np.isnan(q) else float(q) for q in data["quality"]]
+            phash = [int(h) if ok else None for h, ok in zip(data["phash"], data["has_phash"])]
+            embeddings = data["embeddings"] if "embeddings" in data.files else None
+            drops = {path: (reason, kept) for path, reason, kept in zip(paths, data["drop_reason"].tolist(),
+                                                                         data["kept_frame"].tolist()) if reason}
+        return paths, quality, phash, embeddings, drops
+
+    def clear(self):
+        """
+        Supprime les fichiers écrits par les points de reprise, puis leurs dossiers s'ils sont vides
+        """
+        for relative in self.state.get("files", []):
+            for path in (os.path.join(self.run_dir, relative), os.path.join(self.run_dir, relative) + ".tmp"):
+                if os.path.exists(path):
+                    os.remove(path)
+        for path in (self.state_path, self.state_path + ".tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+        for folder in (self.days_dir, self.run_dir):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                pass
+
+    def finish(self):
+        """
+        Tri terminé : les points de reprise ne sont plus utiles
+        """
+        self.clear()
@@ -1,150 +1,332 @@
+import warnings
+from datetime import datetime
+
 import numpy as np
+import pandas as pd
 
+import progress
 from embeddings_manager import EmbeddingsManager
+from manifest import parse_dates
+
+
+def day_key(date_time):
+    """
+    Jour (AAAA:MM:JJ) d'une date du manifeste (datetime ou chaîne EXIF), "no_date" si la date est absente
+    """
+    if isinstance(date_time, str) and date_time:
+        return date_time.split(" ")[0]
+    # NaT est aussi une instance de datetime, mais n'est pas égal à lui-même
+    if isinstance(date_time, datetime) and date_time == date_time:
+        return date_time.strftime("%Y:%m:%d")
+    return "no_date"
+
+
+def banded_similarity(embeddings, n_neighbors):
+    """
+    Similarités entre chaque image et ses n_neighbors suivantes, en une seule opération NumPy.
+
+    :param embeddings: Matrice (N, dim) des embeddings normalisés d'un jour, dans l'ordre chronologique.
+    :return: Matrice (N, n_neighbors) : colonne d-1 = similarité entre l'image i et l'image i + d
+             (-inf au-delà de la fin du jour).
+    """
+    N = len(embeddings)
+    padded = np.concatenate([embeddings, np.zeros((n_neighbors, embeddings.shape[1]), dtype=embeddings.dtype)])
+    windows = np.lib.stride_tricks.sliding_window_view(padded[1:], n_neighbors, axis=0)[:N]
+    band = np.einsum("nd,ndk->nk", embeddings, windows)
+
+    # Les voisins hors du jour (remplissage) ne doivent jamais être retenus
+    band[np.arange(N)[:, None] + np.arange(1, n_neighbors + 1)[None, :] >= N] = -np.inf
+    return band
+
+
+def neighbor_window_clusters(embeddings, threshold=0.6, n_neighbors=3):
+    """
+    Clustering séquentiel par fenêtre de voisins sur la matrice de similarité en bande.
+    Chaque image rejoint le cluster en cours avec le dernier de ses n_neighbors suivants dont la
+    similarité dépasse threshold ; sans nouveau voisin, le cluster en cours est finalisé.
+
+    :return: Tuple (labels, clusters) : tableau des indices de cluster par image (-1 si non clustérisée)
+             et liste des clusters (indices d'images dans l'ordre d'ajout).
+    """
+    N = len(embeddings)
+    if N == 0:
+        return np.full(0, -1, dtype=np.int64), []
+
+    # Dernier voisin de la fenêtre au-dessus du seuil pour chaque image (-1 si aucun)
+    above = banded_similarity(embeddings, n_neighbors) > threshold
+    has_neighbor = above.any(axis=1)
+    last_offset = n_neighbors - np.argmax(above[:, ::-1], axis=1)
+    neighbors = np.where(has_neighbor, np.arange(N) + last_offset, -1).tolist()
+
+    labels = [-1] * N
+    clusters = []
+    current_cluster = []
+    for i in range(N):
+        if labels[i] >= 0:
+            continue
+
+        current_cluster.append(i)
+        labels[i] = len(clusters)
+
+        j = neighbors[i]
+        if j >= 0 and labels[j] < 0:
+            current_cluster.append(j)
+            labels[j] = len(clusters)
+        else:
+            clusters.append(current_cluster)
+            current_cluster = []
+
+    if current_cluster:
+        clusters.append(current_cluster)
+
+    return np.array(labels, dtype=np.int64), clusters
+
+
+# Nature de l'écart entre deux images consécutives de la chronologie
+BURST, CHECK, EVENT = 0, 1, 2
+
+
+def segment_gaps(seconds, days, burst_gap=10.0, gap_factor=4.0, min_gap=300.0, max_gap=7200.0):
+    """
+    Segmentation temporelle des images datées, sans aucun embedding. Chaque écart entre deux images
+    consécutives est classé :
+    - BURST : quelques secondes d'écart, même scène (rafale) ;
+    - EVENT : écart supérieur au seuil du jour, nouvel événement ;
+    - CHECK : entre les deux, la similarité des embeddings décide.
+    Le seuil d'un jour suit son rythme de prise de vue : gap_factor fois l'écart médian entre deux scènes
+    (écarts hors rafales), borné par min_gap et max_gap. Les jours ne coupent pas la chronologie :
+    un événement qui passe minuit reste d'un seul tenant.
+
+    :param seconds: Instants de prise de vue (secondes), dans l'ordre chronologique.
+    :param days: Jour (AAAA:MM:JJ) de chaque image, pour le seuil adaptatif.
+    :return: Tableau (N-1) de BURST, CHECK ou EVENT : écart entre l'image i et l'image i + 1.
+    """
+    gaps = np.diff(np.asarray(seconds, dtype=np.float64))
+    if len(gaps) == 0:
+        return np.zeros(0, dtype=np.int8)
+
+    # Écart médian entre deux scènes, pour le jour de l'image qui précède l'écart (jours contigus dans la chronologie)
+    gap_days = np.asarray(days)[:-1]
+    day_starts = np.flatnonzero(np.concatenate([[True], gap_days[1:] != gap_days[:-1]]))
+    scene_gaps = np.where(gaps > burst_gap, gaps, np.nan)
+    with warnings.catch_warnings():
+        # Jour sans écart entre deux scènes : pas de médiane, seuil minimal
+        warnings.simplefilter("ignore", RuntimeWarning)
+        medians = [np.nanmedian(day_gaps) for day_gaps in np.split(scene_gaps, day_starts[1:])]
+    thresholds = np.repeat(np.clip(np.nan_to_num(np.multiply(gap_factor, medians), nan=min_gap), min_gap, max_gap),
+                           np.diff(np.append(day_starts, len(gaps))))
+
+    kinds = np.full(len(gaps), CHECK, dtype=np.int8)
+    kinds[gaps <= burst_gap] = BURST
+    kinds[gaps > thresholds] = EVENT
+    return kinds
+
+
+def linked_days(date_times, burst_gap=10.0, gap_factor=4.0):
+    """
+    Jours reliés par un événement qui passe minuit : deux images consécutives de jours différents
+    sans écart EVENT entre elles (segment_gaps, sur toute la chronologie). Les images sans date sont ignorées.
+
+    :param date_times: Dates de prise de vue (colonne date_time d'un manifeste).
+    :return: Ensemble de tuples (jour, jour suivant) au format AAAA:MM:JJ.
+    """
+    dates = np.sort(parse_dates(pd.Series(date_times)).dropna().to_numpy())
+    if len(dates) < 2:
+        return set()
+    seconds = dates.astype("datetime64[ms]").astype(np.int64) / 1000.0
+    days = pd.DatetimeIndex(dates).strftime("%Y:%m:%d").to_numpy()
+    kinds = segment_gaps(seconds, days, burst_gap=burst_gap, gap_factor=gap_factor)
+    crossing = (kinds != EVENT) & (days[1:] != days[:-1])
+    return set(zip(days[:-1][crossing], days[1:][crossing]))
+
+
+def event_clusters(embeddings, kinds, threshold=0.6):
+    """
+    Clustering d'une suite chronologique d'images à partir de sa segmentation temporelle (segment_gaps).
+    Les rafales sont regroupées sans comparaison ; la similarité n'est calculée qu'aux écarts CHECK,
+    entre les deux images qui les bordent.
+
+    :param embeddings: Matrice (N, dim) des embeddings normalisés, dans l'ordre chronologique.
+    :param kinds: Écarts entre images consécutives (N-1), de segment_gaps.
+    :return: Tuple (labels, clusters, checks) : comme neighbor_window_clusters, plus le nombre de similarités calculées.
+    """
+    N = len(embeddings)
+    if N == 0:
+        return np.full(0, -1, dtype=np.int64), [], 0
+
+    new_event = kinds == EVENT
+    check = np.flatnonzero(kinds == CHECK)
+    similarities = np.einsum("nd,nd->n", embeddings[check], embeddings[check + 1])
+    new_event[check[similarities <= threshold]] = True
+
+    labels = np.concatenate([[0], np.cumsum(new_event)]).astype(np.int64)
+    clusters = [indices.tolist() for indices in np.split(np.arange(N), np.flatnonzero(new_event) + 1)]
+    return labels, clusters, len(check)
+
+
+def cluster_sequence(embeddings, kinds, threshold=0.6, n_neighbors=3):
+    """
+    Clustering d'une suite d'images : par événements si elle est datée (kinds), sinon par fenêtre de voisins
+
+    :return: Tuple (labels, clusters, checks).
+    """
+    if kinds is None:
+        labels, clusters = neighbor_window_clusters(embeddings, threshold, n_neighbors)
+        return labels, clusters, len(embeddings) * n_neighbors
+    return event_clusters(embeddings, kinds, threshold)
+
 
 class ClusteringManager(EmbeddingsManager):
-    def __init__(self, df):
-        super().__init__()
+    def __init__(self, df, cache=None, embeddings=None, first_cluster_id=0, scheduler=None, backend=None):
+        super().__init__(cache=cache, backend=backend)
         self.df = df
+        # Matrice des embeddings alignée sur les lignes de self.df, déjà calculée par la passe d'analyse
+        # ou remplie par perform_neighbors_clustering
+        self.embeddings = embeddings
+        # Premier identifiant de cluster (mode incrémental : suite des clusters conservés)
+        self.first_cluster_id = first_cluster_id
+        # Pool de processus pour le clustering des jours (None : processus courant)
+        self.scheduler = scheduler
 
     def day_sorting(self):
-        days = {}
-        no_date_images = []
-        for index, row in self.df.iterrows():
-            date = row["date_time"]
-            if date:
-                day = date.split(" ")[0]
-                if day not in days:
-                    days[day] = []
-                days[day].append(row["path"])
-            else:
-                no_date_images.append(row["path"])
-                
-        if no_date_images:
-            days["no_date"] = no_date_images
-            print(f"Images sans date trouvées: {len(no_date_images)}")
-        
-        return days
+        """
+        Regroupe les chemins par jour, dans l'ordre chronologique ("no_date" en dernier)
+        """
+        dates = parse_dates(self.df["date_time"])
+        order = np.argsort(dates.to_numpy(), kind="stable")
+        days = dates.dt.strftime("%Y:%m:%d").fillna("no_date").to_numpy()[order]
+        paths = self.df["path"].to_numpy()[order]
+
+        # Les jours sont contigus après le tri (NaT en dernier)
+        starts = np.flatnonzero(np.concatenate([[True], days[1:] != days[:-1]])) if len(days) else np.zeros(0, dtype=int)
+        days_dict = {days[start]: day_paths.tolist() for start, day_paths in zip(starts, np.split(paths, starts[1:]))}
+
+        if "no_date" in days_dict:
+            print(f"Images sans date trouvées: {len(days_dict['no_date'])}")
+
+        return days_dict
 
     def days_embedding(self, days_dict):
         embeddings_dict = {}
         total_images = sum(len(images) for images in days_dict.values())
-        image_counter = 0
+        reporter = progress.get_reporter()
+        reporter.start_stage("analysis", total_images, legacy="1/5")
         for day, images in days_dict.items():
-            # Génération des embeddings pour chaque image
-            embeddings = self.image_embedding(images)
+            # Génération des embeddings pour chaque image (le cache est consulté en premier)
+            paths, embeddings = self.cached_image_embedding(images)
             
             if embeddings is None:
                 continue
                 
             embeddings_dict[day] = []
-            for i, image in enumerate(images):
-                image_counter += 1
-                print(f"Etape [1/5] : [{image_counter}/{total_images}]")
-                if i < len(embeddings):  # Protection contre les indices hors limites
-                    embeddings_dict[day].append({
-                        'path': image,
-                        'embedding': embeddings[i]
-                    })
+            for path, embedding in zip(paths, embeddings):
+                reporter.advance()
+                embeddings_dict[day].append({
+                    'path': path,
+                    'embedding': embedding
+                })
+        reporter.end_stage()
         return embeddings_dict
 
-    def neighbors_similarity_clustering(self, embeddings_dict, threshold=0.6, n_neighbors=3):
-        clusters_by_day = {}
-        self.global_cluster_id = 0  # On le met en attribut d’instance si tu veux l’utiliser ailleurs
+    def embeddings_matrix(self, embeddings_dict):
+        """
+        Construit la matrice des embeddings alignée sur les lignes de self.df.
+        Les images qui n'ont pas pu être encodées ont une ligne de NaN.
+        """
+        by_path = {image['path']: image['embedding'] for images in embeddings_dict.values() for image in images}
+        if not by_path:
+            return None
 
-        total_images = sum(len(images) for images in embeddings_dict.values())
-        last_number = 1
-        for day, image_list in embeddings_dict.items():
-            clusters = self._cluster_day_embeddings(image_list, threshold, n_neighbors, total_images, last_number)
-            last_number += len(image_list)
-            clusters_by_day[day] = clusters
+        dim = len(next(iter(by_path.values())))
+        matrix = np.full((len(self.df), dim), np.nan, dtype=np.float32)
+        for row, path in enumerate(self.df["path"]):
+            if path in by_path:
+                matrix[row] = by_path[path]
 
-        return clusters_by_day
+        return matrix
 
-    def _cluster_day_embeddings(self, image_list, threshold, n_neighbors, total_images, last_number):
-        paths = [image['path'] for image in image_list]
-        embeddings = np.array([image['embedding'] for image in image_list])
-        N = len(paths)
+    def event_sequences(self, burst_gap=10.0, gap_factor=4.0):
+        """
+        Suites d'images à clustériser, indépendantes les unes des autres : la chronologie des images datées
+        (tous jours confondus) est coupée à chaque nouvel événement de segment_gaps, les images sans date
+        forment une dernière suite. Seules les images encodées sont clustérisées.
 
-        clusters = {}
-        current_cluster = []        # Liste pour stocker les images du cluster en cours
-        already_clustered = set()   # Ensemble pour suivre les images déjà clustérisées
+        :return: Liste de tuples (lignes de self.df dans l'ordre chronologique, écarts, jours) ;
+                 écarts et jours valent None pour la suite des images sans date.
+        """
+        dates = parse_dates(self.df["date_time"]).to_numpy()
+        encoded = ~np.isnan(self.embeddings).any(axis=1)
+        rows = np.flatnonzero(encoded & ~np.isnat(dates))
+        rows = rows[np.argsort(dates[rows], kind="stable")]
+        seconds = dates[rows].astype("datetime64[ms]").astype(np.int64) / 1000.0
+        days = pd.DatetimeIndex(dates[rows]).strftime("%Y:%m:%d").to_numpy()
+        kinds = segment_gaps(seconds, days, burst_gap=burst_gap, gap_factor=gap_factor)
 
-        for i in range(N):
-            print(f"Etape [2/5] : [{i + last_number}/{total_images}]\n")
-            current_img = paths[i]
-            if current_img in already_clustered:
-                continue
+        starts = np.concatenate([[0], np.flatnonzero(kinds == EVENT) + 1]) if len(rows) else np.zeros(0, dtype=int)
+        ends = np.append(starts[1:], len(rows))
+        sequences = [(rows[start:end], kinds[start:end - 1], days[start:end]) for start, end in zip(starts, ends)]
 
-            # Définir la plage de voisins à considérer
-            end_idx = min(i + n_neighbors + 1, N)
-            similar_images = []    # Liste pour stocker les images similaires trouvées
-
-            # Ajouter l'image courante au cluster si pas encore clustérisée
-            if current_img not in already_clustered:
-                current_cluster.append(current_img)
-                already_clustered.add(current_img)
-
-            # Chercher des images similaires parmi les voisins
-            neighbor_img = self._find_similar_neighbors(i, embeddings, paths, threshold, end_idx)
-
-            # Si une image similaire est trouvée, l'ajouter au cluster
-            if neighbor_img and neighbor_img not in already_clustered:
-                current_cluster.append(neighbor_img)
-                already_clustered.add(neighbor_img)
-                similar_images.append(neighbor_img)
-
-            # Si aucune image similaire trouvée et qu'on a un cluster en cours, finaliser le cluster
-            if not similar_images and len(current_cluster) > 0:
-                self._finalize_cluster(clusters, current_cluster)
-
-        # Traitement du dernier cluster s'il n'est pas vide
-        if current_cluster:
-            self._finalize_cluster(clusters, current_cluster)
-
-        # Collecter les images non clustérisées dans "others"
-        other_cluster = self._find_unclustered_images(paths, clusters)
-        if other_cluster:
-            clusters["others"] = other_cluster
-
-        return clusters
-
-    def _find_similar_neighbors(self, i, embeddings, paths, threshold, n_neighbors):
-        neighbor_img = None
-        for j in range(i + 1, n_neighbors):
-            sim = np.dot(embeddings[i], embeddings[j])
-            #print(f"Les photos {paths[i]} et {paths[j]} ont une similarité de {sim:.2f}")
-            if sim > threshold:
-                neighbor_img = paths[j]
-
-        return neighbor_img
-
-    def _finalize_cluster(self, clusters, cluster_images):
-        cluster_name = f"cluster_{self.global_cluster_id}"
-        clusters[cluster_name] = cluster_images.copy()
-        cluster_images.clear()
-        self.global_cluster_id += 1
-
-    def _find_unclustered_images(self, paths, clusters):
-        other_cluster = []
-        for path in paths:
-            found = False
-            for cluster_name, cluster_images in clusters.items():
-                if path in cluster_images:
-                    found = True
-                    break
-            if not found:
-                other_cluster.append(path)
-
-        return other_cluster
+        no_date = np.flatnonzero(encoded & np.isnat(dates))
+        if len(no_date):
+            sequences.append((no_date, None, None))
+        return sequences
+
+    def neighbors_similarity_clustering(self, threshold=0.6, n_neighbors=3):
+        """
+        Clustering par événements : segmentation temporelle, puis similarité des embeddings aux seules frontières
+        incertaines. Les images sans date sont clustérisées par fenêtre de n_neighbors voisins.
+        Chaque cluster est rangé sous le jour de sa première image.
+
+        :return: Dictionnaire jour -> {nom du cluster: chemins}, dans l'ordre chronologique ("no_date" en dernier).
+        """
+        clusters_by_day = {}
+        self.global_cluster_id = self.first_cluster_id  # On le met en attribut d’instance si tu veux l’utiliser ailleurs
+
+        # Les suites sont indépendantes : elles sont clustérisées en parallèle, puis les noms de clusters
+        # sont attribués ici dans l'ordre chronologique, quel que soit le nombre de processus
+        sequences = self.event_sequences() if self.embeddings is not None else []
+        sequence_embeddings = [self.embeddings[rows] for rows, _, _ in sequences]
+        sequence_kinds = [kinds for _, kinds, _ in sequences]
+        n = len(sequences)
+        if self.scheduler is not None:
+            results = self.scheduler.map(cluster_sequence, sequence_embeddings, sequence_kinds,
+                                         [threshold] * n, [n_neighbors] * n)
+        else:
+            results = [cluster_sequence(embeddings, kinds, threshold, n_neighbors)
+                       for embeddings, kinds in zip(sequence_embeddings, sequence_kinds)]
+
+        total_images = sum(len(rows) for rows, _, _ in sequences)
+        reporter = progress.get_reporter()
+        reporter.start_stage("clustering", total_images, legacy="2/5")
+        paths = self.df["path"].to_numpy()
+        similarity_checks = 0
+        for (rows, _, days), (labels, clusters, checks) in zip(sequences, results):
+            for indices in clusters:
+                day = str(days[indices[0]]) if days is not None else "no_date"
+                clusters_by_day.setdefault(day, {})[f"cluster_{self.global_cluster_id}"] = paths[rows[indices]].tolist()
+                self.global_cluster_id += 1
+
+            # Collecter les images non clustérisées dans "others"
+            others = np.flatnonzero(labels < 0)
+            if len(others):
+                day = str(days[others[0]]) if days is not None else "no_date"
+                clusters_by_day.setdefault(day, {}).setdefault("others", []).extend(paths[rows[others]].tolist())
+
+            similarity_checks += checks
+            reporter.advance(len(rows))
+        reporter.end_stage(days=len(clusters_by_day), events=len(sequences),
+                           clusters=self.global_cluster_id - self.first_cluster_id, similarity_checks=similarity_checks)
+
+        return clusters_by_day
 
     def perform_neighbors_clustering(self, threshold=0.6, n_neighbors=3):
         #print("CLUSTERING DES IMAGES PAR VOISINS PROCHES...")
-        days_dict = self.day_sorting()
-        print(f"ETAPE 1 - Génération des embeddings : \n")
-        embeddings_dict = self.days_embedding(days_dict)
+        if self.embeddings is None:
+            print(f"ETAPE 1 - Génération des embeddings : \n")
+            embeddings_dict = self.days_embedding(self.day_sorting())
+            self.embeddings = self.embeddings_matrix(embeddings_dict)
         print(f"ETAPE 2 - Clustering des images :\n")
-        clusters = self.neighbors_similarity_clustering(embeddings_dict, threshold, n_neighbors)
+        clusters = self.neighbors_similarity_clustering(threshold, n_neighbors)
         
         # Mise à jour du DataFrame avec les informations de cluster
         cluster_mapping = {}
@@ -0,0 +1,314 @@
+"""
+Démon de tri : un processus résident qui garde le modèle chargé et exécute les tris à la demande.
+
+Protocole : un message JSON par ligne, sur stdin/stdout (par défaut) ou sur un socket Unix (--socket).
+Requêtes :
+    {"type": "sort", "options": {"directory": "...", "destination_directory": "...", "incremental": true}}
+    {"type": "cancel", "job_id": 3}
+    {"type": "status"}
+    {"type": "shutdown"}
+Réponses et événements (tous portent le job_id du tri concerné) :
+    queued, started, progress (événements de ProgressReporter), done (rapport du tri), cancelled, error.
+Les options d'un tri sont celles de main.py (functions.build_parser), sans les tirets, vérifiées par son parseur.
+"""
+import time
+launch_time = time.time()
+
+import os
+import sys
+import json
+import queue
+import argparse
+import threading
+import traceback
+import socketserver
+
+from functions import build_parser
+from inference_backends import INFERENCE_BACKENDS
+from runner import SortError, run
+from scheduler import Scheduler
+import progress
+
+
+class Job:
+    def __init__(self, job_id, args, send):
+        self.id = job_id
+        self.args = args
+        # Envoi des événements du tri à la connexion qui l'a demandé
+        self.send = send
+        self.cancel_event = threading.Event()
+        self.status = "queued"
+
+
+class SortDaemon:
+    """
+    File de tris exécutés un par un par un thread de travail. Le modèle (model_registry), les caches
+    et le pool de processus restent en mémoire d'un tri à l'autre.
+    """
+    def __init__(self):
+        self.parser = build_parser()
+        # Une option invalide est une erreur de la requête, pas un arrêt du démon
+        self.parser.error = self.option_error
+        self.queue = queue.Queue()
+        self.jobs = {}
+        self.next_id = 1
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        # Pools de processus réutilisés entre les tris, par nombre de processus
+        self.schedulers = {}
+
+        self.worker = threading.Thread(target=self.work, daemon=True)
+        self.worker.start()
+
+    @staticmethod
+    def option_error(message):
+        raise ValueError(f"Option invalide : {message}")
+
+    def job_args(self, options):
+        """
+        Options d'un tri : celles de la requête passent par le parseur de main.py (types, choix possibles),
+        les autres gardent leur valeur par défaut
+        """
+        actions = {action.dest: action for action in self.parser._actions if action.option_strings}
+        argv = []
+        for key, value in options.items():
+            action = actions.get(key)
+            if action is None or key == "help":
+                raise ValueError(f"Option inconnue : {key}")
+            if value is None:
+                continue
+            flag = action.option_strings[0]
+            if action.nargs == 0:
+                # Option sans valeur (--incremental...) : un booléen JSON
+                if not isinstance(value, bool):
+                    raise ValueError(f"Option invalide : {key} attend true ou false")
+                if value != action.default:
+                    argv.append(flag)
+            elif isinstance(value, (bool, list, dict)):
+                raise ValueError(f"Option invalide : {key} = {json.dumps(value)}")
+            else:
+                argv += [flag, str(value)]
+        return self.parser.parse_args(argv)
+
+    def handle(self, message, send):
+        """
+        Traite une requête.
+
+        :param send: Fonction d'envoi d'un message (dictionnaire) à l'émetteur de la requête.
+        :return: False si le démon doit s'arrêter.
+        """
+        kind = message.get("type")
+
+        if kind == "sort":
+            try:
+                args = self.job_args(message.get("options", {}))
+            except ValueError as e:
+                send({"type": "error", "job_id": None, "message": str(e)})
+                return True
+
+            with self.lock:
+                job = Job(self.next_id, args, send)
+                self.jobs[job.id] = job
+                self.next_id += 1
+            self.queue.put(job)
+            send({"type": "queued", "job_id": job.id, "position": self.queue.qsize()})
+
+        elif kind == "cancel":
+            # Vérification et changement d'état sous le verrou : le thread de travail ne peut pas démarrer le tri entre les deux
+            with self.lock:
+                job = self.jobs.get(message.get("job_id"))
+                cancellable = job is not None and job.status in ("queued", "running")
+                if cancellable:
+                    job.cancel_event.set()
+                    # Un tri en attente est retiré tout de suite, un tri en cours s'arrête au prochain avancement
+                    queued = job.status == "queued"
+                    if queued:
+                        job.status = "cancelled"
+            if not cancellable:
+                send({"type": "error", "job_id": message.get("job_id"), "message": "Aucun tri en cours avec cet identifiant."})
+            elif queued:
+                job.send({"type": "cancelled", "job_id": job.id})
+
+        elif kind == "status":
+            with self.lock:
+                jobs = [{"job_id": job.id, "status": job.status, "directory": job.args.directory}
+                        for job in self.jobs.values()]
+            send({"type": "status", "jobs": jobs})
+
+        elif kind == "shutdown":
+            self.stop()
+            return False
+
+        else:
+            send({"type": "error", "job_id": None, "message": f"Requête inconnue : {kind}"})
+
+        return True
+
+    def scheduler(self, workers):
+        if workers not in self.schedulers:
+            self.schedulers[workers] = Scheduler(workers)
+        return self.schedulers[workers]
+
+    def work(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            # Même verrou que l'annulation : un tri annulé en attente n'est jamais démarré
+            with self.lock:
+                if job.cancel_event.is_set():
+                    continue
+                job.status = "running"
+            self.run_job(job)
+
+    def run_job(self, job):
+        job.send({"type": "started", "job_id": job.id})
+
+        reporter = progress.configure(events_path=job.args.progress_events, report_path=job.args.progress_report,
+                                      interval=job.args.progress_interval, legacy=False,
+                                      sink=lambda event: job.send({"type": "progress", "job_id": job.id, **event}),
+                                      cancel_event=job.cancel_event)
+        try:
+            summary = run(job.args, time.time(), reporter, scheduler=self.scheduler(job.args.workers))
+            job.status = "done"
+            job.send({"type": "done", "job_id": job.id, "summary": summary})
+        except progress.JobCancelled:
+            job.status = "cancelled"
+            job.send({"type": "cancelled", "job_id": job.id})
+        except SortError as e:
+            job.status = "error"
+            job.send({"type": "error", "job_id": job.id, "message": str(e)})
+        except Exception as e:
+            traceback.print_exc()
+            job.status = "error"
+            job.send({"type": "error", "job_id": job.id, "message": f"{type(e).__name__}: {e}"})
+        finally:
+            reporter.close()
+
+    def stop(self):
+        """
+        Annule les tris en cours et en attente, puis arrête le thread de travail
+        """
+        with self.lock:
+            for job in self.jobs.values():
+                if job.status in ("queued", "running"):
+                    job.cancel_event.set()
+        self.queue.put(None)
+        self.worker.join()
+        for scheduler in self.schedulers.values():
+            scheduler.close()
+        self.stopped.set()
+
+
+def warm_up(backend, model):
+    """
+    Chargement anticipé des bibliothèques et du modèle, avant la première requête
+    """
+    from inference_backends import get_backend
+    import categories_manager  # noqa: F401 (imports de torch, pandas, OpenCV...)
+
+    start = time.time()
+    backend = get_backend(backend, model)
+    backend.clip_model
+    backend.clip_processor
+    print(f"Modèle prêt ({backend.embedding_space}) : {time.time() - start:.2f} secondes")
+
+
+def serve_stdio(daemon):
+    """
+    Protocole sur stdin/stdout : stdout est réservé aux messages, les affichages du tri passent sur stderr
+    """
+    out = sys.stdout
+    sys.stdout = sys.stderr
+    lock = threading.Lock()
+
+    def send(message):
+        with lock:
+            out.write(json.dumps(message, ensure_ascii=False) + "\n")
+            out.flush()
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            message = json.loads(line)
+        except ValueError as e:
+            send({"type": "error", "job_id": None, "message": f"JSON invalide : {e}"})
+            continue
+        if not daemon.handle(message, send):
+            return
+
+    # Fin de stdin : les tris déjà demandés sont terminés avant l'arrêt
+    daemon.queue.put(None)
+    daemon.worker.join()
+
+
+def serve_socket(daemon, socket_path):
+    """
+    Protocole sur un socket Unix : chaque connexion reçoit les événements des tris qu'elle a demandés
+    """
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            lock = threading.Lock()
+
+            def send(message):
+                with lock:
+                    try:
+                        self.wfile.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+                        self.wfile.flush()
+                    except OSError:
+                        # Client déconnecté : le tri continue sans lui
+                        pass
+
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                try:
+                    message = json.loads(line)
+                except ValueError as e:
+                    send({"type": "error", "job_id": None, "message": f"JSON invalide : {e}"})
+                    continue
+                if not daemon.handle(message, send):
+                    threading.Thread(target=server.shutdown).start()
+                    return
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+    server.daemon_threads = True
+    print(f"Démon de tri à l'écoute sur {socket_path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+        if not daemon.stopped.is_set():
+            daemon.stop()
+
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(line_buffering=True)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--socket', type=str, default=None, help="Socket Unix (stdin/stdout si absent)")
+    parser.add_argument('--preload', action='store_true', help="Charge le modèle avant la première requête")
+    parser.add_argument('--backend', type=str, default="torch", choices=INFERENCE_BACKENDS)
+    parser.add_argument('--model', type=str, default="ViT-L-14")
+    args = parser.parse_args()
+
+    if args.socket and not hasattr(socketserver, "ThreadingUnixStreamServer"):
+        print("Les sockets Unix ne sont pas disponibles sur ce système, utilisez stdin/stdout.")
+        sys.exit(1)
+
+    if args.preload:
+        # Sur stdin/stdout, l'affichage du chargement ne doit pas passer sur le canal des messages
+        stream = sys.stderr if not args.socket else sys.stdout
+        sys.stdout, original = stream, sys.stdout
+        warm_up(args.backend, args.model)
+        sys.stdout = original
+    print(f"Temps de démarrage du démon : {time.time() - launch_time:.2f} secondes", file=sys.stderr)
+
+    daemon = SortDaemon()
+    if args.socket:
+        serve_socket(daemon, args.socket)
+    else:
+        serve_stdio(daemon)
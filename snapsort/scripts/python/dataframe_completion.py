@@ -1,56 +1,89 @@
 import os
 
-from PIL import Image
+import numpy as np
 import pandas as pd
 
+from exif_scanner import scan_exif
+from manifest import parse_dates
+
+EXIF_COLUMNS = ["image_name", "path", "date_time", "latitude", "longitude", "file_size", "file_mtime"]
+
+
+def unchanged_files(df, previous_df):
+    """
+    Chemins dont la taille et la date de modification sont celles du manifeste précédent
+    """
+    previous = previous_df.drop_duplicates("path").set_index("path")
+    common = df["path"][df["path"].isin(previous.index)]
+    same_size = df.loc[common.index, "file_size"].to_numpy() == previous.loc[common, "file_size"].to_numpy()
+    same_mtime = np.isclose(df.loc[common.index, "file_mtime"].to_numpy(dtype=float),
+                            previous.loc[common, "file_mtime"].to_numpy(dtype=float), rtol=0, atol=1e-3)
+    return set(common[same_size & same_mtime])
+
+
 class DataframeCompletion:
-    def __init__(self, image_paths):
+    def __init__(self, image_paths, workers=None, scheduler=None, df=None, previous_df=None):
+        """
+        :param df: Table des EXIF déjà lue (point de reprise), sinon les EXIF sont lus
+        :param previous_df: Manifeste précédent (mode incrémental) : les EXIF des fichiers inchangés en sont repris
+        """
         self.image_paths = image_paths
-        self.df = self.create_df()
+        # Nombre de threads pour la lecture des EXIF
+        self.workers = workers
+        # Pool de processus pour la lecture des EXIF (None : processus courant)
+        self.scheduler = scheduler
+        self.df = self.create_df(previous_df) if df is None else df
+
+    def create_df(self, previous_df=None):
+        """
+        Création du DataFrame à partir des EXIF, lus directement dans les en-têtes des fichiers.
+        En mode incrémental, seuls les en-têtes des fichiers nouveaux ou modifiés sont lus.
+        """
+        if previous_df is not None and set(EXIF_COLUMNS) <= set(previous_df.columns):
+            return self.reuse_exif(previous_df)
 
-    def create_df(self):
-        image_list = []
+        columns = scan_exif(self.image_paths, workers=self.workers, scheduler=self.scheduler)
+
+        df = pd.DataFrame({"image_name": [os.path.basename(path) for path in self.image_paths], **columns})
+        df["date_time"] = parse_dates(df["date_time"])
+        df["latitude"] = df["latitude"].astype(float)
+        df["longitude"] = df["longitude"].astype(float)
+        df["file_mtime"] = df["file_mtime"].astype(float)
+        df["file_size"] = df["file_size"].astype("Int64")
+        return df[EXIF_COLUMNS]
+
+    def reuse_exif(self, previous_df):
+        """
+        EXIF repris du manifeste précédent pour les fichiers inchangés (un simple stat), lus pour les autres
+        """
+        stats = []
         for path in self.image_paths:
-            image = Image.open(path)
-            image_name = os.path.basename(path)
-
-            date_time, latitude, longitude = self.extract_exif_data(image)
-
-            image_list.append((image_name, path, date_time, latitude, longitude))
-
-        df = pd.DataFrame(image_list, columns=["image_name", "path", "date_time", "latitude", "longitude"])
-        return df
-
-    def extract_exif_data(self, image):
-            exifdata = image._getexif()
-            date_time, latitude, longitude = None, None, None
-            if exifdata:
-                for tag_id, value in exifdata.items():
-                    tag = Image.ExifTags.TAGS.get(tag_id, tag_id)
-                    if tag == "DateTime":
-                        date_time = value
-                    elif tag == "GPSInfo":
-                        gps_filtered = {k: value[k] for k in [1, 2, 3, 4] if k in value}
-                        if gps_filtered:
-                            lat, lon = self.extract_coordinates(gps_filtered)
-                            latitude = float(lat)
-                            longitude = float(lon)
-            else:
-                print("Aucune donnée EXIF trouvée.")
-
-            return date_time, latitude, longitude
-
-    def dms_to_decimal(self, dms, ref):
-        degrees, minutes, seconds = dms
-        decimal = degrees + minutes / 60 + seconds / 3600
-        if ref in ['S', 'W']:
-            decimal = -decimal
-        return decimal
-
-    def extract_coordinates(self, gps_dict):
-        lat = self.dms_to_decimal(gps_dict[2], gps_dict[1])
-        lon = self.dms_to_decimal(gps_dict[4], gps_dict[3])
-        return lat, lon
+            try:
+                stat = os.stat(path)
+                stats.append((stat.st_size, stat.st_mtime))
+            except OSError:
+                stats.append((None, None))
+        current = pd.DataFrame({"path": self.image_paths,
+                                "file_size": pd.array([size for size, _ in stats], dtype="Int64"),
+                                "file_mtime": [mtime for _, mtime in stats]})
+        unchanged = unchanged_files(current, previous_df)
+
+        new_paths = [path for path in self.image_paths if path not in unchanged]
+        kept = previous_df[previous_df["path"].isin(unchanged)].drop_duplicates("path")[EXIF_COLUMNS]
+        scanned = DataframeCompletion(new_paths, workers=self.workers, scheduler=self.scheduler).df if new_paths else None
+
+        df = pd.concat([frame for frame in (kept, scanned) if frame is not None], ignore_index=True)
+        df = df.set_index("path").loc[self.image_paths].reset_index()
+        print(f"EXIF repris du manifeste précédent : {len(kept)}, lus : {len(new_paths)}")
+        return df[EXIF_COLUMNS]
+
+    def add_analysis(self, records):
+        """
+        Ajout des résultats de la passe d'analyse (qualité et pHash) alignés sur les images
+        """
+        self.df["quality"] = [record.quality for record in records]
+        self.df["phash"] = pd.array([record.phash for record in records], dtype="UInt64")
+        return self.df
 
     def get_dataframe(self):
         return self.df
@@ -0,0 +1,246 @@
+import os
+import re
+import json
+import time
+import hashlib
+
+import numpy as np
+
+
+class EmbeddingsCache:
+    """
+    Cache persistant des embeddings d'images sur disque.
+
+    Les vecteurs sont stockés dans une matrice float16 mappée en mémoire (embeddings.f16)
+    et indexés par le hash du contenu du fichier. Un second index (chemin -> taille, mtime, hash)
+    permet d'éviter de relire le fichier lorsque celui-ci n'a pas changé.
+    Chaque modèle possède son propre sous-dossier : changer de checkpoint invalide donc le cache.
+    """
+    FORMAT_VERSION = 1
+
+    def __init__(self, cache_dir, model_name, max_entries=200000):
+        """
+        :param cache_dir: Dossier racine du cache.
+        :param model_name: Nom du modèle ayant produit les embeddings (sert de version).
+        :param max_entries: Nombre maximal de vecteurs conservés avant éviction (LRU).
+        """
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.directory = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+        self.index_path = os.path.join(self.directory, "index.json")
+        self.matrix_path = os.path.join(self.directory, "embeddings.f16")
+
+        self.hits = 0
+        self.misses = 0
+        self._matrix = None
+        # Lignes libérées par l'éviction depuis la dernière sauvegarde : l'index sur disque les référence encore,
+        # elles ne sont réutilisées qu'une fois le nouvel index écrit
+        self._released_rows = []
+        self._load_index()
+
+    def _empty_index(self):
+        return {
+            "format_version": self.FORMAT_VERSION,
+            "model_name": self.model_name,
+            "dim": None,
+            "capacity": 0,
+            "next_row": 0,
+            "free_rows": [],
+            "entries": {},  # hash -> {"row", "last_used"}
+            "files": {},    # chemin absolu -> {"size", "mtime", "hash"}
+        }
+
+    def _load_index(self):
+        self.index = self._empty_index()
+        if not os.path.exists(self.index_path):
+            return
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Cache d'embeddings illisible, il sera reconstruit : {e}")
+            self.clear()
+            return
+
+        # Invalidation si le format ou le modèle ne correspondent plus
+        if index.get("format_version") != self.FORMAT_VERSION or index.get("model_name") != self.model_name:
+            print(f"Cache d'embeddings obsolète pour {self.model_name}, il sera reconstruit.")
+            self.clear()
+            return
+
+        # Matrice absente ou tronquée : ses lignes ne correspondent plus à l'index
+        # (plus grande que prévu, elle a seulement été agrandie avant une interruption)
+        expected_size = index["capacity"] * (index["dim"] or 0) * np.dtype(np.float16).itemsize
+        matrix_size = os.path.getsize(self.matrix_path) if os.path.exists(self.matrix_path) else 0
+        if index["capacity"] and matrix_size < expected_size:
+            print("Matrice du cache d'embeddings absente ou incomplète, le cache sera reconstruit.")
+            self.clear()
+            return
+
+        self.index = index
+
+    def clear(self):
+        """
+        Vide entièrement le cache du modèle courant
+        """
+        for path in (self.index_path, self.matrix_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._matrix = None
+        self._released_rows = []
+        self.index = self._empty_index()
+
+    def __len__(self):
+        return len(self.index["entries"])
+
+    @staticmethod
+    def content_hash(path, chunk_size=1 << 20):
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def _file_hash(self, path):
+        """
+        Retourne le hash du contenu du fichier, en ne le recalculant que si la taille ou la date
+        de modification ont changé depuis le dernier passage.
+        """
+        abs_path = os.path.abspath(path)
+        stat = os.stat(abs_path)
+        known = self.index["files"].get(abs_path)
+        if known and known["size"] == stat.st_size and known["mtime"] == stat.st_mtime:
+            return known["hash"]
+
+        file_hash = self.content_hash(abs_path)
+        self.index["files"][abs_path] = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": file_hash}
+        return file_hash
+
+    def _open_matrix(self, capacity):
+        dim = self.index["dim"]
+        if self._matrix is not None and self._matrix.shape[0] >= capacity:
+            return self._matrix
+
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+
+        # Agrandissement du fichier (les lignes existantes sont conservées)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.matrix_path, "ab") as f:
+            f.truncate(capacity * dim * np.dtype(np.float16).itemsize)
+        self._matrix = np.memmap(self.matrix_path, dtype=np.float16, mode="r+", shape=(capacity, dim))
+        self.index["capacity"] = capacity
+        return self._matrix
+
+    def _matrix_for_read(self):
+        if self._matrix is None and self.index["capacity"]:
+            self._open_matrix(self.index["capacity"])
+        return self._matrix
+
+    def get(self, paths):
+        """
+        Recherche les embeddings des images dans le cache.
+
+        :param paths: Liste de chemins d'images.
+        :return: Tuple (found, missing) : dictionnaire chemin -> embedding float32 et liste des chemins absents.
+        """
+        found = {}
+        missing = []
+        matrix = self._matrix_for_read()
+        now = time.time()
+
+        for path in paths:
+            try:
+                entry = self.index["entries"].get(self._file_hash(path))
+            except OSError:
+                entry = None
+
+            if entry is None or matrix is None:
+                missing.append(path)
+                continue
+
+            entry["last_used"] = now
+            found[path] = np.asarray(matrix[entry["row"]], dtype=np.float32)
+
+        self.hits += len(found)
+        self.misses += len(missing)
+        return found, missing
+
+    def put(self, paths, embeddings):
+        """
+        Ajoute les embeddings calculés au cache.
+
+        :param paths: Liste de chemins d'images.
+        :param embeddings: Matrice (len(paths), dim) des embeddings correspondants.
+        """
+        if len(paths) == 0:
+            return
+
+        embeddings = np.asarray(embeddings)
+        if self.index["dim"] is None:
+            self.index["dim"] = int(embeddings.shape[1])
+        elif self.index["dim"] != embeddings.shape[1]:
+            print("Dimension d'embedding différente de celle du cache, le cache est réinitialisé.")
+            self.clear()
+            self.index["dim"] = int(embeddings.shape[1])
+
+        entries = self.index["entries"]
+        now = time.time()
+        for path, embedding in zip(paths, embeddings):
+            try:
+                file_hash = self._file_hash(path)
+            except OSError:
+                continue
+
+            entry = entries.get(file_hash)
+            if entry is None:
+                if len(entries) >= self.max_entries:
+                    self._evict(len(entries) - self.max_entries + 1)
+                entry = {"row": self._allocate_row(), "last_used": now}
+                entries[file_hash] = entry
+
+            entry["last_used"] = now
+            self._matrix[entry["row"]] = embedding.astype(np.float16)
+
+    def _allocate_row(self):
+        if self.index["free_rows"]:
+            row = self.index["free_rows"].pop()
+        else:
+            row = self.index["next_row"]
+            self.index["next_row"] += 1
+
+        if row >= self.index["capacity"]:
+            self._open_matrix(max(1024, self.index["capacity"] * 2, row + 1))
+        elif self._matrix is None:
+            self._open_matrix(self.index["capacity"])
+        return row
+
+    def _evict(self, count):
+        """
+        Supprime les `count` entrées les moins récemment utilisées
+        """
+        entries = self.index["entries"]
+        oldest = sorted(entries, key=lambda h: entries[h]["last_used"])[:count]
+        for file_hash in oldest:
+            self._released_rows.append(entries.pop(file_hash)["row"])
+
+        evicted = set(oldest)
+        self.index["files"] = {path: info for path, info in self.index["files"].items() if info["hash"] not in evicted}
+
+    def save(self):
+        """
+        Synchronisation de la matrice sur disque puis écriture atomique de l'index.
+        Les lignes libérées par l'éviction deviennent réutilisables une fois l'index écrit.
+        """
+        if self._matrix is not None:
+            self._matrix.flush()
+
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({**self.index, "free_rows": self.index["free_rows"] + self._released_rows}, f)
+        os.replace(tmp_path, self.index_path)
+        self.index["free_rows"].extend(self._released_rows)
+        self._released_rows = []
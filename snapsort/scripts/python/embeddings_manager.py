@@ -1,43 +1,220 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 from PIL import Image
-import torch
-from transformers import CLIPProcessor, CLIPModel
+import numpy as np
+
+import progress
+from batch_controller import BatchController
+from image_analysis import ImageRecord
+from inference_backends import CLIP_MODELS, DEFAULT_CLIP_MODEL, TorchBackend
+
+CLIP_MODEL_NAME = CLIP_MODELS[DEFAULT_CLIP_MODEL]
+
+# Taille d'entrée de CLIP : le décodage JPEG n'a pas besoin d'une résolution supérieure
+CLIP_INPUT_SIZE = (224, 224)
+
+
+def load_image(path, draft_size=CLIP_INPUT_SIZE):
+    """
+    Ouvre une image en RGB. Pour les JPEG, le mode draft décode directement à une échelle réduite
+    (1/2, 1/4 ou 1/8) tout en restant au moins aussi grand que draft_size.
+
+    :return: Image PIL, ou None si l'image est illisible.
+    """
+    try:
+        image = Image.open(path)
+        if draft_size is not None:
+            image.draft("RGB", draft_size)
+        return image.convert("RGB")
+    except Exception as e:
+        print(f"Erreur lors du chargement de l'image {path}: {e}")
+        return None
 
 
 class EmbeddingsManager:
-    def __init__(self, clip_model=None, clip_processor=None):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        if clip_model is None:
-            self.clip_model = CLIPModel.from_pretrained("laion/CLIP-ViT-L-14-laion2B-s32B-b82K").to(self.device)
-        else:
-            self.clip_model = clip_model.to(self.device)
-        if clip_processor is None:
-            self.clip_processor = CLIPProcessor.from_pretrained("laion/CLIP-ViT-L-14-laion2B-s32B-b82K")
-        else:
-            self.clip_processor = clip_processor
+    def __init__(self, clip_model=None, clip_processor=None, cache=None, batch_size=None, decode_workers=None, backend=None,
+                 memory_limit_mb=None):
+        """
+        :param batch_size: Taille fixe des lots envoyés au modèle (None : taille adaptative, BatchController).
+        :param backend: Backend d'inférence (inference_backends) ; PyTorch avec CLIP_MODEL_NAME par défaut.
+        :param memory_limit_mb: Plafond de mémoire du processus respecté par la taille des lots.
+        """
+        # Le modèle n'est chargé (via model_registry, une fois par processus) qu'au premier embedding réellement demandé
+        self.backend = backend or TorchBackend(CLIP_MODEL_NAME, clip_model, clip_processor)
+        self.model_name = self.backend.model_name
+
+        # Cache persistant des embeddings (EmbeddingsCache), optionnel
+        self.cache = cache
+
+        # Taille des micro-lots envoyés au modèle (ajustée selon la latence et la mémoire) et nombre de threads de décodage
+        self.batching = BatchController(fixed=batch_size, memory_limit_mb=memory_limit_mb)
+        self.decode_workers = decode_workers or min(4, os.cpu_count() or 1)
+
+    @property
+    def device(self):
+        return self.backend.device
+
+    @property
+    def clip_model(self):
+        return self.backend.clip_model
+
+    @property
+    def clip_processor(self):
+        return self.backend.clip_processor
 
     def image_embedding(self, paths=None, images=None):
         if images is None:
-            images = []
-            for path in paths:
-                try:
-                    image = Image.open(path).convert("RGB")
-                    images.append(image)
-                except Exception as e:
-                    print(f"Erreur lors du chargement de l'image {path}: {e}")
+            # Les chemins sont encodés en flux, par micro-lots
+            batches = [embeddings for _, embeddings in self.iter_image_embeddings(paths)]
+            if not batches:
+                return None
+            return np.vstack(batches)
+
+        start = time.perf_counter()
+        embeddings = self.backend.encode_images(images)
+        self.batching.record(len(images), time.perf_counter() - start)
+        return embeddings
+
+    @property
+    def batch_size(self):
+        return self.batching.size
+
+    def text_embedding(self, texts):
+        """
+        Embeddings normalisés d'une liste de textes, encodés en un seul lot
+        """
+        return self.backend.encode_texts(texts)
+
+    def iter_image_embeddings(self, paths, batch_size=None, prefetch=1):
+        """
+        Encodage en flux d'une liste d'images, par micro-lots de taille fixe.
+        Les lots suivants sont décodés par un pool de threads pendant l'inférence du lot courant,
+        la mémoire utilisée reste donc bornée quel que soit le nombre d'images.
+
+        :param paths: Liste de chemins d'images.
+        :param batch_size: Taille des micro-lots (taille courante du BatchController par défaut, relue à chaque lot).
+        :param prefetch: Nombre de lots décodés à l'avance.
+        :return: Générateur de tuples (chemins du lot effectivement encodés, embeddings du lot).
+        """
+        if not paths:
+            return
+
+        with ThreadPoolExecutor(max_workers=self.decode_workers) as pool:
+            pending = deque()
+            next_path = 0
+
+            def submit_next():
+                nonlocal next_path
+                size = batch_size or self.batch_size
+                batch_paths = paths[next_path:next_path + size]
+                next_path += len(batch_paths)
+                pending.append((batch_paths, [pool.submit(load_image, path) for path in batch_paths]))
+
+            while next_path < len(paths) and len(pending) <= prefetch:
+                submit_next()
+
+            while pending:
+                batch_paths, futures = pending.popleft()
+                if next_path < len(paths):
+                    submit_next()
+
+                loaded = [(path, future.result()) for path, future in zip(batch_paths, futures)]
+                loaded = [(path, image) for path, image in loaded if image is not None]
+                if not loaded:
                     continue
 
-            if not images:
-                return None
+                yield [path for path, _ in loaded], self.image_embedding(images=[image for _, image in loaded])
+
+    def cached_image_embedding(self, paths):
+        """
+        Embeddings des images en passant d'abord par le cache persistant.
+        Seules les images absentes du cache sont envoyées au modèle.
+
+        :param paths: Liste de chemins d'images.
+        :return: Tuple (paths, embeddings) : chemins effectivement encodés et matrice alignée.
+        """
+        if self.cache is None:
+            found, missing = {}, list(paths)
+        else:
+            found, missing = self.cache.get(paths)
+
+        for batch_paths, embeddings in self.iter_image_embeddings(missing):
+            found.update(zip(batch_paths, embeddings))
+            if self.cache is not None:
+                self.cache.put(batch_paths, embeddings)
+
+        kept_paths = [path for path in paths if path in found]
+        if not kept_paths:
+            return [], None
+
+        return kept_paths, np.vstack([found[path] for path in kept_paths])
+
+    def analyze_and_embed(self, paths, analyzer, prefilter=None, known=None):
+        """
+        Passe d'analyse unique : chaque image est décodée une seule fois par l'ImageAnalyzer, qui en
+        extrait EXIF, qualité et pHash, et l'image réduite est encodée par micro-lots.
+        Les images déjà présentes dans le cache ne sont pas envoyées au modèle.
+
+        :param paths: Liste de chemins d'images.
+        :param analyzer: ImageAnalyzer utilisé pour le décodage.
+        :param prefilter: FramePrefilter : les images qu'il écarte ne sont pas encodées (paths doit alors être
+                          dans l'ordre chronologique, jour par jour).
+        :param known: Dictionnaire chemin -> (qualité, pHash) des images déjà analysées (mode incrémental) :
+                      elles ne sont pas décodées si leur embedding est en cache.
+        :return: Tuple (records, embeddings) : liste d'ImageRecord et matrice alignée (NaN si non encodée ou écartée).
+        """
+        if self.cache is None:
+            found = {}
+        else:
+            found, _ = self.cache.get(paths)
+
+        records = []
+        batch = []
+
+        def flush():
+            embeddings = self.image_embedding(images=[record.clip_image for record in batch])
+            for record, embedding in zip(batch, embeddings):
+                found[record.path] = embedding
+                record.clip_image = None
+            if self.cache is not None:
+                self.cache.put([record.path for record in batch], embeddings)
+            batch.clear()
+
+        known = known or {}
+        reused = {path for path in paths if path in known and path in found}
+
+        def analyzed():
+            decoded = analyzer.iter_records([path for path in paths if path not in reused],
+                                            with_clip_image=lambda path: path not in found)
+            for path in paths:
+                record = ImageRecord(path, *known[path]) if path in reused else next(decoded)
+                progress.get_reporter().advance()
+                records.append(record)
+                yield record
+
+        for record in (analyzed() if prefilter is None else prefilter.filter(analyzed())):
+            if record.clip_image is not None:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    flush()
+        if batch:
+            flush()
 
-        # Prétraitement des images en batch
-        image_inputs = self.clip_processor(images=images, return_tensors="pt", padding=True).to(self.device)
+        if prefilter is not None:
+            # Une image écartée n'a pas d'embedding, même si elle est en cache : le résultat ne dépend pas du cache
+            found = {path: embedding for path, embedding in found.items() if path not in prefilter.drops}
 
-        with torch.no_grad():
-            image_embeddings = self.clip_model.get_image_features(**image_inputs)
+        if not found:
+            return records, None
 
-        # Normalisation
-        image_embeddings = image_embeddings / image_embeddings.norm(p=2, dim=-1, keepdim=True)
-        image_embeddings = image_embeddings.cpu().numpy()
+        dim = len(next(iter(found.values())))
+        embeddings = np.full((len(records), dim), np.nan, dtype=np.float32)
+        for row, record in enumerate(records):
+            if record.path in found:
+                embeddings[row] = found[record.path]
 
-        return image_embeddings
+        return records, embeddings
 
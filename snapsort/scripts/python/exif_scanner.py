@@ -0,0 +1,202 @@
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+# Tags EXIF utiles au tri
+TAG_DATETIME = 0x0132
+TAG_GPS_IFD = 0x8825
+GPS_LATITUDE_REF, GPS_LATITUDE, GPS_LONGITUDE_REF, GPS_LONGITUDE = 1, 2, 3, 4
+
+# Taille des types TIFF (BYTE, ASCII, SHORT, LONG, RATIONAL, ..., SRATIONAL)
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+
+JPEG_EXTENSIONS = {".jpg", ".jpeg"}
+
+
+def read_app1_segment(path):
+    """
+    Lit uniquement les en-têtes d'un JPEG jusqu'au segment APP1 EXIF, sans décoder l'image.
+
+    :return: Octets TIFF du bloc EXIF, ou None si absent.
+    """
+    with open(path, "rb") as f:
+        if f.read(2) != b"\xff\xd8":
+            return None
+
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            # Début des données compressées : plus aucun segment de métadonnées
+            if marker[1] in (0xDA, 0xD9):
+                return None
+
+            length_bytes = f.read(2)
+            if len(length_bytes) < 2:
+                return None
+            length = struct.unpack(">H", length_bytes)[0] - 2
+
+            if marker[1] == 0xE1:
+                data = f.read(length)
+                if data.startswith(b"Exif\x00\x00"):
+                    return data[6:]
+            else:
+                f.seek(length, os.SEEK_CUR)
+
+
+def parse_ifd(tiff, offset, endian, wanted):
+    """
+    Lit les entrées d'un IFD TIFF et retourne les valeurs des tags demandés
+    """
+    values = {}
+    if offset + 2 > len(tiff):
+        return values
+
+    count = struct.unpack(endian + "H", tiff[offset:offset + 2])[0]
+    for i in range(count):
+        entry = offset + 2 + i * 12
+        if entry + 12 > len(tiff):
+            break
+        tag, tiff_type, n = struct.unpack(endian + "HHI", tiff[entry:entry + 8])
+        if tag not in wanted or tiff_type not in TIFF_TYPE_SIZES:
+            continue
+
+        size = TIFF_TYPE_SIZES[tiff_type] * n
+        if size <= 4:
+            data = tiff[entry + 8:entry + 8 + size]
+        else:
+            value_offset = struct.unpack(endian + "I", tiff[entry + 8:entry + 12])[0]
+            data = tiff[value_offset:value_offset + size]
+        if len(data) < size:
+            continue
+
+        if tiff_type == 2:
+            values[tag] = data.split(b"\x00", 1)[0].decode("ascii", errors="ignore")
+        elif tiff_type == 3:
+            values[tag] = struct.unpack(endian + "H" * n, data)
+        elif tiff_type == 4:
+            values[tag] = struct.unpack(endian + "I" * n, data)
+        elif tiff_type in (5, 10):
+            fmt = "I" if tiff_type == 5 else "i"
+            raw = struct.unpack(endian + fmt * (2 * n), data)
+            values[tag] = tuple(raw[k] / raw[k + 1] if raw[k + 1] else 0.0 for k in range(0, len(raw), 2))
+
+    return values
+
+
+def dms_to_decimal(dms, ref):
+    degrees, minutes, seconds = dms
+    decimal = degrees + minutes / 60 + seconds / 3600
+    if ref in ['S', 'W']:
+        decimal = -decimal
+    return decimal
+
+
+def coordinates_from_gps(gps):
+    """
+    Conversion des tags GPS (1 à 4) en latitude / longitude décimales
+    """
+    if not all(tag in gps for tag in (GPS_LATITUDE_REF, GPS_LATITUDE, GPS_LONGITUDE_REF, GPS_LONGITUDE)):
+        return None, None
+    if len(gps[GPS_LATITUDE]) != 3 or len(gps[GPS_LONGITUDE]) != 3:
+        return None, None
+
+    latitude = float(dms_to_decimal(gps[GPS_LATITUDE], gps[GPS_LATITUDE_REF]))
+    longitude = float(dms_to_decimal(gps[GPS_LONGITUDE], gps[GPS_LONGITUDE_REF]))
+    return latitude, longitude
+
+
+def parse_exif(tiff):
+    """
+    Extrait DateTime et les coordonnées GPS d'un bloc TIFF EXIF
+
+    :return: Tuple (date_time, latitude, longitude)
+    """
+    if len(tiff) < 8 or tiff[:2] not in (b"II", b"MM"):
+        return None, None, None
+    endian = "<" if tiff[:2] == b"II" else ">"
+
+    ifd0 = parse_ifd(tiff, struct.unpack(endian + "I", tiff[4:8])[0], endian, {TAG_DATETIME, TAG_GPS_IFD})
+    date_time = ifd0.get(TAG_DATETIME) or None
+
+    latitude, longitude = None, None
+    if TAG_GPS_IFD in ifd0:
+        gps = parse_ifd(tiff, ifd0[TAG_GPS_IFD][0], endian,
+                        {GPS_LATITUDE_REF, GPS_LATITUDE, GPS_LONGITUDE_REF, GPS_LONGITUDE})
+        latitude, longitude = coordinates_from_gps(gps)
+
+    return date_time, latitude, longitude
+
+
+def read_exif_with_pil(path):
+    """
+    Solution de repli pour les formats autres que JPEG (PNG, WebP...) : PIL ne lit que les en-têtes
+    """
+    with Image.open(path) as image:
+        exif = image.getexif()
+        date_time = exif.get(TAG_DATETIME) or None
+        latitude, longitude = coordinates_from_gps(exif.get_ifd(TAG_GPS_IFD))
+    return date_time, latitude, longitude
+
+
+def read_exif(path):
+    """
+    Lecture des métadonnées utiles d'une image sans la décoder
+
+    :return: Tuple (date_time, latitude, longitude), None pour les valeurs absentes
+    """
+    try:
+        if os.path.splitext(path)[1].lower() in JPEG_EXTENSIONS:
+            tiff = read_app1_segment(path)
+            return parse_exif(tiff) if tiff else (None, None, None)
+        return read_exif_with_pil(path)
+    except Exception as e:
+        print(f"Impossible de lire les EXIF de {path}: {e}")
+        return None, None, None
+
+
+def read_metadata(path):
+    """
+    Taille, date de modification et EXIF d'un fichier
+    """
+    try:
+        stat = os.stat(path)
+        size, mtime = stat.st_size, stat.st_mtime
+    except OSError:
+        size, mtime = None, None
+    return (size, mtime) + read_exif(path)
+
+
+def read_metadata_chunk(paths, workers=4):
+    """
+    Lecture des métadonnées d'un lot de chemins dans un pool de threads (tâche d'un processus du Scheduler)
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(read_metadata, paths))
+
+
+def scan_exif(paths, workers=None, scheduler=None, chunk_size=256):
+    """
+    Lecture des EXIF d'une liste d'images dans un pool de threads (lecture disque / réseau).
+    Avec un Scheduler parallèle, les chemins sont répartis par lots entre ses processus, qui
+    analysent les en-têtes en parallèle au lieu de partager le GIL.
+
+    :param paths: Liste de chemins d'images.
+    :param workers: Nombre de threads (16 par défaut, sans scheduler).
+    :param scheduler: Scheduler utilisé pour répartir les lots (None : processus courant).
+    :return: Dictionnaire colonnaire {"path", "file_size", "file_mtime", "date_time", "latitude", "longitude"}
+             aligné sur paths.
+    """
+    if scheduler is not None and scheduler.parallel and len(paths) > chunk_size:
+        chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+        results = [result for chunk in scheduler.map(read_metadata_chunk, chunks) for result in chunk]
+    else:
+        results = read_metadata_chunk(paths, workers=workers or 16)
+
+    columns = ["file_size", "file_mtime", "date_time", "latitude", "longitude"]
+    scanned = {"path": list(paths)}
+    for i, column in enumerate(columns):
+        scanned[column] = [result[i] for result in results]
+    return scanned
@@ -1,19 +1,94 @@
 import os
-import shutil
 import argparse
 
-import pandas as pd
-import numpy as np
-import reverse_geocoder as rg
+from album_materializer import AlbumMaterializer, TRANSFER_STRATEGIES
+from inference_backends import CLIP_MODELS, DEFAULT_CLIP_MODEL, INFERENCE_BACKENDS
+from manifest import MANIFEST_FORMATS, default_format, find_manifest, parse_dates, read_manifest
 
-def set_parser():
+# Types de fichiers triés par défaut
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif"}
+
+# Dossier des images sans catégorie (ou sans saison) : même nom au premier tri et après relecture du manifeste
+MISSING_FOLDER = "Non_classees"
+
+
+def get_image_paths(directory, allowed_extensions=None):
+    """
+    Récupère dans un tableau le path des images d'un directory 
+    """
+    if allowed_extensions is None:
+        allowed_extensions = IMAGE_EXTENSIONS
+    return [os.path.join(directory, filename) for filename in os.listdir(directory) if os.path.splitext(filename)[1].lower() in allowed_extensions]
+
+
+def build_parser():
+    """
+    Options d'un tri, partagées par main.py et par le démon
+    """
     parser = argparse.ArgumentParser()
 
     # Training arguments
     parser.add_argument('--directory', type=str, default="unsorted_images")
     parser.add_argument('--destination_directory', type=str, default="albums")
 
-    args = parser.parse_args()
+    # Cache persistant des embeddings
+    parser.add_argument('--cache_dir', type=str, default=os.path.join(os.path.expanduser("~"), ".snapsort", "cache"))
+    parser.add_argument('--no_cache', action='store_true', help="Désactive le cache d'embeddings sur disque")
+
+    # Mode incrémental : seuls les jours contenant des photos nouvelles ou modifiées sont retraités
+    parser.add_argument('--incremental', action='store_true', help="Réutilise le manifeste du passage précédent")
+
+    # Manifeste du tri : parquet typé (csv si pyarrow est absent), et export csv en plus si demandé
+    parser.add_argument('--manifest_format', type=str, default=default_format(), choices=MANIFEST_FORMATS)
+    parser.add_argument('--export_csv', action='store_true', help="Écrit aussi le manifeste en csv")
+
+    # Géocodage inverse : précision (décimales) des coordonnées mises en cache
+    parser.add_argument('--geocode_precision', type=int, default=3)
+
+    # Création des albums : mode de transfert et nombre de transferts simultanés
+    parser.add_argument('--transfer_mode', type=str, default="copy", choices=TRANSFER_STRATEGIES,
+                        help="copy, hardlink, reflink (copie si non supporté) ou symlink")
+    parser.add_argument('--transfer_workers', type=int, default=8)
+
+    # Inférence : backend (PyTorch, ONNX Runtime, ONNX Runtime int8) et taille du modèle CLIP
+    parser.add_argument('--backend', type=str, default="torch", choices=INFERENCE_BACKENDS)
+    parser.add_argument('--model', type=str, default=DEFAULT_CLIP_MODEL, choices=list(CLIP_MODELS))
+
+    # Pré-filtre avant l'inférence : les doublons de rafale et les images floues ne sont pas encodés
+    parser.add_argument('--prefilter', action='store_true', help="Écarte rafales et images floues avant CLIP")
+
+    # Lots d'inférence : taille adaptative (latence et mémoire) sauf si elle est fixée, plafond de mémoire du processus
+    parser.add_argument('--batch_size', type=int, default=None, help="Taille fixe des lots (adaptative par défaut)")
+    parser.add_argument('--memory_limit_mb', type=float, default=None, help="Mémoire maximale du processus (Mo)")
+
+    # Nombre de processus pour le travail CPU (EXIF, pHash, qualité, clustering, nettoyage) ; 1 : sans pool
+    parser.add_argument('--workers', type=int, default=None, help="Un processus par cœur par défaut")
+
+    # Événements de progression JSON-lines (canal dédié) et rapport final par étape
+    parser.add_argument('--progress_events', type=str, default=None, help="Fichier ou tube nommé des événements JSON")
+    parser.add_argument('--progress_report', type=str, default=None, help="Rapport JSON de fin d'exécution")
+    parser.add_argument('--progress_interval', type=float, default=0.5, help="Secondes minimum entre deux avancements")
+
+    # Mode ingestion : tri des photos au fil de leur arrivée dans --directory, par micro-lots
+    parser.add_argument('--watch', action='store_true', help="Observe le dossier et trie les photos dès leur arrivée")
+    parser.add_argument('--watch_settle', type=float, default=1.0, help="Secondes sans modification avant qu'un fichier soit trié")
+    parser.add_argument('--watch_batch', type=int, default=64, help="Nombre maximal de photos par lot")
+    parser.add_argument('--watch_delay', type=float, default=2.0, help="Attente maximale (secondes) avant de trier un lot")
+    parser.add_argument('--watch_poll', type=float, default=0.5, help="Intervalle de scrutation du dossier")
+    parser.add_argument('--watch_idle_exit', type=float, default=None, help="Arrêt après ce nombre de secondes sans nouvelle photo")
+
+    # Reprise d'un tri interrompu (points de reprise écrits à chaque étape)
+    parser.add_argument('--resume', action='store_true', help="Reprend le tri interrompu là où il s'était arrêté")
+    parser.add_argument('--run_dir', type=str, default=None, help="Dossier des points de reprise (<dossier>.run par défaut)")
+
+    # Lecture des métadonnées seulement (aucun modèle chargé)
+    parser.add_argument('--metadata_only', action='store_true', help="Écrit uniquement le manifeste des EXIF, sans tri")
+
+    return parser
+
+
+def set_parser():
+    args = build_parser().parse_args()
 
     print("\n----------- Arguments --------------")
     print(args)
@@ -33,102 +108,132 @@ def get_season(month):
     else:
         return None
 
-def reverse_geocode_lib(lat, lon):
-    try:
-        result = rg.search((lat, lon), mode=1)[0]
-        return f"{result['name']}_{result['cc']}"
-    except Exception as e:
-        print(f"Erreur sur coords ({lat}, {lon}) : {e}")
+def create_arborescence(df, resolver=None):
+    """
+    Déduction du dossier d'album de chaque image (année/saison/lieu/catégorie)
+
+    :param df: Manifeste du tri (DataFrame typé, date_time en datetime64).
+    :param resolver: LocationResolver utilisé pour le géocodage (cache en mémoire seulement si None)
+    :return: DataFrame avec la colonne folder_path, ou None s'il manque des colonnes.
+    """
+    if not {'date_time', 'latitude', 'longitude', 'categories'}.issubset(df.columns):
+        print("Le manifeste doit contenir les colonnes : date_time, latitude, longitude, categories.")
         return None
 
-def get_localisation(latitude, longitude, cache):
-    lat = round(latitude, 3)
-    lon = round(longitude, 3)
-    coords = (lat, lon)
+    # Toutes les coordonnées uniques sont géocodées en un seul lot
+    if resolver is None:
+        from geocoding import LocationResolver
+        resolver = LocationResolver()
+    localisations = resolver.resolve(df['latitude'], df['longitude'])
 
-    if coords in cache:
-        localisation = cache[coords]
-    else:
-        localisation = reverse_geocode_lib(*coords)
-        cache[coords] = localisation
+    # Images sans date : rangées en décembre 2025
+    dates = parse_dates(df['date_time'])
+    years = dates.dt.year.fillna(2025).astype(int)
+    seasons = dates.dt.month.fillna(12).astype(int).map(get_season).fillna(MISSING_FOLDER)
 
-    return localisation
+    # Valeurs absentes (NaN au premier tri, <NA> après relecture du manifeste typé) : un seul nom de dossier
+    categories = df['categories'].astype("string").replace("", None).fillna(MISSING_FOLDER)
 
-def create_arborescence_from_csv(csv_file):
-    data = pd.read_csv(csv_file)
     tree_paths = []
-    cache = {}  # Pour éviter les appels redondants
+    for year, season, localisation, category in zip(years, seasons, localisations, categories):
+        if isinstance(localisation, str) and localisation:
+            tree_path = f"{year}/{season}/{localisation}/{category}"
+        else:
+            tree_path = f"{year}/{season}/{category}"
+
+        tree_paths.append(tree_path)
+
+    df = df.copy()
+    df['folder_path'] = tree_paths
+    return df
+
 
-    if 'date_time' not in data.columns or 'latitude' not in data.columns or 'longitude' not in data.columns or 'categories' not in data.columns:
-        print("Le CSV doit contenir les colonnes : date_time, latitude, longitude, categories.")
+def load_manifest(directory):
+    """
+    Chargement du manifeste d'un passage précédent pour le mode incrémental
+
+    :return: DataFrame typé, ou None si le manifeste est absent ou incomplet
+    """
+    path = find_manifest(directory)
+    if path is None:
+        print(f"Aucun manifeste précédent pour {directory}, toutes les images seront traitées.")
         return None
 
-    for row in data.itertuples():
-        # print(f"date_time: {row.date_time} and type is {type(row.date_time)}")
-        # TEMP TODO: Gestion d'erreur lorsque la date n'est pas présente
-        if (type(row.date_time) != "str"):
-            year = 2025
-            month = 12
-            season = get_season(month)
-        else:
-            date_time = row.date_time.split(":")
-            year = int(date_time[0])
-            month = int(date_time[1])
-            season = get_season(month)
+    df = read_manifest(path)
+    required = {"path", "date_time", "file_size", "file_mtime", "cluster", "categories"}
+    if not required.issubset(df.columns):
+        print(f"Le manifeste {path} ne contient pas les colonnes {sorted(required)}, toutes les images seront traitées.")
+        return None
 
-        latitude = row.latitude
-        longitude = row.longitude
-        localisation = None
-        if not np.isnan(latitude) and not np.isnan(longitude):
-            localisation = get_localisation(latitude, longitude, cache)
+    return df
 
-        category = row.categories
 
-        if localisation :
-            tree_path = f"{year}/{season}/{localisation}/{category}"
-        else:
-            tree_path = f"{year}/{season}/{category}"
+def album_destinations(df, destination_directory):
+    """
+    Chemins de destination des images dans les albums
+    """
+    df = df.dropna(subset=["folder_path"])
+    return {os.path.join(destination_directory, folder, os.path.basename(path))
+            for folder, path in zip(df["folder_path"], df["path"])}
 
-        tree_paths.append(tree_path)
 
-    data['folder_path'] = tree_paths
+def remove_stale_album_files(previous_df, current_df, destination_directory):
+    """
+    Mode incrémental : supprime des albums les copies dont la destination a changé
+    ou dont l'image source a disparu, puis les dossiers devenus vides.
+    """
+    if "folder_path" not in previous_df.columns:
+        return
+
+    stale = album_destinations(previous_df, destination_directory) - album_destinations(current_df, destination_directory)
+
+    for path in stale:
+        if os.path.exists(path):
+            os.remove(path)
+
+        # Suppression des dossiers vides jusqu'à la racine des albums
+        folder = os.path.dirname(path)
+        while os.path.abspath(folder) != os.path.abspath(destination_directory) and os.path.isdir(folder) and not os.listdir(folder):
+            os.rmdir(folder)
+            folder = os.path.dirname(folder)
+
+    if stale:
+        print(f"Copies obsolètes supprimées : {len(stale)}")
 
-    data.to_csv(csv_file, index=False)
 
+def new_album_sources(previous_df, current_df, destination_directory):
+    """
+    Mode incrémental : images dont la destination dans les albums n'existait pas au passage précédent
+    (image conservée dont le dossier a changé, nouvelle image...)
+    """
+    previous = album_destinations(previous_df, destination_directory) if "folder_path" in previous_df.columns else set()
+    current_df = current_df.dropna(subset=["folder_path"])
+    return {path for folder, path in zip(current_df["folder_path"], current_df["path"])
+            if os.path.join(destination_directory, folder, os.path.basename(path)) not in previous}
 
-def create_category_folders_from_csv(csv_file, destination_directory, test=False):
+
+def create_category_folders(df, destination_directory, test=False, paths=None, strategy="copy", workers=8):
+    """
+    Création des dossiers d'albums et transfert des images
+
+    :param df: Manifeste du tri (DataFrame avec folder_path).
+    :param paths: Chemins des images à transférer (mode incrémental), toutes les images si None
+    :param strategy: Mode de transfert ("copy", "hardlink", "reflink" ou "symlink")
+    :param workers: Nombre de transferts simultanés
+    """
 
     if not test:
         tree_struct = 'folder_path'
     else :
         tree_struct = 'categories'
 
-    df = pd.read_csv(csv_file)
+    if paths is not None:
+        df = df[df["path"].isin(paths)]
 
     if tree_struct not in df.columns:
-        print(f"Le CSV ne contient pas de colonne {tree_struct}.")
+        print(f"Le manifeste ne contient pas de colonne {tree_struct}.")
         return
 
     os.makedirs(destination_directory, exist_ok=True)
 
-    categories = df[tree_struct].dropna().unique().tolist()
-
-    total_images = len(df['image_name'].unique())
-    i = 0
-
-    for category in categories:
-        category_folder = os.path.join(destination_directory, category)
-        print(f"Création du dossier pour la catégorie : {category_folder}")
-        os.makedirs(category_folder, exist_ok=True)
-
-        images_in_category = df[df[tree_struct] == category]['path'].tolist()
-
-        for source_path in images_in_category:
-            i += 1
-            if os.path.exists(source_path):
-                destination_path = os.path.join(category_folder, os.path.basename(source_path))
-                shutil.copy(source_path, destination_path)
-                print(f"Etape [4/4] : [{i}/{total_images}]")
-                #print(f"Copié : {source_path} -> {destination_path}")
-            else:
-                print(f"Fichier non trouvé : {source_path}")
\ No newline at end of file
+    return AlbumMaterializer(strategy, workers).materialize(df, destination_directory, tree_struct)
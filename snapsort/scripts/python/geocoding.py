@@ -0,0 +1,84 @@
+import os
+import json
+
+import numpy as np
+
+
+class LocationResolver:
+    """
+    Géocodage inverse par lot, avec un cache persistant des lieux déjà résolus.
+
+    Les coordonnées sont arrondies à `precision` décimales : toutes les coordonnées uniques
+    absentes du cache sont résolues en une seule requête dans l'arbre k-d de reverse_geocoder.
+    """
+    def __init__(self, cache_path=None, precision=3):
+        """
+        :param cache_path: Fichier JSON du cache (None : pas de persistance).
+        :param precision: Nombre de décimales conservées pour la clé du cache.
+        """
+        self.cache_path = cache_path
+        self.precision = precision
+        self.cache = {}
+        # Coordonnées uniques trouvées dans le cache / résolues par reverse_geocoder
+        self.hits = 0
+        self.misses = 0
+
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    self.cache = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Cache de localisations illisible, il sera reconstruit : {e}")
+
+    def key(self, latitude, longitude):
+        # (+ 0.0 : -0.0 et 0.0 partagent la même clé)
+        latitude, longitude = latitude + 0.0, longitude + 0.0
+        return f"{latitude:.{self.precision}f},{longitude:.{self.precision}f}"
+
+    def resolve(self, latitudes, longitudes):
+        """
+        :param latitudes: Latitudes (NaN si absente).
+        :param longitudes: Longitudes (NaN si absente).
+        :return: Liste des localisations "Ville_PAYS" (None si pas de coordonnées), alignée sur les entrées.
+        """
+        latitudes = np.round(np.asarray(latitudes, dtype=float), self.precision)
+        longitudes = np.round(np.asarray(longitudes, dtype=float), self.precision)
+        valid = ~(np.isnan(latitudes) | np.isnan(longitudes))
+
+        unique_coords = np.unique(np.column_stack([latitudes[valid], longitudes[valid]]), axis=0)
+        missing = [(lat, lon) for lat, lon in unique_coords if self.key(lat, lon) not in self.cache]
+        self.hits += len(unique_coords) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            self.search(missing)
+
+        return [self.cache.get(self.key(lat, lon)) if is_valid else None
+                for lat, lon, is_valid in zip(latitudes, longitudes, valid)]
+
+    def search(self, coords):
+        """
+        Résolution de toutes les coordonnées manquantes en une seule requête
+        """
+        # Import différé : reverse_geocoder charge scipy
+        import reverse_geocoder as rg
+        try:
+            results = rg.search([(float(lat), float(lon)) for lat, lon in coords], mode=1)
+        except Exception as e:
+            print(f"Erreur lors du géocodage de {len(coords)} coordonnées : {e}")
+            return
+
+        for (lat, lon), result in zip(coords, results):
+            self.cache[self.key(lat, lon)] = f"{result['name']}_{result['cc']}"
+
+        self.save()
+
+    def save(self):
+        if not self.cache_path:
+            return
+
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.cache, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
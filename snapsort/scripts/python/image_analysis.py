@@ -0,0 +1,113 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+import cv2
+import numpy as np
+from PIL import Image
+import imagehash
+
+
+@dataclass
+class ImageRecord:
+    """
+    Résultat de l'analyse d'une image, obtenu à partir d'un seul décodage.
+    clip_image est l'image réduite prête pour CLIP ; elle est libérée dès que l'embedding est calculé.
+    Les EXIF sont lus à part, dans les en-têtes (exif_scanner), avant tout décodage.
+    """
+    path: str
+    quality: Optional[float] = None
+    phash: Optional[int] = None
+    clip_image: Optional[Image.Image] = None
+
+
+class ImageAnalyzer:
+    def __init__(self, target_size=(600, 600), clip_size=224, workers=None, scheduler=None):
+        """
+        :param target_size: Taille utilisée pour la netteté (variance du Laplacien) et le pHash.
+        :param clip_size: Taille du plus petit côté de l'image transmise à CLIP.
+        :param workers: Nombre de threads de décodage.
+        :param scheduler: Scheduler parallèle : le décodage, le pHash et la qualité sont calculés dans
+                          ses processus au lieu du pool de threads.
+        """
+        self.target_size = target_size
+        self.clip_size = clip_size
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.scheduler = scheduler
+
+    def __getstate__(self):
+        # L'analyseur est transmis aux processus du Scheduler, sans le Scheduler lui-même
+        state = self.__dict__.copy()
+        state["scheduler"] = None
+        return state
+
+    def analyze(self, path, with_clip_image=True):
+        """
+        Décode une image une seule fois et en extrait la qualité (variance du Laplacien), le pHash
+        et l'image d'entrée de CLIP.
+
+        La qualité et le pHash sont calculés comme dans ImageCleaner (image pleine résolution de cv2.imread
+        ramenée à target_size) : un décodage JPEG réduit lisse l'image et abaisse la variance du Laplacien,
+        les seuils de netteté (blur_threshold, pré-filtre) ne seraient plus à la même échelle.
+
+        :param path: Chemin de l'image.
+        :param with_clip_image: Conserver l'image réduite pour CLIP (inutile si l'embedding est en cache).
+        :return: ImageRecord (quality et phash valent None si l'image est illisible).
+        """
+        record = ImageRecord(path=path)
+        image = cv2.imread(path)
+        if image is None:
+            print(f"Impossible de lire l'image {path}.")
+            return record
+
+        resized = cv2.resize(image, self.target_size)
+        gray = cv2.cvtColor(resized, cv2.COLOR_BGR2GRAY)
+        record.quality = cv2.Laplacian(gray, cv2.CV_64F).var()
+
+        bits = imagehash.phash(Image.fromarray(cv2.cvtColor(resized, cv2.COLOR_BGR2RGB))).hash.flatten()
+        record.phash = int(np.packbits(bits).view(">u8")[0])
+
+        if with_clip_image:
+            height, width = image.shape[:2]
+            scale = self.clip_size / min(height, width)
+            if scale < 1:
+                image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                                   interpolation=cv2.INTER_AREA)
+            record.clip_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+
+        return record
+
+    def analyze_item(self, item):
+        """
+        :param item: Tuple (chemin, with_clip_image), forme des tâches du Scheduler.
+        """
+        return self.analyze(*item)
+
+    def iter_records(self, paths, with_clip_image=None, prefetch=32):
+        """
+        Analyse les images dans un pool de threads (ou les processus du Scheduler) en conservant l'ordre des chemins.
+        Au plus `prefetch` images sont décodées à l'avance, la mémoire reste donc bornée.
+
+        :param paths: Liste de chemins d'images.
+        :param with_clip_image: Fonction chemin -> bool indiquant si l'image CLIP doit être conservée.
+        :return: Générateur d'ImageRecord.
+        """
+        if with_clip_image is None:
+            with_clip_image = lambda path: True
+
+        if self.scheduler is not None and self.scheduler.parallel:
+            items = ((path, with_clip_image(path)) for path in paths)
+            yield from self.scheduler.imap(self.analyze_item, items, prefetch=prefetch)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = deque()
+            for path in paths:
+                pending.append(pool.submit(self.analyze, path, with_clip_image(path)))
+                if len(pending) > prefetch:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
@@ -1,10 +1,24 @@
 import os
-import time
 import cv2
 import shutil
 import tempfile
 from PIL import Image
 import imagehash
+import numpy as np
+
+
+if hasattr(np, "bitwise_count"):
+    def popcount(values):
+        return np.bitwise_count(values)
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount(values):
+        """
+        Nombre de bits à 1 de chaque entier uint64 (numpy < 2.0)
+        """
+        as_bytes = np.ascontiguousarray(values, dtype=np.uint64).view(np.uint8).reshape(-1, 8)
+        return _POPCOUNT_TABLE[as_bytes].sum(axis=1)
 
 
 class ImageCleaner:
@@ -27,6 +41,14 @@ class ImageCleaner:
         
         return cv2.resize(img, self.target_size)
 
+    def calculate_phash(self, img):
+        """
+        Calcule le pHash d'une image OpenCV redimensionnée, compacté dans un entier 64 bits.
+        """
+        pil = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        bits = imagehash.phash(pil).hash.flatten()
+        return int(np.packbits(bits).view(">u8")[0])
+
     def calculate_phash_distance(self, img1, img2):
         """
         Calcule la distance entre les pHash de deux images OpenCV.
@@ -41,6 +63,28 @@ class ImageCleaner:
         hash2 = imagehash.phash(pil2)
         return abs(hash1 - hash2)
 
+    def get_images_with_quality_and_hash(self, image_paths):
+        """
+        Calcule la qualité et le pHash de chaque image en un seul décodage.
+
+        :param image_paths: Liste de chemins d'images à analyser
+        :return: Tuple (images_with_quality, hashes) : liste de tuples (chemin, qualité) et tableau
+                 uint64 des pHash alignés
+        """
+        images_with_quality = []
+        hashes = []
+
+        for path in image_paths:
+            img = self.read_and_resize(path)
+            if img is None:
+                continue
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            quality = cv2.Laplacian(gray, cv2.CV_64F).var()
+            images_with_quality.append((path, quality))
+            hashes.append(self.calculate_phash(img))
+
+        return images_with_quality, np.array(hashes, dtype=np.uint64)
+
     def get_images_with_quality(self, image_paths=None):
         """
         Calcule la qualité de chaque image.
@@ -60,80 +104,76 @@ class ImageCleaner:
 
         return images_with_quality
 
-    def remove_duplicates(self, images_with_quality, phash_threshold=20):
+    def remove_duplicates(self, images_with_quality, phash_threshold=20, hashes=None):
         """
         Compare les images (basée sur le pHash) pour éliminer les doublons parmi l'ensemble des images.
         Si deux images ont une distance pHash < phash_threshold, elles sont considérées comme
         quasi-identiques. On conserve alors l'image avec la meilleure qualité.
+
+        Le pHash de chaque image n'est calculé qu'une seule fois ; la distance de Hamming avec toutes
+        les images uniques est ensuite obtenue en une opération vectorisée (XOR + popcount).
         
         :param images_with_quality: Liste de tuples (chemin, qualité) pour toutes les images.
         :param phash_threshold: Seuil de distance pHash pour considérer deux images comme identiques.
+        :param hashes: Tableau uint64 des pHash alignés sur images_with_quality (calculés si absent).
         :return: Tuple (unique, duplicates) : listes des chemins d'images uniques et des doublons.
         """
-        unique = []      
+        if hashes is None:
+            images_with_quality, hashes = self.get_images_with_quality_and_hash(
+                [path for path, _ in images_with_quality])
+            # La qualité fournie par l'appelant est conservée
+            given_quality = dict(images_with_quality)
+            images_with_quality = [(path, given_quality[path]) for path, _ in images_with_quality]
+
+        unique = []
+        unique_hashes = np.zeros(len(images_with_quality), dtype=np.uint64)
         duplicates = []
 
-        i = 0
-        start_all = time.time()
-        for path, quality in images_with_quality:
-            i += 1
-            start_one = time.time()
-            #print(f"Etape [4/5] : [{i}/{len(images_with_quality)}]\n")
-            img1 = self.read_and_resize(path)
-            if img1 is None:
-                continue
+        for (path, quality), phash in zip(images_with_quality, hashes):
             is_duplicate = False
 
-            for idx, (unique_path, unique_quality) in enumerate(unique):
-                img2 = self.read_and_resize(unique_path)
-                if img2 is None:
-                    continue
-                distance = self.calculate_phash_distance(img1, img2)
-                if distance < phash_threshold:
+            if unique:
+                distances = popcount(np.bitwise_xor(unique_hashes[:len(unique)], phash))
+                matches = np.flatnonzero(distances < phash_threshold)
+                if len(matches):
+                    idx = int(matches[0])
+                    unique_path, unique_quality = unique[idx]
                     if quality > unique_quality:
                         duplicates.append(unique_path)
                         unique[idx] = (path, quality)
+                        unique_hashes[idx] = phash
                     else:
                         duplicates.append(path)
                     is_duplicate = True
-                    break
-            
+
             if not is_duplicate:
+                unique_hashes[len(unique)] = phash
                 unique.append((path, quality))
 
-            end_one = time.time()
-            print(f"Temps écoulé : {end_one - start_one:.2f} s\n")
-
-        end_all = time.time()
-        print(f"Temps total pour le traitement des doublons : {end_all - start_all:.2f} secondes")
-
         return unique, duplicates
     
-    def clean_cluster(self, image_paths, blur_threshold=100.0, phash_threshold=20):
+    def clean_cluster(self, image_paths, blur_threshold=100.0, phash_threshold=20, images_with_quality=None, hashes=None):
         """
         Nettoie un cluster d'images en supprimant les doublons et les images floues.
         
         :param image_paths: Liste des chemins des images du cluster
         :param blur_threshold: Seuil de qualité (variance Laplacian)
         :param phash_threshold: Seuil de distance pHash pour la détection de doublons
+        :param images_with_quality: Tuples (chemin, qualité) déjà calculés (ImageAnalyzer), sinon les images sont relues
+        :param hashes: pHash uint64 alignés sur images_with_quality
         :return: Liste des chemins d'images conservées
         """
-        images_with_quality = self.get_images_with_quality(image_paths)
+        if images_with_quality is None or hashes is None:
+            images_with_quality, hashes = self.get_images_with_quality_and_hash(image_paths)
         
         if not images_with_quality:
             return []
-            
-        print(f"Nombre d'images dans le cluster : {len(images_with_quality)}")
-        
+
         # Suppression des doublons
         #print("ETAPE 4 - Suppression des doublons :\n")
-        unique, duplicates = self.remove_duplicates(images_with_quality, phash_threshold=phash_threshold)
+        unique, duplicates = self.remove_duplicates(images_with_quality, phash_threshold=phash_threshold, hashes=hashes)
         
         # Filtrage des images floues
         retained_images = [path for (path, quality) in unique if quality > blur_threshold]
-        
-        print(f"Images retenues après nettoyage : {len(retained_images)}/{len(image_paths)}")
-        print(f"Doublons supprimés : {len(duplicates)}")
-        print(f"Images floues supprimées : {len(unique) - len(retained_images)}")
-        
+
         return retained_images
\ No newline at end of file
@@ -0,0 +1,219 @@
+import os
+import re
+import hashlib
+
+import numpy as np
+
+import model_registry
+
+# Tailles de modèle CLIP disponibles
+CLIP_MODELS = {
+    "ViT-L-14": "laion/CLIP-ViT-L-14-laion2B-s32B-b82K",
+    "ViT-B-32": "laion/CLIP-ViT-B-32-laion2B-s34B-b79K",
+}
+DEFAULT_CLIP_MODEL = "ViT-L-14"
+
+# Backends proposés par la ligne de commande ; StubBackend est construit directement par les tests et les benchmarks
+INFERENCE_BACKENDS = ["torch", "onnx", "onnx-int8"]
+
+
+def features_tensor(output):
+    """
+    get_image_features / get_text_features retournent un tenseur (transformers 4)
+    ou une sortie dont pooler_output contient les projections (transformers 5)
+    """
+    return output if hasattr(output, "norm") else output.pooler_output
+
+
+class TorchBackend:
+    """
+    Inférence PyTorch pleine précision (modèle partagé via model_registry)
+    """
+    name = "torch"
+
+    def __init__(self, model_name, clip_model=None, clip_processor=None):
+        self.model_name = model_name
+        # Le modèle et le processeur ne sont chargés qu'au premier embedding réellement demandé
+        self._clip_model = clip_model.to(self.device) if clip_model is not None else None
+        self._clip_processor = clip_processor
+
+    @property
+    def embedding_space(self):
+        """
+        Identifiant de l'espace d'embeddings : sert de version au cache, deux backends
+        dont les vecteurs ne sont pas interchangeables n'ont jamais le même.
+        """
+        return self.model_name
+
+    @property
+    def device(self):
+        return model_registry.get_device()
+
+    @property
+    def clip_model(self):
+        if self._clip_model is None:
+            self._clip_model = model_registry.get_clip_model(self.model_name, self.device)
+        return self._clip_model
+
+    @property
+    def clip_processor(self):
+        if self._clip_processor is None:
+            self._clip_processor = model_registry.get_clip_processor(self.model_name)
+        return self._clip_processor
+
+    def encode_images(self, images):
+        """
+        :return: Matrice (len(images), dim) des embeddings normalisés.
+        """
+        import torch
+
+        # Prétraitement des images en batch
+        image_inputs = self.clip_processor(images=images, return_tensors="pt").to(self.device)
+
+        with torch.no_grad():
+            image_embeddings = features_tensor(self.clip_model.get_image_features(**image_inputs))
+
+        # Normalisation
+        image_embeddings = image_embeddings / image_embeddings.norm(p=2, dim=-1, keepdim=True)
+        return image_embeddings.cpu().numpy()
+
+    def encode_texts(self, texts):
+        """
+        Embeddings normalisés d'une liste de textes, encodés en un seul lot
+        """
+        import torch
+
+        text_inputs = self.clip_processor(text=texts, return_tensors="pt", padding=True).to(self.device)
+        with torch.no_grad():
+            text_embeddings = features_tensor(self.clip_model.get_text_features(**text_inputs))
+        text_embeddings = text_embeddings / text_embeddings.norm(p=2, dim=-1, keepdim=True)
+        return text_embeddings.cpu().numpy()
+
+
+class OnnxBackend(TorchBackend):
+    """
+    Inférence CPU avec ONNX Runtime pour l'encodeur d'images.
+
+    La tour de vision (projection et normalisation comprises) est exportée une seule fois en ONNX
+    dans export_dir, puis éventuellement quantifiée dynamiquement en int8 (poids int8, activations
+    quantifiées à la volée). Les textes, peu nombreux et mis en cache, restent encodés par PyTorch.
+    """
+    def __init__(self, model_name, export_dir, quantize=False, clip_model=None, clip_processor=None):
+        """
+        :param export_dir: Dossier des modèles ONNX exportés (un sous-dossier par modèle).
+        :param quantize: Quantification dynamique int8 de la tour de vision.
+        """
+        super().__init__(model_name, clip_model, clip_processor)
+        self.quantize = quantize
+        self.name = "onnx-int8" if quantize else "onnx"
+        self.directory = os.path.join(export_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+
+    @property
+    def embedding_space(self):
+        return f"{self.model_name}+{self.name}"
+
+    @property
+    def device(self):
+        # Backend CPU : le modèle PyTorch n'est utilisé que pour l'export et les textes
+        return "cpu"
+
+    @property
+    def onnx_path(self):
+        return os.path.join(self.directory, "vision.int8.onnx" if self.quantize else "vision.onnx")
+
+    def export(self):
+        """
+        Export ONNX de la tour de vision, puis quantification si demandée (fichiers réutilisés ensuite)
+        """
+        fp32_path = os.path.join(self.directory, "vision.onnx")
+        os.makedirs(self.directory, exist_ok=True)
+
+        if not os.path.exists(fp32_path):
+            import torch
+
+            class VisionTower(torch.nn.Module):
+                def __init__(self, clip_model):
+                    super().__init__()
+                    self.clip_model = clip_model
+
+                def forward(self, pixel_values):
+                    embeddings = features_tensor(self.clip_model.get_image_features(pixel_values=pixel_values))
+                    return embeddings / embeddings.norm(p=2, dim=-1, keepdim=True)
+
+            size = self.clip_model.config.vision_config.image_size
+            print(f"Export ONNX de la tour de vision de {self.model_name}...")
+            tmp_path = fp32_path + ".tmp"
+            torch.onnx.export(VisionTower(self.clip_model).eval(), (torch.zeros(1, 3, size, size),), tmp_path,
+                              input_names=["pixel_values"], output_names=["image_embeds"],
+                              dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+                              opset_version=17, dynamo=False)
+            os.replace(tmp_path, fp32_path)
+
+        if self.quantize and not os.path.exists(self.onnx_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            print(f"Quantification int8 de la tour de vision de {self.model_name}...")
+            tmp_path = self.onnx_path + ".tmp"
+            quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, self.onnx_path)
+
+    @property
+    def session(self):
+        if not os.path.exists(self.onnx_path):
+            self.export()
+        return model_registry.get_onnx_session(self.onnx_path)
+
+    def encode_images(self, images):
+        pixel_values = self.clip_processor(images=images, return_tensors="np")["pixel_values"].astype(np.float32)
+        return self.session.run(["image_embeds"], {"pixel_values": pixel_values})[0]
+
+
+class StubBackend:
+    """
+    Backend déterministe sans réseau de neurones, pour les tests et les benchmarks :
+    l'embedding d'une image est une projection aléatoire fixe de sa vignette 8x8, celui d'un texte
+    dépend uniquement du texte. Des images proches ont donc des embeddings proches.
+    """
+    name = "stub"
+    device = "cpu"
+
+    def __init__(self, model_name="stub", dim=512):
+        self.model_name = model_name
+        self.dim = dim
+        self.projection = np.random.default_rng(0).normal(size=(8 * 8 * 3, dim)).astype(np.float32)
+
+    @property
+    def embedding_space(self):
+        return f"{self.model_name}+{self.name}"
+
+    @staticmethod
+    def normalize(embeddings):
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    def encode_images(self, images):
+        thumbnails = np.stack([np.asarray(image.convert("RGB").resize((8, 8)), dtype=np.float32).ravel()
+                               for image in images])
+        return self.normalize((thumbnails / 255.0 - 0.5) @ self.projection)
+
+    def encode_texts(self, texts):
+        seeds = [int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16) for text in texts]
+        return self.normalize(np.stack([np.random.default_rng(seed).normal(size=self.dim) for seed in seeds]).astype(np.float32))
+
+
+def get_backend(name="torch", model=DEFAULT_CLIP_MODEL, export_dir=None):
+    """
+    :param name: "torch", "onnx", "onnx-int8", "stub" (benchmarks) ou un backend déjà construit (tests).
+    :param model: Taille du modèle (clé de CLIP_MODELS) ou nom complet d'un checkpoint.
+    :param export_dir: Dossier des exports ONNX (~/.snapsort/onnx par défaut).
+    """
+    if not isinstance(name, str):
+        return name
+    model_name = CLIP_MODELS.get(model, model)
+    if name == "torch":
+        return TorchBackend(model_name)
+    if name in ("onnx", "onnx-int8"):
+        export_dir = export_dir or os.path.join(os.path.expanduser("~"), ".snapsort", "onnx")
+        return OnnxBackend(model_name, export_dir, quantize=name == "onnx-int8")
+    if name == "stub":
+        return StubBackend(model_name)
+    raise ValueError(f"Backend d'inférence inconnu : {name} (choix : {INFERENCE_BACKENDS + ['stub']})")
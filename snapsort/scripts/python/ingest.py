@@ -0,0 +1,151 @@
+import os
+import time
+import argparse
+
+from functions import IMAGE_EXTENSIONS
+from runner import run
+from scheduler import Scheduler
+import progress
+
+
+class InboxWatcher:
+    """
+    Observation du dossier de réception par scrutation (aucune dépendance, fonctionne sur tous les systèmes).
+
+    Le serveur de l'application écrit chaque photo directement sous son nom final : un fichier n'est
+    considéré comme arrivé que lorsque sa taille et sa date de modification n'ont pas changé pendant
+    `settle` secondes. Les fichiers encore en cours de réception restent en attente.
+    """
+    def __init__(self, directory, settle=1.0, allowed_extensions=None):
+        """
+        :param settle: Délai (secondes) sans modification au bout duquel un fichier est considéré comme complet.
+        """
+        self.directory = directory
+        self.settle = settle
+        self.allowed_extensions = allowed_extensions or IMAGE_EXTENSIONS
+        # Chemin -> (signature (taille, mtime), instant depuis lequel la signature n'a pas changé)
+        self.seen = {}
+        # Chemin -> signature au moment du tri
+        self.sorted = {}
+
+    def scan(self):
+        """
+        :return: Dictionnaire chemin -> (taille, mtime en nanosecondes) des images du dossier
+        """
+        files = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_file() or os.path.splitext(entry.name)[1].lower() not in self.allowed_extensions:
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def poll(self, now=None):
+        """
+        :return: Tuple (ready, pending, removed) : fichiers complets pas encore triés, fichiers en cours
+                 de réception, fichiers triés qui ont disparu du dossier.
+        """
+        now = time.monotonic() if now is None else now
+        files = self.scan()
+        ready, pending = [], []
+
+        for path, signature in files.items():
+            if self.sorted.get(path) == signature:
+                continue
+            previous = self.seen.get(path)
+            if previous is None or previous[0] != signature:
+                # Un fichier déjà ancien à sa découverte (reçu avant le lancement) est complet
+                age = time.time() - signature[1] / 1e9
+                previous = (signature, now - self.settle if age >= self.settle else now)
+                self.seen[path] = previous
+            if now - previous[1] >= self.settle and signature[0] > 0:
+                ready.append(path)
+            else:
+                pending.append(path)
+
+        removed = [path for path in self.sorted if path not in files]
+        for path in removed:
+            del self.sorted[path]
+        for path in [path for path in self.seen if path not in files]:
+            del self.seen[path]
+
+        return sorted(ready), pending, removed
+
+    def mark_sorted(self, paths):
+        for path in paths:
+            if path in self.seen:
+                self.sorted[path] = self.seen.pop(path)[0]
+
+
+def watch(args, launch_time=None, stop_event=None):
+    """
+    Mode ingestion : les photos sont triées au fil de leur arrivée, par micro-lots, pendant le transfert.
+
+    Chaque lot est un tri incrémental (seuls les jours des nouvelles photos sont retraités) limité aux fichiers
+    complets ; le modèle, les caches et le pool de processus restent chargés d'un lot à l'autre.
+    Un lot est lancé dès que `watch_batch` photos sont arrivées, lorsque plus aucun fichier n'est en cours
+    de réception, ou au plus tard `watch_delay` secondes après l'arrivée de la première photo du lot.
+
+    :param args: Options du tri (functions.set_parser), avec les options watch_*.
+    :param stop_event: threading.Event qui arrête l'observation (sinon Ctrl+C, ou watch_idle_exit).
+    """
+    args = argparse.Namespace(**vars(args))
+    args.incremental = True
+    os.makedirs(args.directory, exist_ok=True)
+
+    watcher = InboxWatcher(args.directory, settle=args.watch_settle)
+    scheduler = Scheduler(args.workers)
+    batch = []
+    queued = set()
+    batch_started = None
+    last_activity = time.monotonic()
+    sorted_images = 0
+
+    def sort_batch(pending):
+        nonlocal sorted_images
+        start = time.time()
+        pending = set(pending)
+        image_paths = [path for path in watcher.scan() if path not in pending]
+        reporter = progress.configure(events_path=args.progress_events, report_path=args.progress_report,
+                                      interval=args.progress_interval)
+        run(args, launch_time, reporter, scheduler=scheduler, image_paths=image_paths)
+        sorted_images += len(batch)
+        print(f"Lot trié : {len(batch)} photos en {time.time() - start:.2f} secondes ({sorted_images} depuis le lancement)")
+
+    print(f"Observation du dossier {args.directory}")
+    try:
+        # Les photos reçues avant le lancement forment le premier lot
+        while stop_event is None or not stop_event.is_set():
+            ready, pending, removed = watcher.poll()
+            now = time.monotonic()
+            if ready or pending or removed:
+                last_activity = now
+
+            # Les fichiers complets restent "ready" jusqu'à leur tri : chacun n'est ajouté au lot qu'une fois
+            ready = [path for path in ready if path not in queued]
+            if ready and not batch:
+                batch_started = now
+            batch += ready
+            queued.update(ready)
+
+            due = batch and (len(batch) >= args.watch_batch or not pending or now - batch_started >= args.watch_delay)
+            if due or (removed and not pending):
+                sort_batch(pending)
+                watcher.mark_sorted(batch)
+                batch = []
+                queued.clear()
+            elif args.watch_idle_exit is not None and not batch and now - last_activity >= args.watch_idle_exit:
+                print(f"Aucune photo reçue depuis {args.watch_idle_exit} secondes, fin de l'observation.")
+                break
+
+            time.sleep(args.watch_poll)
+    except KeyboardInterrupt:
+        print("Observation interrompue.")
+    finally:
+        scheduler.close()
+
+    return sorted_images
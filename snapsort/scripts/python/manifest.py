@@ -0,0 +1,112 @@
+import os
+import importlib.util
+
+# Format des dates EXIF (DateTimeOriginal)
+EXIF_DATE_FORMAT = "%Y:%m:%d %H:%M:%S"
+
+# Types des colonnes du manifeste ; les colonnes absentes sont ignorées, les colonnes inconnues gardées telles quelles
+MANIFEST_DTYPES = {
+    "image_name": "string",
+    "path": "string",
+    "latitude": "float64",
+    "longitude": "float64",
+    "file_size": "Int64",
+    "file_mtime": "float64",
+    "quality": "float64",
+    "phash": "UInt64",
+    "cluster": "string",
+    "categories": "string",
+    "best_category": "string",
+    "category_score": "float64",
+    "category_margin": "float64",
+    "drop_reason": "string",
+    "kept_frame": "string",
+    "folder_path": "string",
+    "near_duplicate_of": "string",
+    "near_duplicate_score": "float64",
+}
+
+MANIFEST_FORMATS = ["parquet", "csv"]
+
+
+def parquet_available():
+    """
+    Parquet nécessite pyarrow (dépendance optionnelle) ; sans lui, le manifeste est écrit en csv
+    """
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def default_format():
+    return "parquet" if parquet_available() else "csv"
+
+
+def manifest_path(directory, manifest_format):
+    """
+    Manifeste d'un dossier trié : à côté du dossier, avec l'extension du format
+    """
+    return os.path.normpath(directory) + "." + manifest_format
+
+
+def parse_dates(values):
+    """
+    Dates EXIF (chaînes "AAAA:MM:JJ HH:MM:SS") en datetime64 ; les dates absentes ou invalides deviennent NaT
+    """
+    # Imports différés : les options de la ligne de commande lisent ce module sans charger pandas
+    import pandas as pd
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    return pd.to_datetime(values, format=EXIF_DATE_FORMAT, errors="coerce")
+
+
+def typed(df):
+    """
+    Applique les types du manifeste (dates, flottants, entiers nullables, chaînes)
+    """
+    df = df.copy()
+    if "date_time" in df.columns:
+        df["date_time"] = parse_dates(df["date_time"])
+    for column, dtype in MANIFEST_DTYPES.items():
+        if column in df.columns:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def write_manifest(df, path, verbose=True):
+    """
+    Écrit le manifeste en une seule fois, dans un fichier temporaire renommé ensuite :
+    un tri interrompu ne laisse jamais de manifeste partiel.
+
+    :param path: Fichier .parquet ou .csv (format déduit de l'extension).
+    """
+    df = typed(df)
+    tmp_path = path + ".tmp"
+    if path.endswith(".parquet"):
+        df.to_parquet(tmp_path, index=False)
+    else:
+        # Les dates gardent le format EXIF, lisible par les outils qui lisaient l'ancien csv
+        df.to_csv(tmp_path, index=False, date_format=EXIF_DATE_FORMAT)
+    os.replace(tmp_path, path)
+    if verbose:
+        print(f"Manifeste sauvegardé sous {path}")
+
+
+def read_manifest(path):
+    """
+    :return: DataFrame typé (les types d'un csv sont restaurés à la lecture)
+    """
+    import pandas as pd
+    if path.endswith(".parquet"):
+        return typed(pd.read_parquet(path))
+    # Types donnés dès la lecture : un pHash au-delà de int64 ne passe pas par une chaîne ou un flottant
+    return typed(pd.read_csv(path, dtype={**MANIFEST_DTYPES, "date_time": "string"}))
+
+
+def find_manifest(directory):
+    """
+    Manifeste existant d'un dossier, parquet en priorité (None si aucun)
+    """
+    for manifest_format in MANIFEST_FORMATS:
+        path = manifest_path(directory, manifest_format)
+        if os.path.exists(path) and (manifest_format != "parquet" or parquet_available()):
+            return path
+    return None
@@ -0,0 +1,57 @@
+import time
+
+# Modèles et processeurs déjà chargés, partagés par tous les managers du processus
+_models = {}
+_processors = {}
+_sessions = {}
+_device = None
+
+
+def get_device():
+    """
+    Périphérique d'inférence ("cuda" si disponible). torch n'est importé qu'au premier appel.
+    """
+    global _device
+    if _device is None:
+        import torch
+        _device = "cuda" if torch.cuda.is_available() else "cpu"
+    return _device
+
+
+def get_clip_model(model_name, device=None):
+    """
+    Retourne le modèle CLIP demandé, chargé une seule fois par processus au premier appel
+    """
+    device = device or get_device()
+    key = (model_name, device)
+    if key not in _models:
+        from transformers import CLIPModel
+
+        start = time.time()
+        _models[key] = CLIPModel.from_pretrained(model_name).to(device)
+        _models[key].eval()
+        print(f"Chargement du modèle {model_name} : {time.time() - start:.2f} secondes")
+    return _models[key]
+
+
+def get_clip_processor(model_name):
+    """
+    Retourne le processeur CLIP demandé, chargé une seule fois par processus au premier appel
+    """
+    if model_name not in _processors:
+        from transformers import CLIPProcessor
+        _processors[model_name] = CLIPProcessor.from_pretrained(model_name)
+    return _processors[model_name]
+
+
+def get_onnx_session(onnx_path):
+    """
+    Retourne la session ONNX Runtime (CPU) du modèle demandé, créée une seule fois par processus
+    """
+    if onnx_path not in _sessions:
+        import onnxruntime as ort
+
+        start = time.time()
+        _sessions[onnx_path] = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+        print(f"Chargement du modèle {onnx_path} : {time.time() - start:.2f} secondes")
+    return _sessions[onnx_path]
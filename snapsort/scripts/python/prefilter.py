@@ -0,0 +1,116 @@
+class FramePrefilter:
+    """
+    Pré-filtre des images avant l'inférence, à partir de la qualité et du pHash de la passe d'analyse.
+
+    Les images d'un jour sont parcourues dans l'ordre chronologique : une rafale est une suite d'images
+    consécutives, prises à quelques secondes d'intervalle, dont le pHash est proche de celui de l'image précédente. Seule l'image la plus nette de
+    chaque rafale est encodée. Une image floue isolée n'est pas encodée non plus lorsqu'une autre image
+    du même jour l'est. Chaque image écartée est rattachée à une image conservée du même jour
+    (l'image retenue de sa rafale, ou l'image conservée qui la précède ou la suit), dont elle
+    reprendra le cluster et la catégorie. La détection est linéaire : chaque image n'est comparée qu'à la précédente.
+    """
+    def __init__(self, days, times=None, blur_threshold=100.0, phash_threshold=20, max_gap=10.0):
+        """
+        :param days: Dictionnaire chemin -> jour (clustering_manager.day_key).
+        :param times: Dictionnaire chemin -> date de prise de vue (datetime, NaT si absente).
+        :param blur_threshold: Seuil de qualité (variance du Laplacien), comme ImageCleaner.clean_cluster.
+        :param phash_threshold: Distance pHash en dessous de laquelle deux images consécutives forment une rafale.
+        :param max_gap: Écart maximal (secondes) entre deux images d'une rafale, lorsque leurs dates sont connues.
+        """
+        self.days = days
+        self.times = times or {}
+        self.max_gap = max_gap
+        self.blur_threshold = blur_threshold
+        self.phash_threshold = phash_threshold
+        # Chemin -> (raison, chemin de l'image conservée) des images écartées
+        self.drops = {}
+
+    def is_burst(self, previous, record):
+        if previous.phash is None or record.phash is None:
+            return False
+        previous_time, time = self.times.get(previous.path), self.times.get(record.path)
+        # NaT n'est pas égal à lui-même : sans date, seul le pHash compte
+        if previous_time == previous_time and time == time and previous_time is not None and time is not None:
+            if abs((time - previous_time).total_seconds()) > self.max_gap:
+                return False
+        return bin(previous.phash ^ record.phash).count("1") < self.phash_threshold
+
+    def drop(self, record, reason, kept):
+        self.drops[record.path] = (reason, kept.path)
+        record.clip_image = None
+
+    def filter(self, records):
+        """
+        :param records: ImageRecord dans l'ordre chronologique, jour par jour.
+        :return: Générateur des ImageRecord conservés, à encoder.
+        """
+        burst = []
+        day = None
+        # Images floues du jour en attente d'une image conservée
+        blurry = []
+        last_kept = None
+
+        for record in records:
+            record_day = self.days.get(record.path)
+            if burst and (record_day != day or not self.is_burst(burst[-1], record)):
+                kept = self.close_burst(burst, blurry, last_kept)
+                if kept is not None:
+                    last_kept = kept
+                    yield kept
+                burst = []
+
+            if record_day != day:
+                kept = self.close_day(blurry)
+                if kept is not None:
+                    yield kept
+                blurry, last_kept, day = [], None, record_day
+
+            # Image illisible : transmise telle quelle, elle ne sera pas encodée
+            if record.quality is None:
+                yield record
+                continue
+            burst.append(record)
+
+        if burst:
+            kept = self.close_burst(burst, blurry, last_kept)
+            if kept is not None:
+                last_kept = kept
+                yield kept
+        kept = self.close_day(blurry)
+        if kept is not None:
+            yield kept
+
+    def close_burst(self, burst, blurry, last_kept):
+        """
+        :return: L'image retenue de la rafale, ou None si c'est une image floue isolée (mise en attente)
+        """
+        kept = max(burst, key=lambda record: record.quality)
+        for record in burst:
+            if record is not kept:
+                self.drop(record, "duplicate", kept)
+
+        if len(burst) == 1 and kept.quality < self.blur_threshold:
+            if last_kept is not None:
+                self.drop(kept, "blurry", last_kept)
+            else:
+                blurry.append(kept)
+            return None
+
+        # Les images floues qui précèdent sont rattachées à la première image conservée du jour
+        for record in blurry:
+            self.drop(record, "blurry", kept)
+        blurry.clear()
+        return kept
+
+    def close_day(self, blurry):
+        """
+        Fin d'un jour : si aucune image nette n'a été conservée, la moins floue est encodée malgré tout
+        """
+        if not blurry:
+            return None
+        kept = max(blurry, key=lambda record: record.quality)
+        for record in blurry:
+            if record is not kept:
+                self.drop(record, "blurry", kept)
+        blurry.clear()
+        return kept
@@ -0,0 +1,271 @@
+import os
+import sys
+import json
+import time
+import functools
+import threading
+
+
+class JobCancelled(Exception):
+    """
+    Tri annulé pendant son exécution (démon)
+    """
+
+
+@functools.lru_cache(maxsize=None)
+def psutil_module():
+    """
+    psutil s'il est installé : mesures de mémoire sous Linux, macOS et Windows (None sinon)
+    """
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil
+
+
+def windows_memory():
+    """
+    Mémoire sous Windows sans psutil (GetProcessMemoryInfo, GlobalMemoryStatusEx).
+
+    :return: Dictionnaire en octets {rss, peak_rss, available}.
+    """
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in ("PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                                                 "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage",
+                                                 "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+    class MemoryStatusEx(ctypes.Structure):
+        _fields_ = [("dwLength", wintypes.DWORD), ("dwMemoryLoad", wintypes.DWORD)] + [
+            (name, ctypes.c_ulonglong) for name in ("ullTotalPhys", "ullAvailPhys", "ullTotalPageFile",
+                                                    "ullAvailPageFile", "ullTotalVirtual", "ullAvailVirtual",
+                                                    "ullAvailExtendedVirtual")]
+
+    kernel32 = ctypes.WinDLL("kernel32")
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    kernel32.K32GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD]
+    kernel32.GlobalMemoryStatusEx.argtypes = [ctypes.POINTER(MemoryStatusEx)]
+
+    counters = ProcessMemoryCounters(cb=ctypes.sizeof(ProcessMemoryCounters))
+    status = MemoryStatusEx(dwLength=ctypes.sizeof(MemoryStatusEx))
+    memory = {"rss": None, "peak_rss": None, "available": None}
+    if kernel32.K32GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        memory["rss"], memory["peak_rss"] = counters.WorkingSetSize, counters.PeakWorkingSetSize
+    if kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+        memory["available"] = status.ullAvailPhys
+    return memory
+
+
+def windows_memory_mb(key):
+    try:
+        value = windows_memory()[key]
+    except (OSError, AttributeError):
+        return None
+    return round(value / 1024 ** 2, 1) if value is not None else None
+
+
+def peak_rss_mb():
+    """
+    Mémoire résidente maximale du processus en Mo (None si non disponible)
+    """
+    if sys.platform == "win32":
+        return windows_memory_mb("peak_rss")
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Octets sous macOS, kilo-octets sous Linux
+    return round(peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def current_rss_mb():
+    """
+    Mémoire résidente actuelle du processus en Mo : psutil, /proc sous Linux, l'API Win32 sous Windows,
+    sinon la mémoire maximale (surestimation : un plafond reste respecté)
+    """
+    psutil = psutil_module()
+    if psutil is not None:
+        return round(psutil.Process().memory_info().rss / 1024 ** 2, 1)
+    if sys.platform == "win32":
+        return windows_memory_mb("rss")
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2, 1)
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mb()
+
+
+def available_memory_mb():
+    """
+    Mémoire physique disponible sur la machine en Mo : psutil, /proc sous Linux, l'API Win32 sous Windows
+    (None si non disponible, sous macOS sans psutil)
+    """
+    psutil = psutil_module()
+    if psutil is not None:
+        return round(psutil.virtual_memory().available / 1024 ** 2, 1)
+    if sys.platform == "win32":
+        return windows_memory_mb("available")
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class ProgressReporter:
+    """
+    Suivi de l'avancement et des métriques de chaque étape du pipeline.
+
+    Les événements (début et fin d'étape, avancement, résumé) sont écrits en JSON, un par ligne,
+    sur un canal dédié (fichier ou tube nommé) plutôt que mélangés aux messages de stdout.
+    L'avancement est limité à un événement par intervalle : le coût ne dépend pas du nombre d'images.
+    Les lignes historiques "Etape [k/n] : [i/N]" lues par l'interface restent affichées, au même rythme.
+    """
+    def __init__(self, events_path=None, report_path=None, interval=0.5, legacy=True, sink=None, cancel_event=None):
+        """
+        :param events_path: Fichier des événements JSON-lines (None : pas d'événements).
+        :param report_path: Fichier JSON du rapport final (None : pas de rapport).
+        :param interval: Intervalle minimal en secondes entre deux événements d'avancement d'une étape.
+        :param legacy: Afficher les lignes "Etape [k/n] : [i/N]" sur stdout.
+        :param sink: Fonction appelée avec chaque événement (dictionnaire), en plus du fichier.
+        :param cancel_event: threading.Event : une fois positionné, le prochain avancement lève JobCancelled.
+        """
+        self.events = open(events_path, "a", encoding="utf-8", buffering=1) if events_path else None
+        self.sink = sink
+        self.cancel_event = cancel_event
+        self.report_path = report_path
+        self.interval = interval
+        self.legacy = legacy
+        self.started = time.time()
+        self.stage = None
+        self.stages = []
+        self.lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        record = {"event": event, "time": round(time.time(), 3), **fields}
+        if self.sink is not None:
+            self.sink(record)
+        if self.events is not None:
+            self.events.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def start_stage(self, name, total=None, legacy=None):
+        """
+        :param name: Nom de l'étape (exif, analysis, clustering, categories, arborescence, albums...).
+        :param total: Nombre d'éléments à traiter, s'il est connu.
+        :param legacy: Numéro "k/n" de la ligne "Etape [k/n]" historique (None : pas de ligne).
+        """
+        self.check_cancelled()
+        if self.stage is not None:
+            self.end_stage()
+
+        with self.lock:
+            self.stage = {"name": name, "total": total, "done": 0, "legacy": legacy, "metrics": {},
+                          "start": time.perf_counter(), "last_report": 0.0}
+        self.emit("stage_start", stage=name, total=total)
+
+    def advance(self, n=1):
+        """
+        Avancement de n éléments dans l'étape courante (utilisable depuis plusieurs threads)
+        """
+        self.check_cancelled()
+        with self.lock:
+            stage = self.stage
+            if stage is None:
+                return
+            stage["done"] += n
+            now = time.perf_counter()
+            finished = stage["total"] is not None and stage["done"] >= stage["total"]
+            if not finished and now - stage["last_report"] < self.interval:
+                return
+            stage["last_report"] = now
+            done, total, elapsed = stage["done"], stage["total"], now - stage["start"]
+
+        throughput = done / elapsed if elapsed > 0 else None
+        eta = (total - done) / throughput if throughput and total is not None else None
+        self.emit("progress", stage=stage["name"], done=done, total=total, elapsed=round(elapsed, 3),
+                  throughput=round(throughput, 2) if throughput else None,
+                  eta=round(eta, 1) if eta is not None else None, peak_rss_mb=peak_rss_mb())
+
+        if self.legacy and stage["legacy"] and total:
+            print(f"Etape [{stage['legacy']}] : [{done}/{total}]")
+
+    def metric(self, **metrics):
+        """
+        Métriques de l'étape courante (taux de succès du cache, nombre de clusters...)
+        """
+        with self.lock:
+            if self.stage is not None:
+                self.stage["metrics"].update(metrics)
+
+    def end_stage(self, **metrics):
+        with self.lock:
+            stage, self.stage = self.stage, None
+        if stage is None:
+            return
+
+        stage["metrics"].update(metrics)
+        seconds = time.perf_counter() - stage["start"]
+        result = {
+            "stage": stage["name"],
+            "done": stage["done"],
+            "total": stage["total"],
+            "seconds": round(seconds, 3),
+            "throughput": round(stage["done"] / seconds, 2) if seconds > 0 and stage["done"] else None,
+            "peak_rss_mb": peak_rss_mb(),
+            **stage["metrics"],
+        }
+        self.stages.append(result)
+        self.emit("stage_end", **result)
+        return result
+
+    def summary(self, **fields):
+        """
+        Fin du passage : événement "summary" et rapport JSON (durée et métriques de chaque étape)
+        """
+        if self.stage is not None:
+            self.end_stage()
+
+        report = {"total_seconds": round(time.time() - self.started, 3), "peak_rss_mb": peak_rss_mb(),
+                  "stages": self.stages, **fields}
+        self.emit("summary", **report)
+
+        if self.report_path:
+            with open(self.report_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"Rapport d'exécution écrit dans {self.report_path}")
+        return report
+
+    def close(self):
+        if self.events is not None:
+            self.events.close()
+            self.events = None
+
+
+# Suivi partagé par tous les modules du processus (remplacé par configure au lancement)
+_reporter = ProgressReporter()
+
+
+def get_reporter():
+    return _reporter
+
+
+def configure(**kwargs):
+    """
+    Remplace le suivi du processus (paramètres de ProgressReporter)
+    """
+    global _reporter
+    _reporter.close()
+    _reporter = ProgressReporter(**kwargs)
+    return _reporter
@@ -0,0 +1,133 @@
+import os
+import time
+
+from functions import create_category_folders, create_arborescence, load_manifest, remove_stale_album_files, get_image_paths, album_destinations, new_album_sources
+from manifest import manifest_path, parquet_available, write_manifest
+from album_materializer import AlbumMaterializer
+from checkpoint import CheckpointError, RunCheckpoint, default_run_dir, run_fingerprint
+from geocoding import LocationResolver
+import progress
+
+
+class SortError(Exception):
+    """
+    Tri impossible (dossier source introuvable...)
+    """
+
+
+def save_manifest(df, directory, manifest_format, export_csv=False):
+    """
+    Écriture du manifeste du tri, et de son export csv si demandé
+    """
+    write_manifest(df, manifest_path(directory, manifest_format))
+    if export_csv and manifest_format != "csv":
+        write_manifest(df, manifest_path(directory, "csv"))
+
+
+def run(args, launch_time=None, reporter=None, scheduler=None, image_paths=None):
+    """
+    Exécute un tri complet : analyse, clustering, catégories, arborescence et albums.
+    Utilisé par main.py (un tri par processus) et par le démon (plusieurs tris avec le modèle déjà chargé).
+
+    :param args: Options du tri (argparse.Namespace de functions.set_parser).
+    :param launch_time: Instant de lancement du processus, pour mesurer le temps de démarrage.
+    :param reporter: ProgressReporter du tri (créé à partir des options si None).
+    :param scheduler: Scheduler partagé entre plusieurs tris (un pool par tri si None).
+    :param image_paths: Images du dossier à trier (toutes si None) : le mode ingestion écarte les fichiers en cours de réception.
+    :return: Rapport du tri (ProgressReporter.summary), ou None si rien n'a été trié.
+    """
+    launch_time = launch_time or time.time()
+    directory = args.directory
+    destination_directory = args.destination_directory
+    cache_dir = None if args.no_cache else args.cache_dir
+    manifest_format = args.manifest_format
+    if manifest_format == "parquet" and not parquet_available():
+        print("pyarrow n'est pas installé : le manifeste sera écrit en csv.")
+        manifest_format = "csv"
+
+    # Suivi de l'avancement : événements JSON-lines et rapport par étape
+    if reporter is None:
+        reporter = progress.configure(events_path=args.progress_events, report_path=args.progress_report,
+                                      interval=args.progress_interval)
+
+    if not os.path.isdir(directory):
+        raise SortError(f"Le dossier {directory} n'existe pas.")
+
+    if image_paths is None:
+        image_paths = get_image_paths(directory)
+
+    # Dossier vide : rien à charger
+    if not image_paths:
+        print("Aucune image à trier.")
+        return None
+
+    if args.metadata_only:
+        # Seuls les EXIF sont lus : ni torch ni modèle ne sont importés
+        from dataframe_completion import DataframeCompletion
+        save_manifest(DataframeCompletion(image_paths).get_dataframe(), directory, manifest_format, args.export_csv)
+        print(f"Temps total d'exécution : {time.time() - launch_time:.2f} secondes")
+        return None
+
+    # Mode incrémental : le manifeste du passage précédent (parquet ou csv)
+    previous_df = load_manifest(directory) if args.incremental else None
+
+    # Imports différés : le modèle lui-même n'est chargé qu'au premier embedding
+    from categories_manager import CategoriesManager
+    print(f"Temps de démarrage : {time.time() - launch_time:.2f} secondes")
+
+    # Points de reprise : un tri interrompu est repris avec --resume, tant que les images et les options n'ont pas changé
+    fingerprint = run_fingerprint(image_paths, backend=getattr(args.backend, "embedding_space", args.backend), model=args.model, prefilter=args.prefilter,
+                                  incremental=args.incremental)
+    try:
+        checkpoint = RunCheckpoint(args.run_dir or default_run_dir(directory), fingerprint, resume=args.resume)
+    except CheckpointError as e:
+        raise SortError(str(e))
+
+    call = CategoriesManager(directory=directory, cache_dir=cache_dir, workers=args.workers,
+                             backend=args.backend, model=args.model, scheduler=scheduler, image_paths=image_paths,
+                             prefilter=args.prefilter, batch_size=args.batch_size, memory_limit_mb=args.memory_limit_mb,
+                             checkpoint=checkpoint, previous_df=previous_df)
+
+    # Record du temps d'exécution
+    starting_time = time.time()
+
+    # Le manifeste passe d'une étape à l'autre en mémoire, il n'est écrit qu'à la fin
+    df = call.pipeline(starting_time, previous_df=previous_df)
+
+    # Création du dossier de destination
+    os.makedirs(destination_directory, exist_ok=True)
+    #call.create_autres_subfolders(destination_directory)
+
+    # Déduction de l'architecture (localisations en cache entre les passages)
+    resolver = LocationResolver(os.path.join(cache_dir, "locations.json") if cache_dir else None, precision=args.geocode_precision)
+    reporter.start_stage("arborescence")
+    df = create_arborescence(df, resolver)
+    lookups = resolver.hits + resolver.misses
+    reporter.end_stage(geocoding_hits=resolver.hits, geocoding_misses=resolver.misses,
+                       geocoding_hit_rate=round(resolver.hits / lookups, 4) if lookups else None)
+
+    transfer_paths = None
+    if previous_df is not None:
+        # Seuls les albums des jours retraités, et des images conservées qui changent de dossier, sont modifiés
+        remove_stale_album_files(previous_df, df, destination_directory)
+        transfer_paths = set(call.reprocessed_paths or []) | new_album_sources(previous_df, df, destination_directory)
+    else:
+        # Les fichiers déjà à jour sont conservés, seuls ceux qui ne font plus partie des albums sont supprimés
+        AlbumMaterializer.prune(destination_directory, album_destinations(df, destination_directory))
+
+    # Création des dossiers et importation des images dans la destination
+    create_category_folders(df, destination_directory, test=False, paths=transfer_paths,
+                            strategy=args.transfer_mode, workers=args.transfer_workers)
+
+    checkpoint.complete("albums", images=len(df))
+
+    # Le manifeste n'est écrit qu'une fois les albums à jour : un tri interrompu garde l'ancien manifeste
+    save_manifest(df, directory, manifest_format, args.export_csv)
+    checkpoint.finish()
+
+    # Rapport temps d'exécution
+    total_time = time.time() - starting_time
+    print(f"Temps total d'exécution : {total_time:.2f} secondes")
+    return reporter.summary(images=len(call.image_paths), startup_seconds=round(starting_time - launch_time, 3),
+                            backend=call.backend.embedding_space, workers=call.scheduler.workers,
+                            batch_size=call.batch_size, resumed=checkpoint.resumed)
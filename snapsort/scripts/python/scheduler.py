@@ -0,0 +1,92 @@
+import os
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+def default_workers():
+    """
+    Nombre de processus par défaut : un par cœur disponible
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class Scheduler:
+    """
+    Répartition du travail CPU (EXIF, pHash, qualité, clustering par jour, nettoyage par cluster)
+    dans un pool de processus. L'inférence reste dans le processus principal, sur le modèle partagé.
+
+    Les résultats sont toujours rendus dans l'ordre des tâches : la fusion est donc déterministe
+    et ne dépend pas du nombre de processus. Avec workers <= 1, tout s'exécute dans le processus courant.
+    """
+    def __init__(self, workers=None):
+        """
+        :param workers: Nombre de processus (un par cœur si None).
+        """
+        self.workers = default_workers() if workers is None else max(1, workers)
+        self._pool = None
+
+    @property
+    def parallel(self):
+        return self.workers > 1
+
+    @property
+    def pool(self):
+        """
+        Pool créé au premier usage. Les processus ne sont pas obtenus par fork du processus principal
+        (qui peut déjà contenir torch et ses threads) : forkserver sous Linux, spawn ailleurs.
+        """
+        if self._pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+        return self._pool
+
+    def chunksize(self, n_tasks):
+        # Quelques lots par processus : limite le coût de transfert sans déséquilibrer la charge
+        return max(1, n_tasks // (self.workers * 4))
+
+    def map(self, fn, *iterables):
+        """
+        Équivalent ordonné de map(fn, *iterables), réparti sur le pool.
+
+        :return: Liste des résultats dans l'ordre des tâches.
+        """
+        tasks = list(zip(*iterables))
+        if not self.parallel or len(tasks) <= 1:
+            return [fn(*task) for task in tasks]
+
+        return list(self.pool.map(fn, *zip(*tasks), chunksize=self.chunksize(len(tasks))))
+
+    def imap(self, fn, items, prefetch=32):
+        """
+        Générateur ordonné de fn(item) : au plus `prefetch` tâches sont en cours à la fois,
+        la mémoire reste donc bornée quel que soit le nombre d'éléments.
+        """
+        if not self.parallel:
+            for item in items:
+                yield fn(item)
+            return
+
+        pending = deque()
+        for item in items:
+            pending.append(self.pool.submit(fn, item))
+            if len(pending) > prefetch:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+    def close(self):
+        if self._pool is not None:
+            # Les tâches pas encore commencées sont abandonnées (tri annulé ou en erreur)
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,448 @@
+import os
+import re
+import json
+import argparse
+
+import numpy as np
+
+
+class SimilarityIndex:
+    """
+    Index persistant de plus proches voisins approchés sur les embeddings de toute la bibliothèque.
+
+    Index à listes inversées (IVF) : les vecteurs sont répartis entre environ sqrt(N) centroïdes
+    (k-means sphérique) et une requête ne compare que les vecteurs des n_probe listes les plus proches,
+    soit une fraction de la bibliothèque. Les vecteurs (float16) sont dans une matrice mappée en mémoire,
+    comme pour EmbeddingsCache ; les centroïdes et l'affectation de chaque ligne sont sauvegardés à côté.
+    Les insertions sont incrémentales : une nouvelle image est rangée dans la liste de son centroïde
+    le plus proche, et les centroïdes ne sont réappris que lorsque l'index a doublé depuis le dernier apprentissage.
+    Un index par espace d'embeddings, dans le dossier du cache.
+    """
+    FORMAT_VERSION = 1
+
+    def __init__(self, cache_dir, embedding_space, n_probe=8, exact_below=4096):
+        """
+        :param cache_dir: Dossier racine du cache.
+        :param embedding_space: Espace d'embeddings (backend.embedding_space) : un index par modèle et backend.
+        :param n_probe: Nombre de listes parcourues par requête.
+        :param exact_below: En dessous de ce nombre d'images, la recherche est exhaustive (plus rapide que l'IVF).
+        """
+        self.embedding_space = embedding_space
+        self.n_probe = n_probe
+        self.exact_below = exact_below
+        self.directory = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", embedding_space), "ann")
+        self.index_path = os.path.join(self.directory, "index.json")
+        self.vectors_path = os.path.join(self.directory, "vectors.f16")
+        self.centroids_path = os.path.join(self.directory, "centroids.npy")
+        self.assignments_path = os.path.join(self.directory, "assignments.npy")
+
+        self._vectors = None
+        self._lists = None
+        # Fichier de vecteurs remplacé par un compactage, supprimé une fois le nouvel index écrit
+        self._replaced_vectors = None
+        self._load()
+
+    def _empty_index(self):
+        return {
+            "format_version": self.FORMAT_VERSION,
+            "embedding_space": self.embedding_space,
+            "dim": None,
+            "capacity": 0,
+            "trained_size": 0,
+            # Fichier des vecteurs : un nouveau fichier à chaque compactage, l'ancien reste valide jusqu'à la sauvegarde
+            "vectors_file": "vectors.f16",
+            "paths": [],  # chemin absolu de chaque ligne, None si l'image a été retirée
+        }
+
+    def _load(self):
+        self.index = self._empty_index()
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        if not os.path.exists(self.index_path):
+            self.rows = {}
+            return
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("format_version") != self.FORMAT_VERSION or index.get("embedding_space") != self.embedding_space:
+                raise ValueError("format ou espace d'embeddings différent")
+            assignments = np.load(self.assignments_path)
+            centroids = np.load(self.centroids_path) if os.path.exists(self.centroids_path) else None
+        except (OSError, ValueError) as e:
+            print(f"Index de similarité illisible ou obsolète, il sera reconstruit : {e}")
+            self.clear()
+            return
+
+        self.vectors_path = os.path.join(self.directory, index.setdefault("vectors_file", "vectors.f16"))
+        expected_size = index["capacity"] * (index["dim"] or 0) * np.dtype(np.float16).itemsize
+        vectors_size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        if vectors_size < expected_size:
+            print("Vecteurs de l'index de similarité absents ou incomplets, l'index sera reconstruit.")
+            self.clear()
+            return
+
+        self.index = index
+        self.assignments = assignments
+        self.centroids = centroids
+        self.rows = {path: row for row, path in enumerate(index["paths"]) if path is not None}
+
+        # Affectations écrites sans l'index correspondant (interruption pendant une sauvegarde) : listes réapprises
+        if len(assignments) != len(index["paths"]) or (centroids is not None and assignments.max(initial=-1) >= len(centroids)):
+            print("Listes de l'index de similarité incohérentes, elles sont réapprises.")
+            self.train()
+
+    def clear(self):
+        self._vectors = None
+        paths = [self.index_path, self.centroids_path, self.assignments_path]
+        # Tous les fichiers de vecteurs, y compris ceux d'un compactage interrompu
+        if os.path.isdir(self.directory):
+            paths += [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                      if re.fullmatch(r"vectors(\.\d+)?\.f16", name)]
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+        self._lists = None
+        self._replaced_vectors = None
+        self.index = self._empty_index()
+        self.vectors_path = os.path.join(self.directory, self.index["vectors_file"])
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.rows = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, path):
+        return os.path.abspath(path) in self.rows
+
+    def paths(self):
+        return list(self.rows)
+
+    def _open_vectors(self, capacity):
+        if self._vectors is not None and self._vectors.shape[0] >= capacity:
+            return self._vectors
+
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+
+        # Agrandissement du fichier (les lignes existantes sont conservées)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(capacity * self.index["dim"] * np.dtype(np.float16).itemsize)
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float16, mode="r+", shape=(capacity, self.index["dim"]))
+        self.index["capacity"] = capacity
+        return self._vectors
+
+    @property
+    def vectors(self):
+        if self._vectors is None and self.index["capacity"]:
+            self._open_vectors(self.index["capacity"])
+        return self._vectors
+
+    def vector(self, path):
+        """
+        Embedding indexé d'une image (None si elle n'est pas dans l'index)
+        """
+        row = self.rows.get(os.path.abspath(path))
+        return None if row is None else np.asarray(self.vectors[row], dtype=np.float32)
+
+    def add(self, paths, embeddings):
+        """
+        Ajoute ou met à jour les embeddings des images ; les lignes sans embedding (NaN) sont ignorées.
+
+        :param paths: Liste de chemins d'images.
+        :param embeddings: Matrice (len(paths), dim) alignée sur paths.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        valid = ~np.isnan(embeddings).any(axis=1)
+        paths = [os.path.abspath(path) for path, ok in zip(paths, valid) if ok]
+        embeddings = embeddings[valid]
+        if not paths:
+            return
+
+        if self.index["dim"] is None:
+            self.index["dim"] = int(embeddings.shape[1])
+        elif self.index["dim"] != embeddings.shape[1]:
+            print("Dimension d'embedding différente de celle de l'index, l'index est réinitialisé.")
+            self.clear()
+            self.index["dim"] = int(embeddings.shape[1])
+
+        embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+        rows = []
+        for path in paths:
+            row = self.rows.get(path)
+            if row is None:
+                row = len(self.index["paths"])
+                self.index["paths"].append(path)
+                self.rows[path] = row
+            rows.append(row)
+        rows = np.array(rows)
+
+        n_rows = len(self.index["paths"])
+        if n_rows > self.index["capacity"]:
+            self._open_vectors(max(1024, self.index["capacity"] * 2, n_rows))
+        self.vectors[rows] = embeddings.astype(np.float16)
+
+        if len(self.assignments) < n_rows:
+            self.assignments = np.concatenate([self.assignments, np.full(n_rows - len(self.assignments), -1, dtype=np.int32)])
+
+        # Réapprentissage des centroïdes quand l'index a doublé, sinon rangement dans les listes existantes
+        if self.centroids is None or len(self) >= 2 * self.index["trained_size"]:
+            self.train()
+        else:
+            self.assignments[rows] = self._nearest_centroids(embeddings)
+        self._lists = None
+
+    def remove(self, paths):
+        """
+        Retire des images de l'index (fichiers supprimés) ; leurs lignes sont récupérées au prochain apprentissage
+        """
+        for path in paths:
+            row = self.rows.pop(os.path.abspath(path), None)
+            if row is not None:
+                self.index["paths"][row] = None
+                self.assignments[row] = -1
+        self._lists = None
+
+    def _nearest_centroids(self, embeddings, block=8192):
+        labels = np.empty(len(embeddings), dtype=np.int32)
+        for start in range(0, len(embeddings), block):
+            labels[start:start + block] = np.argmax(embeddings[start:start + block] @ self.centroids.T, axis=1)
+        return labels
+
+    def _compact(self):
+        """
+        Supprime les lignes des images retirées : les seules lignes vivantes sont copiées dans un nouveau fichier.
+        L'index sur disque continue de désigner l'ancien fichier, intact, jusqu'à la prochaine sauvegarde.
+        """
+        live = np.array(sorted(self.rows.values()), dtype=np.int64)
+        if len(live) == len(self.index["paths"]):
+            return
+
+        vectors = np.array(self.vectors[live]) if len(live) else np.zeros((0, self.index["dim"]), dtype=np.float16)
+        self.index["paths"] = [self.index["paths"][row] for row in live]
+        self.rows = {path: row for row, path in enumerate(self.index["paths"])}
+        self.assignments = np.full(len(live), -1, dtype=np.int32)
+
+        # Fichier suivant (vectors.1.f16, vectors.2.f16...) ; un fichier déjà remplacé et jamais sauvegardé est supprimé
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._vectors = None
+        if self._replaced_vectors is None:
+            self._replaced_vectors = self.vectors_path
+        elif os.path.exists(self.vectors_path):
+            os.remove(self.vectors_path)
+        generation = int(re.fullmatch(r"vectors(?:\.(\d+))?\.f16", self.index["vectors_file"]).group(1) or 0) + 1
+        self.index["vectors_file"] = f"vectors.{generation}.f16"
+        self.vectors_path = os.path.join(self.directory, self.index["vectors_file"])
+        if os.path.exists(self.vectors_path):
+            os.remove(self.vectors_path)
+        self.index["capacity"] = 0
+        self._open_vectors(max(1024, len(live)))
+        self._vectors[:len(live)] = vectors
+
+    def train(self, n_iter=10, sample_per_list=64, seed=0):
+        """
+        Apprentissage des centroïdes (k-means sphérique sur un échantillon) et rangement de toutes les images
+        """
+        self._compact()
+        n = len(self)
+        if n == 0:
+            self.centroids = None
+            self.index["trained_size"] = 0
+            return
+
+        rng = np.random.default_rng(seed)
+        n_lists = max(1, int(round(np.sqrt(n))))
+        sample = np.arange(n)
+        if n > n_lists * sample_per_list:
+            sample = np.sort(rng.choice(n, n_lists * sample_per_list, replace=False))
+        data = np.asarray(self.vectors[sample], dtype=np.float32)
+
+        centroids = data[rng.choice(len(data), n_lists, replace=False)]
+        for _ in range(n_iter):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, data)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Un centroïde sans image garde sa position
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+
+        self.centroids = centroids.astype(np.float32)
+        self.assignments = self._nearest_centroids(np.asarray(self.vectors[:n], dtype=np.float32))
+        self.index["trained_size"] = n
+        self._lists = None
+
+    def _inverted_lists(self):
+        """
+        Lignes de chaque liste, regroupées par un tri des affectations (reconstruit après chaque modification)
+        """
+        if self._lists is None:
+            order = np.argsort(self.assignments, kind="stable")
+            bounds = np.searchsorted(self.assignments[order], np.arange(len(self.centroids) + 1))
+            self._lists = (order, bounds)
+        return self._lists
+
+    def _probe(self, queries, n_probe):
+        """
+        Listes parcourues par chaque requête : les n_probe centroïdes les plus proches
+
+        :return: Matrice (m, n_probe) des numéros de listes.
+        """
+        n_probe = min(n_probe, len(self.centroids))
+        return np.argpartition(-(queries @ self.centroids.T), n_probe - 1, axis=1)[:, :n_probe]
+
+    def _query_groups(self, queries, n_probe):
+        """
+        Requêtes groupées par ensemble de lignes candidates : toutes les lignes vivantes pour une recherche
+        exhaustive, sinon chaque liste inversée avec les requêtes qui la parcourent.
+
+        :return: Itérateur de tuples (indices des requêtes, lignes candidates).
+        """
+        if self.centroids is None or len(self) < self.exact_below:
+            yield np.arange(len(queries)), np.array(sorted(self.rows.values()), dtype=np.int64)
+            return
+
+        order, bounds = self._inverted_lists()
+        probed = self._probe(queries, n_probe)
+        query_ids = np.repeat(np.arange(len(queries)), probed.shape[1])
+        lists = probed.ravel()
+        by_list = np.argsort(lists, kind="stable")
+        list_bounds = np.searchsorted(lists[by_list], np.arange(len(self.centroids) + 1))
+        for l in range(len(self.centroids)):
+            rows = order[bounds[l]:bounds[l + 1]]
+            if len(rows) and list_bounds[l + 1] > list_bounds[l]:
+                yield query_ids[by_list[list_bounds[l]:list_bounds[l + 1]]], rows
+
+    def search(self, queries, k=10, n_probe=None, block_size=1 << 24):
+        """
+        Plus proches voisins (similarité cosinus) de chaque vecteur requête.
+
+        Les requêtes sont traitées ensemble : un produit matriciel par liste inversée (ou par bloc de requêtes
+        pour une recherche exhaustive), chaque ligne candidate n'étant lue qu'une fois.
+
+        :param queries: Matrice (m, dim) ou vecteur (dim,).
+        :param block_size: Nombre maximal de similarités calculées par produit matriciel.
+        :return: Liste (une par requête) de listes [(chemin, similarité)] triées par similarité décroissante.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        n_probe = n_probe or self.n_probe
+        if not len(self) or not len(queries):
+            return [[] for _ in queries]
+
+        # k meilleurs résultats de chaque requête, mis à jour groupe par groupe
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        for query_ids, rows in self._query_groups(queries, n_probe):
+            vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+            step = max(1, block_size // len(rows))
+            for start in range(0, len(query_ids), step):
+                ids = query_ids[start:start + step]
+                scores = np.concatenate([best_scores[ids], queries[ids] @ vectors.T], axis=1)
+                candidates = np.concatenate([best_rows[ids], np.broadcast_to(rows, (len(ids), len(rows)))], axis=1)
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                best_scores[ids] = np.take_along_axis(scores, top, axis=1)
+                best_rows[ids] = np.take_along_axis(candidates, top, axis=1)
+
+        # Tri par similarité décroissante, puis par ligne à similarité égale
+        order = np.lexsort((best_rows, -best_scores), axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        paths = self.index["paths"]
+        return [[(paths[row], float(score)) for row, score in zip(rows, scores) if row >= 0]
+                for rows, scores in zip(best_rows.tolist(), best_scores.tolist())]
+
+    def similar_to(self, path, k=10, n_probe=None):
+        """
+        Images les plus proches d'une image déjà indexée (l'image elle-même est exclue)
+        """
+        vector = self.vector(path)
+        if vector is None:
+            return []
+        path = os.path.abspath(path)
+        return [(other, score) for other, score in self.search(vector, k + 1, n_probe)[0] if other != path][:k]
+
+    def near_duplicates(self, paths=None, threshold=0.95, k=5, n_probe=None):
+        """
+        Paires d'images quasi identiques dans toute la bibliothèque.
+
+        :param paths: Images dont on cherche les doublons (toutes les images indexées si None).
+        :param threshold: Similarité cosinus minimale.
+        :return: Liste de tuples (chemin, chemin du doublon, similarité), chaque paire une seule fois.
+        """
+        paths = self.paths() if paths is None else [os.path.abspath(path) for path in paths if path in self]
+        if not paths:
+            return []
+
+        rows = np.array([self.rows[path] for path in paths])
+        pairs = {}
+        for path, neighbours in zip(paths, self.search(np.asarray(self.vectors[rows], dtype=np.float32), k + 1, n_probe)):
+            for other, score in neighbours:
+                if other != path and score >= threshold:
+                    pairs.setdefault(tuple(sorted((path, other))), score)
+        return [(a, b, score) for (a, b), score in sorted(pairs.items())]
+
+    def save(self):
+        """
+        Écriture atomique de l'index et synchronisation de la matrice sur disque
+        """
+        if self._vectors is not None:
+            self._vectors.flush()
+
+        os.makedirs(self.directory, exist_ok=True)
+        for path, array in ((self.assignments_path, self.assignments), (self.centroids_path, self.centroids)):
+            if array is None:
+                if os.path.exists(path):
+                    os.remove(path)
+                continue
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(path + ".tmp", path)
+
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+
+        # Le nouvel index désigne le fichier compacté : l'ancien fichier n'est plus utilisé
+        if self._replaced_vectors is not None:
+            if os.path.exists(self._replaced_vectors):
+                os.remove(self._replaced_vectors)
+            self._replaced_vectors = None
+
+
+if __name__ == "__main__":
+    # Interrogation de l'index d'un cache : images proches d'une image, ou doublons de toute la bibliothèque
+    from functions import build_parser
+    from inference_backends import get_backend
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cache_dir', type=str, default=build_parser().get_default("cache_dir"))
+    parser.add_argument('--backend', type=str, default="torch")
+    parser.add_argument('--model', type=str, default="ViT-L-14")
+    parser.add_argument('--image', type=str, default=None, help="Image dont on cherche les images proches")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--near_duplicates', type=float, default=None, help="Liste les doublons au-delà de ce seuil")
+    args = parser.parse_args()
+
+    backend = get_backend(args.backend, args.model, os.path.join(args.cache_dir, "onnx"))
+    index = SimilarityIndex(args.cache_dir, backend.embedding_space)
+    print(f"Images indexées : {len(index)}")
+
+    if args.image:
+        vector = index.vector(args.image)
+        if vector is None:
+            # Image hors de la bibliothèque : elle est encodée à la volée
+            from embeddings_manager import EmbeddingsManager
+            vector = EmbeddingsManager(backend=backend).image_embedding(paths=[args.image])[0]
+        for path, score in index.search(vector, args.k + 1)[0]:
+            if path != os.path.abspath(args.image):
+                print(f"{score:.4f}  {path}")
+
+    if args.near_duplicates is not None:
+        for path, other, score in index.near_duplicates(threshold=args.near_duplicates):
+            print(f"{score:.4f}  {path}  {other}")
@@ -0,0 +1,81 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from album_materializer import AlbumMaterializer
+
+
+class TestAlbumMaterializer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, "source")
+        self.destination = os.path.join(self.tmp.name, "albums")
+        os.makedirs(self.source)
+
+        paths = []
+        for i in range(6):
+            path = os.path.join(self.source, f"img_{i}.jpg")
+            with open(path, "wb") as f:
+                f.write(bytes([i]) * (100 + i))
+            paths.append(path)
+
+        self.df = pd.DataFrame({
+            "path": paths,
+            "folder_path": ["2024/Été/Plage", "2024/Été/Plage", "2024/Hiver/Neige", None, "2024/Hiver/Neige", "2023/Automne/Autres"],
+        })
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def album_files(self):
+        return sorted(os.path.relpath(os.path.join(root, name), self.destination)
+                      for root, _, files in os.walk(self.destination) for name in files)
+
+    def test_strategies(self):
+        expected = sorted(os.path.join(folder, os.path.basename(path))
+                          for folder, path in zip(self.df["folder_path"], self.df["path"]) if pd.notna(folder))
+
+        for strategy in ["copy", "hardlink", "reflink", "symlink"]:
+            with self.subTest(strategy=strategy):
+                counts = AlbumMaterializer(strategy, workers=4).materialize(self.df, self.destination)
+                self.assertEqual(counts["transferred"], 5)
+                self.assertEqual(self.album_files(), expected)
+
+                with open(os.path.join(self.destination, "2024/Hiver/Neige/img_4.jpg"), "rb") as f:
+                    self.assertEqual(f.read(), bytes([4]) * 104)
+
+                AlbumMaterializer.prune(self.destination, [])
+                self.assertEqual(os.listdir(self.destination), [])
+
+    def test_skip_up_to_date(self):
+        materializer = AlbumMaterializer("copy")
+        materializer.materialize(self.df, self.destination)
+
+        counts = materializer.materialize(self.df, self.destination)
+        self.assertEqual(counts["transferred"], 0)
+        self.assertEqual(counts["skipped"], 5)
+
+        # Une source modifiée est retransférée
+        with open(self.df["path"][0], "wb") as f:
+            f.write(b"modified")
+        os.utime(self.df["path"][0], (0, 0))
+        counts = materializer.materialize(self.df, self.destination)
+        self.assertEqual(counts["transferred"], 1)
+
+    def test_prune(self):
+        materializer = AlbumMaterializer("copy")
+        materializer.materialize(self.df, self.destination)
+
+        kept = self.df.iloc[:2]
+        AlbumMaterializer.prune(self.destination, [os.path.join(self.destination, folder, os.path.basename(path))
+                                                   for folder, path in zip(kept["folder_path"], kept["path"])])
+        self.assertEqual(self.album_files(), [os.path.join("2024/Été/Plage", "img_0.jpg"), os.path.join("2024/Été/Plage", "img_1.jpg")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import io
+import os
+import sys
+import unittest
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batch_controller import BatchController
+
+
+def run_batches(controller, latency, n_batches=40):
+    for _ in range(n_batches):
+        size = controller.size
+        controller.record(size, latency(size))
+    return controller
+
+
+class TestBatchController(unittest.TestCase):
+
+    def test_grows_until_throughput_plateaus(self):
+        # Coût fixe de 0,1 s par lot et 10 ms par image jusqu'à 32 images, puis saturation
+        latency = lambda n: 0.1 + 0.01 * n if n <= 32 else (0.1 + 0.01 * 32) * n / 32
+        controller = run_batches(BatchController(initial=4, rss=lambda: 500.0, available=lambda: None), latency)
+        self.assertTrue(controller.settled)
+        self.assertEqual(controller.size, 32)
+        self.assertEqual(controller.report()["batch_size"], 32)
+
+    def test_fixed_size(self):
+        controller = run_batches(BatchController(fixed=12, rss=lambda: 500.0, available=lambda: None), lambda n: 0.01 * n)
+        self.assertEqual(controller.size, 12)
+        self.assertFalse(controller.report()["batch_adaptive"])
+
+    def test_memory_ceiling(self):
+        # 20 Mo par image de lot au-dessus de 1000 Mo : le plafond de 1500 Mo limite les lots à 16 images
+        memory = {"rss": 1000.0}
+        controller = BatchController(initial=4, memory_limit_mb=1500, rss=lambda: memory["rss"], available=lambda: None)
+        for _ in range(40):
+            size = controller.size
+            memory["rss"] = 1000.0 + 20 * size
+            controller.record(size, 0.5 + 0.001 * size)
+        self.assertLessEqual(1000.0 + 20 * controller.size, 1500)
+        self.assertEqual(controller.size, 16)
+
+    def test_backs_off_under_memory_pressure(self):
+        available = {"mb": 4000.0}
+        controller = BatchController(initial=32, rss=lambda: 800.0, available=lambda: available["mb"])
+        controller.record(32, 1.0)
+        available["mb"] = 300.0
+        controller.record(32, 1.0)
+        self.assertEqual(controller.size, 16)
+        self.assertEqual(controller.backoffs, 1)
+        # La taille ne remonte plus ensuite
+        available["mb"] = 4000.0
+        run_batches(controller, lambda n: 0.01 * n)
+        self.assertEqual(controller.size, 16)
+
+    def test_unmeasurable_memory_ceiling_is_reported(self):
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            controller = BatchController(initial=4, memory_limit_mb=1500, rss=lambda: None, available=lambda: None)
+        self.assertIn("Plafond de mémoire de 1500 Mo ignoré", stdout.getvalue())
+        self.assertFalse(controller.report()["memory_limit_enforced"])
+        self.assertTrue(BatchController(memory_limit_mb=1500, rss=lambda: 500.0).report()["memory_limit_enforced"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from category_embeddings import CategoryEmbeddingProvider
+from inference_backends import StubBackend
+
+
+class TestCategoryEmbeddingProvider(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.prompts = ["a photo of a beach", ["a photo of snow", "a winter landscape"]]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def encode(self, backend, calls):
+        def encode_text(texts):
+            calls.append(texts)
+            return backend.encode_texts(texts)
+        return encode_text
+
+    def test_cache_keyed_on_embedding_space(self):
+        stub, other = StubBackend("openai/clip-vit-large-patch14"), StubBackend("openai/clip-vit-large-patch14", dim=768)
+        other.name = "other"
+        calls = []
+        embeddings = CategoryEmbeddingProvider(stub.embedding_space, self.tmp.name).get_embeddings(
+            self.prompts, self.encode(stub, calls))
+        self.assertEqual(embeddings.shape, (2, 512))
+
+        # Même modèle, autre backend : les vecteurs du stub ne sont pas réutilisés
+        embeddings = CategoryEmbeddingProvider(other.embedding_space, self.tmp.name).get_embeddings(
+            self.prompts, self.encode(other, calls), dim=768)
+        self.assertEqual(embeddings.shape, (2, 768))
+        self.assertEqual(len(calls), 2)
+
+        # Configuration déjà rencontrée : l'encodeur de texte n'est pas appelé
+        CategoryEmbeddingProvider(stub.embedding_space, self.tmp.name).get_embeddings(
+            self.prompts, self.encode(stub, calls), dim=512)
+        self.assertEqual(len(calls), 2)
+
+    def test_cache_of_another_dimension_is_reencoded(self):
+        small, large = StubBackend(dim=512), StubBackend(dim=768)
+        calls = []
+        CategoryEmbeddingProvider(small.embedding_space, self.tmp.name).get_embeddings(self.prompts, self.encode(small, calls))
+        embeddings = CategoryEmbeddingProvider(small.embedding_space, self.tmp.name).get_embeddings(
+            self.prompts, self.encode(large, calls), dim=768)
+        self.assertEqual(embeddings.shape, (2, 768))
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import time
+import select
+import shutil
+import signal
+import tempfile
+import subprocess
+import unittest
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from checkpoint import CheckpointError, RunCheckpoint, default_run_dir
+from manifest import find_manifest, read_manifest
+from synthetic_library import generate_library
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class TestRunCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.run_dir = os.path.join(self.tmp.name, "run")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_refuses_a_folder_that_is_not_a_run_dir(self):
+        os.makedirs(self.run_dir)
+        document = os.path.join(self.run_dir, "notes.txt")
+        with open(document, "w") as f:
+            f.write("à garder")
+
+        with self.assertRaises(CheckpointError):
+            RunCheckpoint(self.run_dir, "empreinte")
+        self.assertTrue(os.path.exists(document))
+
+    def test_only_removes_its_own_files(self):
+        checkpoint = RunCheckpoint(self.run_dir, "empreinte")
+        checkpoint.save_json("clustering", {"2024:06:01": {}})
+        # Fichier ajouté après coup dans le dossier des points de reprise
+        document = os.path.join(self.run_dir, "notes.txt")
+        with open(document, "w") as f:
+            f.write("à garder")
+
+        # Nouveau tri : les anciens points de reprise sont effacés, pas le reste
+        checkpoint = RunCheckpoint(self.run_dir, "autre empreinte", resume=True)
+        self.assertFalse(checkpoint.done("clustering"))
+        self.assertFalse(os.path.exists(os.path.join(self.run_dir, "clustering.json")))
+        checkpoint.finish()
+        self.assertEqual(os.listdir(self.run_dir), ["notes.txt"])
+
+
+@unittest.skipUnless(hasattr(fcntl, "F_SETPIPE_SZ") and hasattr(os, "mkfifo"), "Tube nommé de taille réglable requis")
+class TestResume(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.library = os.path.join(self.tmp.name, "library")
+        generate_library(self.library, 80, seed=5, processes=1, images_per_day=20)
+        self.destination = os.path.join(self.tmp.name, "albums")
+        self.report = os.path.join(self.tmp.name, "report.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def command(self, *options):
+        # main.py avec le backend de test, absent des options de la ligne de commande
+        main = os.path.join(ROOT, "main.py")
+        code = (f"import sys, runpy; sys.path.insert(0, {ROOT!r}); sys.argv[0] = {main!r}\n"
+                "import categories_manager, inference_backends\n"
+                "categories_manager.get_backend = lambda *args: inference_backends.StubBackend()\n"
+                f"runpy.run_path({main!r}, run_name='__main__')")
+        return [sys.executable, "-c", code, "--directory", self.library,
+                "--destination_directory", self.destination, "--workers", "1",
+                "--no_cache", "--batch_size", "2", "--progress_interval", "0", *options]
+
+    def sort_until_first_checkpoint(self):
+        """
+        Lance un tri dont les événements passent par un tube de 4 Ko : le tri se bloque peu après le premier
+        groupe de jours analysé, il est alors tué.
+        """
+        fifo = os.path.join(self.tmp.name, "events")
+        os.mkfifo(fifo)
+        reader = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+        # Écrivain factice : le tube ne renvoie pas de fin de fichier avant que le tri ne l'ouvre
+        keepalive = os.open(fifo, os.O_WRONLY)
+        fcntl.fcntl(reader, fcntl.F_SETPIPE_SZ, 4096)
+        process = subprocess.Popen(self.command("--progress_events", fifo), stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL)
+        try:
+            buffer = b""
+            deadline = time.time() + 120
+            while time.time() < deadline:
+                if not select.select([reader], [], [], 1.0)[0]:
+                    self.assertIsNone(process.poll(), "Le tri s'est arrêté avant le premier point de reprise")
+                    continue
+                buffer += os.read(reader, 4096)
+                *lines, buffer = buffer.split(b"\n")
+                events = [json.loads(line) for line in lines if line]
+                if any(event["event"] == "checkpoint" and event["stage"] == "analysis" for event in events):
+                    break
+            else:
+                self.fail("Aucun point de reprise de l'analyse")
+            process.send_signal(signal.SIGKILL)
+            process.wait()
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            os.close(reader)
+            os.close(keepalive)
+
+    def test_resume_after_kill(self):
+        self.sort_until_first_checkpoint()
+        # Tri interrompu pendant l'analyse : points de reprise présents, aucun manifeste
+        self.assertTrue(os.path.exists(os.path.join(default_run_dir(self.library), "run.json")))
+        self.assertIsNone(find_manifest(self.library))
+
+        subprocess.run(self.command("--resume", "--progress_report", self.report), check=True,
+                       stdout=subprocess.DEVNULL)
+        with open(self.report, encoding="utf-8") as f:
+            report = json.load(f)
+        analysis = next(stage for stage in report["stages"] if stage["stage"] == "analysis")
+        self.assertTrue(report["resumed"])
+        self.assertGreater(analysis["resumed_images"], 0)
+        self.assertLess(analysis["resumed_images"], 80)
+        self.assertFalse(os.path.exists(default_run_dir(self.library)))
+        resumed = read_manifest(find_manifest(self.library))
+        resumed_albums = sorted(os.path.relpath(os.path.join(folder, name), self.destination)
+                                for folder, _, names in os.walk(self.destination) for name in names)
+
+        # Tri de référence, sans interruption
+        os.remove(find_manifest(self.library))
+        shutil.rmtree(self.destination)
+        subprocess.run(self.command(), check=True, stdout=subprocess.DEVNULL)
+        reference = read_manifest(find_manifest(self.library))
+        reference_albums = sorted(os.path.relpath(os.path.join(folder, name), self.destination)
+                                  for folder, _, names in os.walk(self.destination) for name in names)
+
+        self.assertEqual(len(resumed_albums), 80)
+        self.assertEqual(resumed_albums, reference_albums)
+        pd.testing.assert_frame_equal(resumed.sort_values("path", ignore_index=True),
+                                      reference.sort_values("path", ignore_index=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
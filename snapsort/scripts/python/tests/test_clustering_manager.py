@@ -0,0 +1,132 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+import pandas as pd
+
+from clustering_manager import (ClusteringManager, BURST, CHECK, EVENT, banded_similarity, event_clusters,
+                                linked_days, neighbor_window_clusters, segment_gaps)
+from scheduler import Scheduler
+from bench_clustering import legacy_cluster_day
+
+
+def random_day(rng, n_images, dim=32, scenes=8):
+    """
+    Embeddings normalisés d'un jour : des scènes successives bruitées
+    """
+    centers = rng.normal(size=(scenes, dim))
+    scene_of_image = np.sort(rng.integers(0, scenes, size=n_images))
+    embeddings = centers[scene_of_image] + rng.normal(scale=0.8, size=(n_images, dim))
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings.astype(np.float32)
+
+
+class TestNeighborWindowClusters(unittest.TestCase):
+
+    def test_banded_similarity(self):
+        embeddings = random_day(np.random.default_rng(0), 10)
+        band = banded_similarity(embeddings, 3)
+        self.assertEqual(band.shape, (10, 3))
+        for i in range(10):
+            for d in range(1, 4):
+                if i + d < 10:
+                    self.assertAlmostEqual(band[i, d - 1], float(np.dot(embeddings[i], embeddings[i + d])), places=5)
+                else:
+                    self.assertEqual(band[i, d - 1], -np.inf)
+
+    def test_same_clusters_as_legacy(self):
+        rng = np.random.default_rng(42)
+        for n_images in [1, 2, 3, 5, 17, 100, 500]:
+            for threshold in [0.2, 0.4, 0.6]:
+                for n_neighbors in [1, 3, 5]:
+                    embeddings = random_day(rng, n_images)
+                    paths = [f"img_{i}.jpg" for i in range(n_images)]
+
+                    labels, clusters = neighbor_window_clusters(embeddings, threshold, n_neighbors)
+                    expected, _ = legacy_cluster_day(paths, embeddings, threshold, n_neighbors)
+
+                    self.assertEqual([[paths[i] for i in cluster] for cluster in clusters], expected)
+                    self.assertTrue((labels >= 0).all())
+
+    def test_empty_day(self):
+        labels, clusters = neighbor_window_clusters(np.zeros((0, 8), dtype=np.float32))
+        self.assertEqual(len(labels), 0)
+        self.assertEqual(clusters, [])
+
+
+class TestEventSegmentation(unittest.TestCase):
+
+    def test_gap_kinds_follow_the_pace_of_each_day(self):
+        # Jour 1 : une scène toutes les 2 minutes ; jour 2 : une toutes les 30 minutes
+        seconds = np.cumsum([0, 5, 120, 120, 120, 900, 1800, 1800, 1800])
+        days = np.array(["2024:06:01"] * 6 + ["2024:06:02"] * 3)
+        kinds = segment_gaps(seconds, days)
+        # Jour 1 : seuil minimal (5 minutes), 15 minutes sans photo font un nouvel événement ;
+        # jour 2 : seuil de 2 heures, les écarts de 30 minutes sont vérifiés par similarité
+        self.assertEqual(kinds.tolist(), [BURST, CHECK, CHECK, CHECK, EVENT, EVENT, CHECK, CHECK])
+        self.assertEqual(segment_gaps(np.zeros(1), days[:1]).tolist(), [])
+
+    def test_linked_days(self):
+        date_times = pd.Series(["2024:03:09 23:59:52", "2024:03:10 00:00:05", "2024:03:10 08:00:00",
+                                "2024:03:11 14:00:00", None, "2024:03:09 20:00:00"])
+        # Seule la rafale de minuit relie deux jours ; l'ordre des lignes et les images sans date sont sans effet
+        self.assertEqual(linked_days(date_times), {("2024:03:09", "2024:03:10")})
+        self.assertEqual(linked_days(date_times[:1]), set())
+
+    def test_similarity_only_at_uncertain_boundaries(self):
+        rng = np.random.default_rng(3)
+        embeddings = rng.normal(size=(6, 16)).astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings[4] = embeddings[3]
+
+        # Rafale (0, 1, 2) regroupée sans comparaison malgré des embeddings différents
+        kinds = np.array([BURST, BURST, CHECK, CHECK, EVENT], dtype=np.int8)
+        labels, clusters, checks = event_clusters(embeddings, kinds, threshold=0.6)
+        self.assertEqual(clusters, [[0, 1, 2], [3, 4], [5]])
+        self.assertEqual(labels.tolist(), [0, 0, 0, 1, 1, 2])
+        self.assertEqual(checks, 2)
+
+    def test_event_across_midnight(self):
+        rng = np.random.default_rng(5)
+        party = rng.normal(size=16)
+        date_times = ["2024:12:31 23:50:00", "2024:12:31 23:56:00", "2024:12:31 23:59:58",
+                      "2025:01:01 00:00:01", "2025:01:01 00:03:00", "2025:01:01 10:00:00"]
+        embeddings = np.vstack([party + rng.normal(scale=0.1, size=16) for _ in range(5)] + [-party])
+        embeddings = (embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)).astype(np.float32)
+        # Ordre des lignes différent de l'ordre chronologique
+        df = pd.DataFrame({"path": [f"img_{i}.jpg" for i in range(6)], "date_time": date_times}).iloc[::-1]
+
+        manager = ClusteringManager(df.reset_index(drop=True), embeddings=embeddings[::-1].copy())
+        _, clusters = manager.perform_neighbors_clustering()
+        self.assertEqual(clusters, {"2024:12:31": {"cluster_0": [f"img_{i}.jpg" for i in range(5)]},
+                                    "2025:01:01": {"cluster_1": ["img_5.jpg"]}})
+
+
+class TestClusteringManager(unittest.TestCase):
+
+    def test_same_cluster_ids_for_any_worker_count(self):
+        rng = np.random.default_rng(7)
+        days = [f"2024:06:{day:02d}" for day in range(1, 9)]
+        day_sizes = rng.integers(1, 60, size=len(days))
+        date_times = [f"{day} 12:00:{i % 60:02d}" for day, size in zip(days, day_sizes) for i in range(size)]
+        df = pd.DataFrame({"path": [f"img_{i}.jpg" for i in range(len(date_times))], "date_time": date_times})
+        embeddings = np.vstack([random_day(rng, size) for size in day_sizes])
+
+        results = []
+        for workers in [1, 3]:
+            with Scheduler(workers) as scheduler:
+                manager = ClusteringManager(df.copy(), embeddings=embeddings, first_cluster_id=5, scheduler=scheduler)
+                clustered_df, clusters = manager.perform_neighbors_clustering()
+            results.append((clustered_df["cluster"].tolist(), clusters))
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0][0][0], "cluster_5")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from daemon import SortDaemon
+from inference_backends import StubBackend
+from synthetic_library import generate_library
+
+
+class StubDaemon(SortDaemon):
+    """
+    Démon dont les tris utilisent le backend de test, absent des options de la ligne de commande
+    """
+    def job_args(self, options):
+        args = super().job_args(options)
+        args.backend = StubBackend()
+        return args
+
+
+class TestSortDaemon(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.library = os.path.join(cls.tmp.name, "library")
+        generate_library(cls.library, 24, seed=2, processes=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def options(self, destination):
+        return {"directory": self.library, "destination_directory": os.path.join(self.tmp.name, destination),
+                "workers": 1, "no_cache": True, "progress_interval": 0}
+
+    def test_queue_and_cancel(self):
+        daemon = StubDaemon()
+        messages = []
+        finished = threading.Event()
+
+        def send(message):
+            messages.append(message)
+            # Le premier tri est annulé pendant son exécution, dès son premier avancement
+            if message["type"] == "progress" and message["job_id"] == 1 and message["event"] == "progress":
+                daemon.handle({"type": "cancel", "job_id": 1}, send)
+            if message["type"] in ("done", "error") and message["job_id"] == 3:
+                finished.set()
+
+        daemon.handle({"type": "sort", "options": self.options("albums_1")}, send)
+        daemon.handle({"type": "sort", "options": self.options("albums_2")}, send)
+        daemon.handle({"type": "sort", "options": self.options("albums_3")}, send)
+        # Le deuxième tri est annulé avant d'avoir commencé
+        daemon.handle({"type": "cancel", "job_id": 2}, send)
+
+        self.assertTrue(finished.wait(120))
+        daemon.handle({"type": "shutdown"}, send)
+
+        final = {message["job_id"]: message["type"] for message in messages
+                 if message["type"] in ("done", "cancelled", "error")}
+        self.assertEqual(final, {1: "cancelled", 2: "cancelled", 3: "done"})
+        self.assertNotIn({"type": "started", "job_id": 2}, messages)
+
+        summary = next(message["summary"] for message in messages if message["type"] == "done")
+        self.assertEqual(summary["images"], 24)
+        self.assertEqual([stage["stage"] for stage in summary["stages"]],
+                         ["exif", "analysis", "clustering", "categories", "arborescence", "albums"])
+        albums = [name for _, _, files in os.walk(os.path.join(self.tmp.name, "albums_3")) for name in files]
+        self.assertEqual(len(albums), 24)
+
+    def test_unknown_option(self):
+        daemon = StubDaemon()
+        messages = []
+        daemon.handle({"type": "sort", "options": {"not_an_option": 1}}, messages.append)
+        daemon.handle({"type": "shutdown"}, messages.append)
+        self.assertEqual(messages[0]["type"], "error")
+
+    def test_options_checked_by_the_parser(self):
+        daemon = StubDaemon()
+        args = daemon.job_args({"directory": self.library, "workers": 2, "memory_limit_mb": 512, "incremental": True,
+                                "run_dir": None})
+        self.assertEqual((args.workers, args.memory_limit_mb, args.incremental, args.run_dir), (2, 512.0, True, None))
+
+        for options in [{"workers": "deux"}, {"workers": 1.5}, {"incremental": "yes"}, {"model": "ViT-H-14"},
+                        {"manifest_format": ["csv"]}]:
+            with self.subTest(options=options), self.assertRaises(ValueError):
+                daemon.job_args(options)
+        daemon.handle({"type": "shutdown"}, lambda message: None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import io
+import os
+import sys
+import json
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embeddings_cache import EmbeddingsCache
+
+
+def random_embeddings(n, dim=8, seed=0):
+    embeddings = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+class TestEmbeddingsCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp.name, "cache")
+        self.paths = []
+        for i in range(6):
+            path = os.path.join(self.tmp.name, f"img_{i}.jpg")
+            with open(path, "wb") as f:
+                f.write(f"image {i}".encode())
+            self.paths.append(path)
+        self.embeddings = random_embeddings(len(self.paths))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def cache(self, model_name="test-space", **kwargs):
+        with redirect_stdout(io.StringIO()):
+            return EmbeddingsCache(self.cache_dir, model_name, **kwargs)
+
+    def assert_cached(self, cache, paths, rows):
+        found, missing = cache.get(paths)
+        self.assertEqual(missing, [])
+        for path, row in zip(paths, rows):
+            np.testing.assert_allclose(found[path], self.embeddings[row], atol=1e-3)
+
+    def test_hits_after_reload(self):
+        cache = self.cache()
+        cache.put(self.paths[:4], self.embeddings[:4])
+        cache.save()
+
+        cache = self.cache()
+        self.assert_cached(cache, self.paths[:4], range(4))
+        found, missing = cache.get(self.paths[4:])
+        self.assertEqual((found, missing), ({}, self.paths[4:]))
+        self.assertEqual((cache.hits, cache.misses), (4, 2))
+
+        # Même contenu sous un autre nom : retrouvé par le hash du contenu
+        copy = os.path.join(self.tmp.name, "copie.jpg")
+        with open(self.paths[0], "rb") as source, open(copy, "wb") as f:
+            f.write(source.read())
+        self.assertIn(copy, cache.get([copy])[0])
+
+    def test_least_recently_used_evicted(self):
+        cache = self.cache(max_entries=3)
+        cache.put(self.paths[:3], self.embeddings[:3])
+        cache.get(self.paths[:1])
+        cache.put(self.paths[3:4], self.embeddings[3:4])
+
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.get(self.paths[1:2])[1], self.paths[1:2])
+        self.assert_cached(cache, [self.paths[0], self.paths[2], self.paths[3]], [0, 2, 3])
+
+    def test_evicted_rows_reused_only_after_save(self):
+        cache = self.cache(max_entries=3)
+        cache.put(self.paths[:3], self.embeddings[:3])
+        cache.save()
+        rows = {entry["row"] for entry in cache.index["entries"].values()}
+
+        # Éviction sans sauvegarde : la nouvelle image ne prend pas la ligne encore référencée sur disque
+        cache.put(self.paths[3:4], self.embeddings[3:4])
+        self.assertNotIn(cache.index["entries"][cache.content_hash(self.paths[3])]["row"], rows)
+        cache._matrix.flush()
+
+        # Interruption avant la sauvegarde : l'index sur disque reste cohérent avec la matrice
+        reloaded = self.cache(max_entries=3)
+        self.assert_cached(reloaded, self.paths[:3], range(3))
+
+        # Après la sauvegarde, la ligne libérée est réutilisée
+        cache.save()
+        cache.put(self.paths[4:5], self.embeddings[4:5])
+        self.assertIn(cache.index["entries"][cache.content_hash(self.paths[4])]["row"], rows)
+        cache.save()
+        self.assert_cached(self.cache(max_entries=3), self.paths[3:5], [3, 4])
+
+    def test_dimension_change_resets_the_cache(self):
+        cache = self.cache()
+        cache.put(self.paths[:2], self.embeddings[:2])
+        larger = random_embeddings(2, dim=12, seed=1)
+        with redirect_stdout(io.StringIO()):
+            cache.put(self.paths[2:4], larger)
+        cache.save()
+
+        cache = self.cache()
+        self.assertEqual(cache.index["dim"], 12)
+        self.assertEqual(cache.get(self.paths[:2])[1], self.paths[:2])
+        found, _ = cache.get(self.paths[2:4])
+        np.testing.assert_allclose(found[self.paths[2]], larger[0], atol=1e-3)
+
+    def test_invalidation(self):
+        cache = self.cache()
+        cache.put(self.paths[:2], self.embeddings[:2])
+        cache.save()
+
+        # Autre modèle : autre dossier, aucun vecteur partagé
+        self.assertEqual(self.cache("autre-modele").get(self.paths[:2])[1], self.paths[:2])
+
+        # Contenu modifié : l'ancien vecteur ne correspond plus
+        with open(self.paths[0], "ab") as f:
+            f.write(b" retouche")
+        self.assertEqual(self.cache().get(self.paths[:1])[1], self.paths[:1])
+
+        # Version de format différente : le cache est vidé
+        with open(cache.index_path, encoding="utf-8") as f:
+            index = json.load(f)
+        index["format_version"] = EmbeddingsCache.FORMAT_VERSION + 1
+        with open(cache.index_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        cache = self.cache()
+        self.assertEqual(len(cache), 0)
+        self.assertFalse(os.path.exists(cache.index_path))
+
+    def test_missing_matrix_is_not_read_as_zeros(self):
+        cache = self.cache()
+        cache.put(self.paths[:2], self.embeddings[:2])
+        cache.save()
+        os.remove(cache.matrix_path)
+
+        cache = self.cache()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.get(self.paths[:2]), ({}, self.paths[:2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
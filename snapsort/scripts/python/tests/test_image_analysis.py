@@ -0,0 +1,70 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+from PIL import Image, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_analysis import ImageAnalyzer
+from images_manager import ImageCleaner
+
+
+def baseline_quality_and_phash(path, target_size=(600, 600)):
+    """
+    Qualité et pHash de l'implémentation historique (ImageCleaner) : cv2.imread pleine résolution puis cv2.resize
+    """
+    cleaner = ImageCleaner(target_size=target_size)
+    img = cleaner.read_and_resize(path)
+    return cv2.Laplacian(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), cv2.CV_64F).var(), cleaner.calculate_phash(img)
+
+
+class TestImageAnalyzer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Photos de taille réelle (12 Mpx) : nette, légèrement floue, floue
+        cls.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        scene = Image.fromarray(rng.integers(0, 256, size=(300, 400, 3), dtype=np.uint8)).resize((4000, 3000), Image.BICUBIC)
+        texture = Image.fromarray(rng.integers(0, 256, size=(3000, 4000, 3), dtype=np.uint8))
+        photo = Image.blend(scene, texture, 0.2)
+        cls.paths = []
+        for name, radius in [("sharp", 0), ("soft", 2), ("blurry", 8)]:
+            path = os.path.join(cls.tmp.name, f"{name}.jpg")
+            (photo.filter(ImageFilter.GaussianBlur(radius)) if radius else photo).save(path, quality=90)
+            cls.paths.append(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_same_scores_as_baseline(self):
+        analyzer = ImageAnalyzer()
+        qualities = []
+        for path in self.paths:
+            record = analyzer.analyze(path)
+            quality, phash = baseline_quality_and_phash(path)
+            self.assertAlmostEqual(record.quality, quality, places=6)
+            self.assertEqual(record.phash, phash)
+            self.assertEqual(min(record.clip_image.size), analyzer.clip_size)
+            qualities.append(record.quality)
+
+        # Le seuil de netteté par défaut (100) sépare toujours les images nettes des floues
+        self.assertGreater(qualities[0], qualities[1])
+        self.assertGreater(qualities[1], 100.0)
+        self.assertLess(qualities[2], 100.0)
+
+    def test_unreadable_image(self):
+        path = os.path.join(self.tmp.name, "broken.jpg")
+        with open(path, "wb") as f:
+            f.write(b"pas une image")
+        record = ImageAnalyzer().analyze(path)
+        self.assertIsNone(record.quality)
+        self.assertIsNone(record.clip_image)
+
+
+if __name__ == '__main__':
+    unittest.main()
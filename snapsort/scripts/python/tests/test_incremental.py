@@ -0,0 +1,162 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+import dataframe_completion
+from functions import build_parser
+from image_analysis import ImageAnalyzer
+from inference_backends import StubBackend
+from manifest import find_manifest, read_manifest, write_manifest
+from runner import run
+from similarity_index import SimilarityIndex
+from synthetic_library import generate_library
+
+
+class TestIncremental(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.library = os.path.join(self.tmp.name, "library")
+        self.paths = generate_library(self.library, 60, seed=11, processes=1, images_per_day=20)
+        self.destination = os.path.join(self.tmp.name, "albums")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def sort(self, *options, cache=False):
+        cache_options = ["--cache_dir", os.path.join(self.tmp.name, "cache")] if cache else ["--no_cache"]
+        args = build_parser().parse_args(["--directory", self.library, "--destination_directory", self.destination,
+                                          "--workers", "1", "--progress_interval", "0", *cache_options, *options])
+        args.backend = StubBackend()
+        run(args)
+
+    def album_files(self):
+        return [os.path.join(folder, name) for folder, _, names in os.walk(self.destination) for name in names]
+
+    def test_kept_images_moved_to_their_new_folder(self):
+        self.sort()
+
+        # Manifeste d'une version précédente : les albums des images conservées étaient rangés ailleurs
+        manifest = find_manifest(self.library)
+        df = read_manifest(manifest)
+        for source, folder in zip(df["path"], df["folder_path"]):
+            old_folder = os.path.join(self.destination, "ancien", folder)
+            os.makedirs(old_folder, exist_ok=True)
+            shutil.move(os.path.join(self.destination, folder, os.path.basename(source)), old_folder)
+        df["folder_path"] = "ancien/" + df["folder_path"]
+        write_manifest(df, manifest)
+
+        # Une seule photo modifiée : seul son jour est retraité
+        os.utime(self.paths[0], ns=(os.stat(self.paths[0]).st_atime_ns, os.stat(self.paths[0]).st_mtime_ns + 10 ** 9))
+        self.sort("--incremental")
+
+        df = read_manifest(find_manifest(self.library))
+        self.assertEqual(len(df), 60)
+        self.assertEqual(len(self.album_files()), len(df))
+        self.assertFalse(os.path.exists(os.path.join(self.destination, "ancien")))
+
+    def test_only_new_files_are_read_and_decoded(self):
+        self.sort(cache=True)
+        os.utime(self.paths[0], ns=(os.stat(self.paths[0]).st_atime_ns, os.stat(self.paths[0]).st_mtime_ns + 10 ** 9))
+
+        decoded, scanned = [], []
+        analyze, scan_exif = ImageAnalyzer.analyze, dataframe_completion.scan_exif
+
+        def counting_analyze(analyzer, path, *args, **kwargs):
+            decoded.append(path)
+            return analyze(analyzer, path, *args, **kwargs)
+
+        def counting_scan(paths, *args, **kwargs):
+            scanned.extend(paths)
+            return scan_exif(paths, *args, **kwargs)
+
+        with mock.patch.object(ImageAnalyzer, "analyze", counting_analyze), \
+                mock.patch.object(dataframe_completion, "scan_exif", counting_scan):
+            self.sort("--incremental", cache=True)
+
+        # Les autres images du jour retraité sont reprises du manifeste et du cache d'embeddings
+        self.assertEqual(decoded, [self.paths[0]])
+        self.assertEqual(scanned, [self.paths[0]])
+        self.assertEqual(len(read_manifest(find_manifest(self.library))), 60)
+        self.assertEqual(len(self.album_files()), 60)
+
+
+    def test_near_duplicates_of_kept_days_carried_over(self):
+        # Copie d'une photo du premier jour datée du dernier jour : doublon entre deux jours
+        last_date = Image.open(self.paths[-1]).getexif()[0x0132]
+        copy = os.path.join(self.library, "IMG_copy.jpg")
+        with Image.open(self.paths[0]) as image:
+            exif = image.getexif()
+            exif[0x0132] = last_date
+            image.save(copy, exif=exif, quality=95)
+        self.sort(cache=True)
+        first = read_manifest(find_manifest(self.library)).set_index("path")
+        self.assertEqual(first.loc[copy, "near_duplicate_of"], os.path.abspath(self.paths[0]))
+
+        # Photo modifiée un autre jour : seules les images de ce jour sont recherchées dans l'index
+        changed_day = first.loc[self.paths[15], "date_time"].date()
+        os.utime(self.paths[15], ns=(os.stat(self.paths[15]).st_atime_ns, os.stat(self.paths[15]).st_mtime_ns + 10 ** 9))
+        queried = []
+        near_duplicates = SimilarityIndex.near_duplicates
+
+        def counting_near_duplicates(index, paths=None, *args, **kwargs):
+            queried.extend(paths)
+            return near_duplicates(index, paths, *args, **kwargs)
+
+        with mock.patch.object(SimilarityIndex, "near_duplicates", counting_near_duplicates):
+            self.sort("--incremental", cache=True)
+
+        second = read_manifest(find_manifest(self.library)).set_index("path")
+        # Images du jour retraité, et images conservées dont le doublon était de ce jour
+        same_day = {os.path.abspath(path) for path in second.index[second["date_time"].dt.date == changed_day]}
+        partners = {os.path.abspath(path) for path in first.index[first["near_duplicate_of"].isin(same_day)]}
+        self.assertEqual(sorted(queried), sorted(same_day | partners))
+        self.assertLess(len(queried), 30)
+        for path in (copy, self.paths[0]):
+            self.assertEqual(second.loc[path, "near_duplicate_of"], first.loc[path, "near_duplicate_of"])
+            self.assertAlmostEqual(second.loc[path, "near_duplicate_score"], first.loc[path, "near_duplicate_score"])
+
+        # Mêmes doublons qu'un tri complet
+        self.sort(cache=True)
+        full = read_manifest(find_manifest(self.library)).set_index("path")
+        self.assertEqual(second["near_duplicate_of"].reindex(full.index).fillna("").tolist(),
+                         full["near_duplicate_of"].fillna("").tolist())
+
+
+    def test_event_across_midnight_stays_whole(self):
+        # Rafale de 23:59:52 à 00:00:05, puis une nouvelle photo de la même rafale à 00:00:08
+        def redate(source, target, date):
+            with Image.open(source) as image:
+                exif = image.getexif()
+                exif[0x0132] = date
+                image.save(target, exif=exif, quality=95)
+
+        burst = self.paths[:5]
+        for path, date in zip(burst, ["2024:03:09 23:59:52", "2024:03:09 23:59:55", "2024:03:09 23:59:58",
+                                      "2024:03:10 00:00:01", "2024:03:10 00:00:05"]):
+            redate(path, path, date)
+        self.sort()
+        first = read_manifest(find_manifest(self.library)).set_index("path")
+        self.assertEqual(first.loc[burst, "cluster"].nunique(), 1)
+
+        new_photo = os.path.join(self.library, "IMG_new.jpg")
+        redate(burst[-1], new_photo, "2024:03:10 00:00:08")
+        self.sort("--incremental")
+
+        # Les deux jours de l'événement sont retraités : la rafale reste un seul cluster
+        df = read_manifest(find_manifest(self.library)).set_index("path")
+        self.assertEqual(len(df), 61)
+        self.assertEqual(df.loc[burst + [new_photo], "cluster"].nunique(), 1)
+        self.assertEqual(len(self.album_files()), 61)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+import unittest
+import importlib.util
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from inference_backends import OnnxBackend, TorchBackend, get_backend
+
+
+def tiny_clip():
+    """
+    Petit CLIP aléatoire : suffisant pour comparer les backends sans télécharger de checkpoint
+    """
+    import torch
+    from transformers import CLIPConfig, CLIPImageProcessor, CLIPModel
+
+    torch.manual_seed(0)
+    config = CLIPConfig(
+        text_config=dict(hidden_size=32, intermediate_size=64, num_hidden_layers=2, num_attention_heads=2, vocab_size=1000),
+        vision_config=dict(hidden_size=64, intermediate_size=128, num_hidden_layers=2, num_attention_heads=2,
+                           image_size=224, patch_size=32),
+        projection_dim=16)
+    return CLIPModel(config).eval(), CLIPImageProcessor()
+
+
+class TestInferenceBackends(unittest.TestCase):
+
+    def test_embedding_spaces_never_mix(self):
+        spaces = {get_backend(name, model, tempfile.gettempdir()).embedding_space
+                  for name in ["torch", "onnx", "onnx-int8"] for model in ["ViT-B-32", "ViT-L-14"]}
+        self.assertEqual(len(spaces), 6)
+
+    @unittest.skipUnless(importlib.util.find_spec("onnxruntime") and importlib.util.find_spec("onnx"),
+                         "onnxruntime non installé")
+    def test_onnx_matches_torch(self):
+        model, processor = tiny_clip()
+        rng = np.random.default_rng(0)
+        images = [Image.fromarray(rng.integers(0, 255, (240, 320, 3), dtype=np.uint8)) for _ in range(4)]
+        reference = TorchBackend("tiny", model, processor).encode_images(images)
+
+        with tempfile.TemporaryDirectory() as export_dir:
+            for quantize, tolerance in [(False, 1e-4), (True, 2e-2)]:
+                backend = OnnxBackend("tiny", export_dir, quantize=quantize, clip_model=model, clip_processor=processor)
+                embeddings = backend.encode_images(images)
+                self.assertEqual(embeddings.shape, reference.shape)
+                self.assertGreater(np.sum(embeddings * reference, axis=1).min(), 1 - tolerance)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from functions import build_parser
+from inference_backends import StubBackend
+from ingest import InboxWatcher, watch
+from manifest import find_manifest, read_manifest
+from synthetic_library import generate_library
+
+
+class TestIngest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.inbox = os.path.join(self.tmp.name, "inbox")
+        os.makedirs(self.inbox)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_file_is_ready_once_settled(self):
+        watcher = InboxWatcher(self.inbox, settle=1.0)
+        path = os.path.join(self.inbox, "IMG_0001.jpg")
+        with open(path, "wb") as f:
+            f.write(b"\xff\xd8" + b"0" * 100)
+
+        self.assertEqual(watcher.poll(now=0.0)[:2], ([], [path]))
+        # Le fichier grossit encore : le délai repart de zéro
+        with open(path, "ab") as f:
+            f.write(b"1" * 100)
+        self.assertEqual(watcher.poll(now=0.8)[:2], ([], [path]))
+        self.assertEqual(watcher.poll(now=1.5)[:2], ([], [path]))
+        self.assertEqual(watcher.poll(now=1.9)[:2], ([path], []))
+
+        watcher.mark_sorted([path])
+        self.assertEqual(watcher.poll(now=5.0), ([], [], []))
+        os.remove(path)
+        self.assertEqual(watcher.poll(now=6.0), ([], [], [path]))
+
+    def test_photos_sorted_as_they_arrive(self):
+        source = os.path.join(self.tmp.name, "phone")
+        generate_library(source, 20, seed=3, processes=1)
+        photos = sorted(name for name in os.listdir(source) if name.endswith(".jpg"))
+        destination = os.path.join(self.tmp.name, "albums")
+
+        args = build_parser().parse_args(["--directory", self.inbox, "--destination_directory", destination,
+                                          "--workers", "1", "--no_cache", "--progress_interval", "0",
+                                          "--watch_settle", "0.2", "--watch_poll", "0.1", "--watch_idle_exit", "2"])
+        args.backend = StubBackend()
+        thread = threading.Thread(target=watch, args=(args,))
+        thread.start()
+
+        # Deux rafales de photos, comme pendant un transfert depuis le téléphone
+        for burst in (photos[:12], photos[12:]):
+            for name in burst:
+                shutil.copy(os.path.join(source, name), os.path.join(self.inbox, name))
+            time.sleep(1.0)
+        thread.join(60)
+        self.assertFalse(thread.is_alive())
+
+        albums = [name for _, _, files in os.walk(destination) for name in files]
+        self.assertEqual(sorted(albums), photos)
+        manifest = read_manifest(find_manifest(self.inbox))
+        self.assertEqual(len(manifest), 20)
+        self.assertTrue(manifest["folder_path"].notna().all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from clustering_manager import day_key
+from functions import MISSING_FOLDER, create_arborescence
+from manifest import find_manifest, manifest_path, parquet_available, read_manifest, typed, write_manifest
+
+
+class StubResolver:
+    def resolve(self, latitudes, longitudes):
+        return ["Québec" if lat == lat else None for lat in latitudes]
+
+
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmp.name, "photos")
+        self.df = pd.DataFrame({
+            "image_name": ["a.jpg", "b.jpg", "c.jpg"],
+            "path": ["/p/a.jpg", "/p/b.jpg", "/p/c.jpg"],
+            "date_time": ["2024:07:14 10:00:00", None, "2023:01:02 23:59:59"],
+            "latitude": [46.8, None, 48.4],
+            "longitude": [-71.2, None, -71.0],
+            "file_size": [10, 20, 30],
+            "file_mtime": [1.5, 2.5, 3.5],
+            "phash": pd.array([2 ** 64 - 1, None, 7], dtype="UInt64"),
+            "cluster": ["cluster_0", "cluster_1", "cluster_0"],
+            "categories": ["2024_07_14_Plage", "Autres", "2023_01_02_Neige"],
+        })
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def round_trip(self, manifest_format):
+        path = manifest_path(self.directory, manifest_format)
+        write_manifest(self.df, path)
+        self.assertEqual(find_manifest(self.directory), path)
+        df = read_manifest(path)
+
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(df["date_time"]))
+        self.assertEqual(df["date_time"][0], pd.Timestamp("2024-07-14 10:00:00"))
+        self.assertTrue(pd.isna(df["date_time"][1]))
+        self.assertEqual(df["latitude"].dtype, "float64")
+        self.assertEqual(df["file_size"].dtype, "Int64")
+        self.assertEqual(int(df["phash"][0]), 2 ** 64 - 1)
+        self.assertEqual(df["categories"].tolist(), self.df["categories"].tolist())
+        self.assertEqual([day_key(date) for date in df["date_time"]], ["2024:07:14", "no_date", "2023:01:02"])
+
+    def test_csv_round_trip(self):
+        self.round_trip("csv")
+
+    @unittest.skipUnless(parquet_available(), "pyarrow non installé")
+    def test_parquet_round_trip(self):
+        self.round_trip("parquet")
+
+    def test_arborescence_uses_dates(self):
+        df = create_arborescence(typed(self.df), StubResolver())
+        self.assertEqual(df["folder_path"].tolist(),
+                         ["2024/Été/Québec/2024_07_14_Plage", "2025/Hiver/Autres", "2023/Hiver/Québec/2023_01_02_Neige"])
+
+    def test_missing_category_folder_survives_round_trip(self):
+        # Image sans catégorie (illisible ou sans embedding) : NaN au premier tri
+        self.df["categories"] = ["2024_07_14_Plage", float("nan"), "2023_01_02_Neige"]
+        fresh = create_arborescence(self.df, StubResolver())
+        self.assertEqual(fresh["folder_path"][1], f"2025/Hiver/{MISSING_FOLDER}")
+
+        for manifest_format in ["csv"] + (["parquet"] if parquet_available() else []):
+            path = manifest_path(self.directory, manifest_format)
+            write_manifest(fresh, path)
+            reread = create_arborescence(read_manifest(path), StubResolver())
+            self.assertEqual(reread["folder_path"].tolist(), fresh["folder_path"].tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from categories_manager import CategoriesManager
+from image_analysis import ImageRecord
+from inference_backends import StubBackend
+from prefilter import FramePrefilter
+from synthetic_library import generate_library
+
+
+class TestFramePrefilter(unittest.TestCase):
+
+    def records(self, frames):
+        # (chemin, qualité, pHash)
+        return [ImageRecord(path=path, quality=quality, phash=phash) for path, quality, phash in frames]
+
+    def test_bursts_and_blurry_frames(self):
+        frames = [
+            ("a", 50.0, 0x5555555555555555),        # floue, avant toute image conservée du jour
+            ("b", 300.0, 0xFFFF << 20),
+            ("c", 500.0, 0xFFFF << 20 | 0b1),  # rafale avec b, plus nette
+            ("d", 400.0, 0xFFFF << 20 | 0b11),
+            ("e", 40.0, 0xFFFFFFFFFF),  # floue isolée
+            ("f", 30.0, 0),             # autre jour, uniquement des images floues
+            ("g", 60.0, 0xFFFFFFFFFFFF),
+        ]
+        days = {"a": "d1", "b": "d1", "c": "d1", "d": "d1", "e": "d1", "f": "d2", "g": "d2"}
+        prefilter = FramePrefilter(days)
+        kept = [record.path for record in prefilter.filter(self.records(frames))]
+
+        self.assertEqual(kept, ["c", "g"])
+        self.assertEqual(prefilter.drops, {"a": ("blurry", "c"), "b": ("duplicate", "c"), "d": ("duplicate", "c"),
+                                           "e": ("blurry", "c"), "f": ("blurry", "g")})
+
+    def test_dropped_frames_inherit_cluster_and_category(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            library = os.path.join(tmp, "library")
+            generate_library(library, 40, seed=4, processes=1, burst_ratio=0.6)
+
+            manager = CategoriesManager(library, workers=1, backend=StubBackend(), prefilter=True)
+            encoded = []
+            encode_images = manager.backend.encode_images
+            manager.backend.encode_images = lambda images: encoded.extend(images) or encode_images(images)
+            df = manager.pipeline(0).fillna({"categories": ""})
+
+            dropped = df[df["drop_reason"].notna()]
+            self.assertGreater(len(dropped), 0)
+            self.assertTrue(df.loc[df["drop_reason"].isna(), "kept_frame"].isna().all())
+            # Les images écartées ne sont jamais encodées
+            self.assertEqual(len(encoded), len(df) - len(dropped))
+
+            by_path = df.set_index("path")
+            for path, kept_frame in zip(dropped["path"], dropped["kept_frame"]):
+                self.assertTrue(pd.isna(by_path.loc[kept_frame, "drop_reason"]))
+                self.assertEqual(by_path.loc[path, "cluster"], by_path.loc[kept_frame, "cluster"])
+                self.assertEqual(by_path.loc[path, "categories"], by_path.loc[kept_frame, "categories"])
+
+if __name__ == '__main__':
+    unittest.main()
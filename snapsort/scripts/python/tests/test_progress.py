@@ -0,0 +1,116 @@
+import io
+import os
+import sys
+import json
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+import progress
+from progress import ProgressReporter
+from synthetic_library import generate_library
+
+
+class TestProgressReporter(unittest.TestCase):
+
+    def test_rate_limited_events_and_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            events_path = os.path.join(directory, "events.jsonl")
+            report_path = os.path.join(directory, "report.json")
+            reporter = ProgressReporter(events_path, report_path, interval=60)
+
+            stdout = io.StringIO()
+            with redirect_stdout(stdout):
+                reporter.start_stage("analysis", 1000, legacy="1/5")
+                for _ in range(1000):
+                    reporter.advance()
+                reporter.metric(cache_hits=10)
+                reporter.end_stage(backend="stub")
+                reporter.summary(images=1000)
+            reporter.close()
+
+            with open(events_path, encoding="utf-8") as f:
+                events = [json.loads(line) for line in f]
+            progress = [event for event in events if event["event"] == "progress"]
+
+            # Premier élément et fin d'étape seulement, pas un événement par image
+            self.assertEqual([event["done"] for event in progress], [1, 1000])
+            self.assertEqual([event["event"] for event in events],
+                             ["stage_start", "progress", "progress", "stage_end", "summary"])
+            self.assertEqual(stdout.getvalue().count("Etape [1/5]"), 2)
+            self.assertIn("Etape [1/5] : [1000/1000]", stdout.getvalue())
+
+            with open(report_path, encoding="utf-8") as f:
+                report = json.load(f)
+            self.assertEqual(report["images"], 1000)
+            self.assertEqual(report["stages"][0]["stage"], "analysis")
+            self.assertEqual(report["stages"][0]["cache_hits"], 10)
+            self.assertEqual(report["stages"][0]["backend"], "stub")
+
+
+    def test_pipeline_output_does_not_grow_with_clusters(self):
+        from categories_manager import CategoriesManager
+        from inference_backends import StubBackend
+
+        with tempfile.TemporaryDirectory() as directory:
+            library = os.path.join(directory, "library")
+            generate_library(library, 60, seed=8, processes=1, images_per_day=20)
+            reporter = progress.configure(interval=60)
+            stdout = io.StringIO()
+            try:
+                with redirect_stdout(stdout):
+                    df = CategoriesManager(library, workers=1, backend=StubBackend()).pipeline(0)
+                    report = reporter.summary()
+            finally:
+                progress.configure()
+
+            # Le bilan du nettoyage est dans les métriques de l'étape, pas une ligne par cluster
+            categories = next(stage for stage in report["stages"] if stage["stage"] == "categories")
+            self.assertGreater(categories["total"], 3)
+            self.assertGreater(categories["removed_images"], 0)
+            self.assertLess(categories["removed_images"], len(df))
+            self.assertIn("empty_clusters", categories)
+            self.assertNotIn("Cluster ", stdout.getvalue())
+            self.assertNotIn("dans le cluster", stdout.getvalue())
+
+
+class TestMemoryReadings(unittest.TestCase):
+
+    def test_psutil_first(self):
+        psutil = SimpleNamespace(Process=lambda: SimpleNamespace(memory_info=lambda: SimpleNamespace(rss=300 * 1024 ** 2)),
+                                 virtual_memory=lambda: SimpleNamespace(available=2048 * 1024 ** 2))
+        with mock.patch.object(progress, "psutil_module", return_value=psutil):
+            self.assertEqual(progress.current_rss_mb(), 300.0)
+            self.assertEqual(progress.available_memory_mb(), 2048.0)
+
+    def test_windows_without_psutil(self):
+        memory = {"rss": 300 * 1024 ** 2, "peak_rss": 400 * 1024 ** 2, "available": 2048 * 1024 ** 2}
+        with mock.patch.object(progress, "psutil_module", return_value=None), \
+                mock.patch.object(progress.sys, "platform", "win32"), \
+                mock.patch.object(progress, "windows_memory", return_value=memory):
+            self.assertEqual(progress.current_rss_mb(), 300.0)
+            self.assertEqual(progress.peak_rss_mb(), 400.0)
+            self.assertEqual(progress.available_memory_mb(), 2048.0)
+
+        # API Win32 indisponible : mesures inconnues plutôt qu'une erreur
+        with mock.patch.object(progress, "psutil_module", return_value=None), \
+                mock.patch.object(progress.sys, "platform", "win32"), \
+                mock.patch.object(progress, "windows_memory", side_effect=OSError):
+            self.assertIsNone(progress.current_rss_mb())
+            self.assertIsNone(progress.available_memory_mb())
+
+    def test_without_proc_or_psutil(self):
+        # macOS sans psutil : mémoire maximale à la place de la mémoire actuelle, mémoire disponible inconnue
+        with mock.patch.object(progress, "psutil_module", return_value=None), \
+                mock.patch.object(progress, "open", side_effect=OSError, create=True):
+            self.assertEqual(progress.current_rss_mb(), progress.peak_rss_mb())
+            self.assertIsNone(progress.available_memory_mb())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from similarity_index import SimilarityIndex
+
+
+def random_embeddings(n, dim=32, seed=0):
+    embeddings = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+class TestSimilarityIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.paths = [os.path.join(self.tmp.name, f"img_{i}.jpg") for i in range(600)]
+        self.embeddings = random_embeddings(len(self.paths))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def index(self):
+        # Recherche IVF même sur un petit index
+        return SimilarityIndex(self.tmp.name, "test-space", n_probe=4, exact_below=0)
+
+    def test_incremental_insertion_and_persistence(self):
+        index = self.index()
+        index.add(self.paths[:200], self.embeddings[:200])
+        index.add(self.paths[200:], self.embeddings[200:])
+        index.save()
+
+        index = self.index()
+        self.assertEqual(len(index), 600)
+        # Chaque image est retrouvée comme son propre plus proche voisin
+        for row in range(0, 600, 37):
+            path, score = index.search(self.embeddings[row], k=1)[0][0]
+            self.assertEqual(path, self.paths[row])
+            self.assertAlmostEqual(score, 1.0, places=2)
+
+        # Les listes parcourues ne couvrent qu'une partie de l'index
+        order, bounds = index._inverted_lists()
+        probed = index._probe(self.embeddings[:1], index.n_probe)[0]
+        self.assertLess(sum(bounds[l + 1] - bounds[l] for l in probed), 600)
+
+    def test_near_duplicates_and_removal(self):
+        index = self.index()
+        duplicate = self.embeddings[10] + 0.01 * random_embeddings(1, seed=1)[0]
+        copy_path = os.path.join(self.tmp.name, "other_day", "copy.jpg")
+        index.add(self.paths + [copy_path], np.vstack([self.embeddings, duplicate]))
+
+        self.assertEqual(index.similar_to(copy_path, k=1)[0][0], self.paths[10])
+        pairs = index.near_duplicates(threshold=0.95)
+        self.assertEqual([(a, b) for a, b, _ in pairs], [tuple(sorted((self.paths[10], copy_path)))])
+
+        index.remove([copy_path])
+        index.train()
+        self.assertEqual(index.near_duplicates(threshold=0.95), [])
+        self.assertEqual(len(index), 600)
+        self.assertEqual(index.search(self.embeddings[10], k=1)[0][0][0], self.paths[10])
+
+
+    def test_batched_search_matches_brute_force(self):
+        queries = random_embeddings(50, seed=2)
+        scores = queries @ self.embeddings.T
+        for exact_below, n_probe in [(10 ** 6, None), (0, 1000)]:
+            index = SimilarityIndex(self.tmp.name, f"test-space-{exact_below}", n_probe=4, exact_below=exact_below)
+            index.add(self.paths, self.embeddings)
+            # Blocs de requêtes plus petits qu'une liste : le résultat ne dépend pas du découpage
+            for block_size in [1 << 24, 100]:
+                results = index.search(queries, k=5, n_probe=n_probe, block_size=block_size)
+                for query_scores, neighbours in zip(scores, results):
+                    expected = np.argsort(-query_scores, kind="stable")[:5]
+                    self.assertEqual([path for path, _ in neighbours], [self.paths[i] for i in expected])
+                    np.testing.assert_allclose([score for _, score in neighbours], query_scores[expected], atol=2e-3)
+
+        # Moins d'images indexées que de voisins demandés
+        index = self.index()
+        index.add(self.paths[:3], self.embeddings[:3])
+        self.assertEqual(len(index.search(queries[:2], k=10)[1]), 3)
+
+    def test_interrupted_compaction_keeps_the_saved_index(self):
+        index = self.index()
+        index.add(self.paths, self.embeddings)
+        index.save()
+
+        # Compactage sans sauvegarde (tri interrompu) : l'index sur disque reste lisible et cohérent
+        index.remove(self.paths[:300])
+        index.train()
+        reloaded = self.index()
+        self.assertEqual(len(reloaded), 600)
+        self.assertEqual(reloaded.search(self.embeddings[5], k=1)[0][0][0], self.paths[5])
+
+        index.save()
+        reloaded = self.index()
+        self.assertEqual(len(reloaded), 300)
+        self.assertEqual(reloaded.search(self.embeddings[305], k=1)[0][0][0], self.paths[305])
+        self.assertEqual(sorted(name for name in os.listdir(index.directory) if name.endswith(".f16")),
+                         [index.index["vectors_file"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+import subprocess
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loaded_modules(code):
+    """
+    Exécute du code dans un nouvel interpréteur et retourne les modules lourds qu'il a chargés
+    """
+    code += "\nimport sys; print(sorted({'pandas', 'torch', 'transformers'} & set(sys.modules)))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return output.stdout.strip().splitlines()[-1]
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_command_line_options_without_pandas(self):
+        # main.py --help ne charge que les options
+        self.assertEqual(loaded_modules("import functions; functions.build_parser()"), "[]")
+
+    def test_empty_folder_exits_before_the_pipeline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            code = (f"import runpy, sys; sys.argv = ['main.py', '--directory', {directory!r}]\n"
+                    "try:\n    runpy.run_path('main.py', run_name='__main__')\nexcept SystemExit:\n    pass")
+            self.assertEqual(loaded_modules(code), "[]")
+
+
+if __name__ == '__main__':
+    unittest.main()
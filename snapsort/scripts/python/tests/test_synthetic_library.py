@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from exif_scanner import scan_exif
+from synthetic_library import default_spec, generate_library, plan_library
+
+
+class TestSyntheticLibrary(unittest.TestCase):
+
+    def test_reproducible_plan(self):
+        spec = default_spec(500, seed=3)
+        self.assertEqual(plan_library(spec), plan_library(spec))
+        self.assertNotEqual(plan_library(spec), plan_library(default_spec(500, seed=4)))
+
+    def test_exif_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = generate_library(directory, 40, seed=1, processes=1, no_date_ratio=0.1, gps_ratio=0.5)
+            plans = plan_library({**default_spec(40, seed=1), "no_date_ratio": 0.1, "gps_ratio": 0.5})
+            scanned = scan_exif(paths)
+
+            self.assertEqual(scanned["date_time"], [plan["date"] for plan in plans])
+            for plan, latitude, longitude in zip(plans, scanned["latitude"], scanned["longitude"]):
+                if plan["gps"] is None:
+                    self.assertIsNone(latitude)
+                else:
+                    self.assertAlmostEqual(latitude, plan["gps"][0], places=4)
+                    self.assertAlmostEqual(longitude, plan["gps"][1], places=4)
+
+            # Même spécification : la bibliothèque existante est réutilisée
+            self.assertEqual(generate_library(directory, 40, seed=1, processes=1, no_date_ratio=0.1, gps_ratio=0.5),
+                             sorted(paths))
+
+
+if __name__ == '__main__':
+    unittest.main()